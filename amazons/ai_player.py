@@ -1,46 +1,139 @@
 #!/usr/bin/env python
 
-from multiprocessing import Pool, TimeoutError, freeze_support, current_process
+from multiprocessing import TimeoutError, current_process
 from random import randint
 from time import sleep, time
 from gc import collect
+from random import Random
 
 from player import Player
 from board import Board
-from move import Move
+from bitboard import count_bits, iter_bits
+from move import Move, TO_SHIFT, ARROW_SHIFT, MOVE_FIELD_MASK
 from square import Square
 from squares import Squares
+import worker_pool
+from transposition_table import EXACT, LOWER_BOUND, UPPER_BOUND
+from move_ordering import MoveOrdering
+from territory import eval_territory, eval_territory_grids
+import numpy_eval
+import mcts
+import regions
+import opening_book
 
 # from memory_profiler import profile
 
 WHITE = 1
 BLACK = -1
 
+# Iterative deepening and time management.
+MAX_SEARCH_DEPTH = 20
+# Assume each ply takes at least this many times longer than the one before.
+DEEPENING_GROWTH = 4.0
+# Plan to make at least this many more moves when budgeting fixed time.
+MIN_MOVES_TO_PLAN_FOR = 10
+# Fraction of each byo-yomi period to use, and seconds kept back from every
+# budget to cover overhead outside the search.
+BYOYOMI_USAGE = 0.8
+TIME_SAFETY_MARGIN = 0.5
+MIN_MOVE_TIME = 0.1
+
+# Searches poll their cancellation flag (see worker_pool.cancel_search) and
+# abort time every CANCEL_POLL_INTERVAL nodes.
+CANCEL_POLL_INTERVAL = 16
+
+# Split turn search (see negamax_split) counts depth in half plies, and its
+# transposition table keys are XORed with SPLIT_SEARCH_KEY so they can't be
+# confused with those of a normal search.
+SPLIT_SEARCH_KEY = 0x5bd1e9955bd1e995
+
+# Positions the endgame solver (see regions.solve) has settled are stored in
+# the transposition table with this depth, deeper than any search.
+SOLVED_DEPTH = MAX_SEARCH_DEPTH * 2 + 1
+
+# Root moves are handed to the workers in batches of at most
+# MAX_ROOT_BATCH_SIZE moves, aiming for ROOT_BATCHES_PER_PROCESS batches per
+# worker so that a worker stuck on a big subtree doesn't hold up the others.
+ROOT_BATCHES_PER_PROCESS = 8
+MAX_ROOT_BATCH_SIZE = 32
+
+# Leaf batching.  At nodes one ply above the search frontier, when NumPy is
+# available, the first LEAF_SERIAL_MOVES children (the hash and killer moves,
+# which cause most cutoffs) are evaluated one at a time as usual, and the
+# rest all at once with NumPy (see evaluate_children) in batches of
+# MIN_LEAF_BATCH moves, doubling in size each time, until one of them causes
+# a cutoff.  A batch smaller than MIN_LEAF_BATCH would cost more in NumPy's
+# per-call overhead than it saves.
+LEAF_SERIAL_MOVES = 3
+MIN_LEAF_BATCH = 16
+
+# Searches an AIPlayer can choose from: iterative deepening negamax, or Monte
+# Carlo tree search (see mcts.py), in which each worker grows its own tree
+# of the position for MCTS_SLICE seconds per task and reports its root move
+# statistics, and the player merges the latest report from every worker.
+SEARCHES = ('negamax', 'mcts')
+DEFAULT_SEARCH = 'negamax'
+MCTS_SLICE = 0.25
+# Without a clock, a Monte Carlo search stops after this many playouts per
+# worker per difficulty level.
+MCTS_PLAYOUTS_PER_DIFFICULTY = 100
+
+# Move ordering state of the search this worker last worked on.  It is kept
+# across decide() calls of one search, so that later iterative deepening
+# iterations benefit from earlier ones.
+move_ordering = MoveOrdering()
+move_ordering_search_id = None
+
+# Monte Carlo tree this worker is growing, and the id of its search.
+mcts_tree = None
+mcts_tree_search_id = None
+
+class SearchCancelled(Exception):
+    """Raised inside a worker to unwind a search that is no longer wanted."""
+    pass
+
+# Worker process search state: the id and abort time of the search the worker
+# is currently running.
+search_id = None
+search_abort_time = None
+poll_countdown = CANCEL_POLL_INTERVAL
+
+def poll_cancellation():
+    """
+    Raises SearchCancelled if the current search has been cancelled or has
+    run past its abort time.  Called at every search node, but only actually
+    checks once every CANCEL_POLL_INTERVAL calls.
+    """
+    global poll_countdown
+    poll_countdown -= 1
+    if poll_countdown > 0:
+        return
+    poll_countdown = CANCEL_POLL_INTERVAL
+    if search_id != None and worker_pool.is_cancelled(search_id):
+        raise SearchCancelled
+    if search_abort_time != None and time() > search_abort_time:
+        raise SearchCancelled
+
 def evaluate(board):
     """
     Returns a normalized board evaluation score from 0.0 (worst) to 100.0 (best),
-    or -inf (guaranteed loss), or +inf (guaranteed win) based on the weighted
-    results of all board evaluation functions.
+    or -inf (guaranteed loss), or +inf (guaranteed win) based on the current
+    evaluation function (see EVALUATIONS).
     Note that all evaluation scores are given from the perspective of WHITE.
     """
-    if (board.to_move == 'white' and len(board.get_valid_moves()) == 0):
+    if (board.to_move == 'white' and not board.has_valid_moves()):
         return float("-inf")
-    if (board.to_move == 'black' and len(board.get_valid_moves()) == 0):
+    if (board.to_move == 'black' and not board.has_valid_moves()):
         return float("inf")
 
-    return (eval_mobility(board) * 1.0) / 1.0
+    return evaluation(board)
 
 def eval_mobility(board):
     """
     Returns mobility score for the given board, from 0.0 to 100.0.
     """
-    move_count = len(board.get_valid_moves())
-    opp_move_count = len(board.get_valid_opponent_moves())
-    w_move_count = move_count
-    b_move_count = opp_move_count
-    if board.to_move == 'black':
-        w_move_count = opp_move_count
-        b_move_count = move_count
+    w_move_count = board.count_valid_moves('white')
+    b_move_count = board.count_valid_moves('black')
     if w_move_count == 0:
         return 0.0
     if b_move_count == 0:
@@ -54,50 +147,399 @@ def eval_mobility(board):
         relative_mobility -= difference
     return relative_mobility
 
+def eval_mobility_grids(grids, to_move):
+    """
+    Returns an array of the eval_mobility scores of a stack of NumPy
+    occupancy grids (see numpy_eval).  to_move is unused: mobility doesn't
+    depend on it.
+    """
+    numpy = numpy_eval.numpy
+    w_move_count = numpy_eval.move_counts(grids, numpy_eval.WHITE)
+    b_move_count = numpy_eval.move_counts(grids, numpy_eval.BLACK)
+    fewer = numpy.minimum(w_move_count, b_move_count).astype(float)
+    more = numpy.maximum(numpy.maximum(w_move_count, b_move_count), 1)
+    difference = (1.0 - fewer / more) * 50.0
+    relative_mobility = numpy.where(w_move_count >= b_move_count,
+                                    50.0 + difference, 50.0 - difference)
+    relative_mobility[b_move_count == 0] = 100.0
+    relative_mobility[w_move_count == 0] = 0.0
+    return relative_mobility
+
+# Board evaluation functions an AIPlayer can choose from by name.  Each
+# returns a score from 0.0 to 100.0 from WHITE's point of view.  Scores from
+# different functions can't be mixed, so each also has a key that searches
+# using it XOR into their transposition table keys.
+EVALUATIONS = {
+    'mobility': eval_mobility,
+    'territory': eval_territory
+}
+EVALUATION_KEYS = {
+    'mobility': 0,
+    'territory': 0x2545f4914f6cdd1d
+}
+DEFAULT_EVALUATION = 'mobility'
+
+# The same evaluation functions for stacks of NumPy occupancy grids, given
+# the side to move in each.  They return arrays of exactly the same scores.
+GRID_EVALUATIONS = {
+    'mobility': eval_mobility_grids,
+    'territory': eval_territory_grids
+}
+
+# The evaluation function of the search this worker is running, its key and
+# its NumPy version.
+evaluation = EVALUATIONS[DEFAULT_EVALUATION]
+table_key = EVALUATION_KEYS[DEFAULT_EVALUATION]
+grid_evaluation = GRID_EVALUATIONS[DEFAULT_EVALUATION]
+
+def evaluate_children(board, moves):
+    """
+    Returns the list of evaluate() scores of the boards after each of the
+    packed move codes moves on board, computed all at once on a stack of
+    NumPy occupancy grids.  board may also have only the amazon move of its
+    turn made, with moves finishing it.  Requires NumPy.
+    """
+    numpy = numpy_eval.numpy
+    grids = numpy_eval.child_grids(board, moves)
+    if board._to_move == numpy_eval.WHITE:
+        to_move = numpy_eval.BLACK
+    else:
+        to_move = numpy_eval.WHITE
+    scores = grid_evaluation(grids, [to_move] * len(moves))
+    # A side left with no moves has lost.
+    lost = float("-inf") if to_move == numpy_eval.WHITE else float("inf")
+    scores = numpy.where(numpy_eval.has_moves(grids, to_move), scores, lost)
+    return [float(score) for score in scores]
+
+def leaf_batching(moves, depth):
+    """
+    Returns how many of moves, searched with depth plies left, to search one
+    at a time before evaluating the rest with search_leaf_batches.
+    """
+    if (depth == 1 and numpy_eval.HAVE_NUMPY and
+        len(moves) >= LEAF_SERIAL_MOVES + MIN_LEAF_BATCH):
+        return LEAF_SERIAL_MOVES
+    return len(moves)
+
+def search_leaf_batches(board, moves, alpha, beta, color, nodes_evaluated):
+    """
+    Returns (best value, best move) from the perspective of color, the side
+    to move on board, over the leaf children after each of moves, evaluated
+    by evaluate_children in batches of growing size (see MIN_LEAF_BATCH).
+    Stops after the first batch with a value of at least beta.  Ties go to
+    the earlier move.
+    """
+    best_value = float("-inf")
+    best_move = None
+    start = 0
+    size = MIN_LEAF_BATCH
+    while start < len(moves) and best_value < beta:
+        poll_cancellation()
+        batch = moves[start:start + size]
+        nodes_evaluated[0] = nodes_evaluated[0] + len(batch)
+        for move, score in zip(batch, evaluate_children(board, batch)):
+            val = float(color) * score
+            if val > best_value or best_move == None:
+                best_value = val
+                best_move = move
+        start += size
+        size *= 2
+    return (best_value, best_move)
+
+def allocate_time(clock, board):
+    """
+    Returns how many seconds to spend choosing the next move on board given
+    the mover's Clock, or None if there is no clock.  Remaining fixed time is
+    spread over the moves the player can still expect to make (about a
+    quarter of the empty squares); once in byo-yomi, most of a period is used.
+    """
+    if clock == None:
+        return None
+    fixed_seconds = clock.minutes * 60 + clock.seconds
+    period_seconds = clock.period_seconds if clock.periods > 0 else 0
+    if fixed_seconds > 0:
+        moves_left = max(MIN_MOVES_TO_PLAN_FOR,
+                         count_bits(board.bits.empty) / 4)
+        budget = (float(fixed_seconds) / moves_left +
+                  period_seconds * BYOYOMI_USAGE)
+    else:
+        budget = period_seconds * BYOYOMI_USAGE
+    return max(MIN_MOVE_TIME, budget - TIME_SAFETY_MARGIN)
+
 def is_terminal(board):
-    return len(board.get_valid_moves()) == 0
+    return not board.has_valid_moves()
 
-def negamax(board, depth, alpha, beta, color, nodes_evaluated):
+def solved_value(board):
+    """
+    Returns inf or -inf if the endgame solver can tell that the side to move
+    on board wins or loses, or None if it can't.  Only positions with no
+    contested regions are solved: searching contested ones out costs far
+    too much to do at every node.
+    """
+    winner = regions.solve(board, 0)
+    if winner == None:
+        return None
+    return float("inf") if winner == board._to_move else float("-inf")
+
+def negamax(board, depth, alpha, beta, color, nodes_evaluated, tt=None,
+            ordering=None, ply=1):
     """
     Returns the best possible future board evaluation score for the specified
-    node, given the specified search depth.
+    node, given the specified search depth, from the perspective of color,
+    which must be the side to move on board.
+    If a TranspositionTable tt is given, results are looked up in and stored
+    to it by board.hash_key (XOR table_key).
+    If a MoveOrdering is given, moves are searched in the order it suggests
+    and it learns from the cutoffs found.  ply is how many moves from the
+    root of the search board is.
     Based on negamax algorithm from http://en.wikipedia.org/wiki/Negamax
     """
+    poll_cancellation()
+    alpha_orig = alpha
+    key = board.hash_key ^ table_key
+    hash_move = None
+    if tt != None:
+        entry = tt.probe(key)
+        if entry != None:
+            hash_move = entry[3]
+        if entry != None and entry[0] >= depth:
+            tt_depth, tt_score, tt_flag, tt_move = entry
+            if tt_flag == EXACT:
+                return tt_score
+            elif tt_flag == LOWER_BOUND:
+                alpha = max(alpha, tt_score)
+            elif tt_flag == UPPER_BOUND:
+                beta = min(beta, tt_score)
+            if alpha >= beta:
+                return tt_score
+    if depth > 0:
+        val = solved_value(board)
+        if val != None:
+            if tt != None:
+                tt.store(key, SOLVED_DEPTH, val, EXACT, None)
+            return val
     if depth == 0 or is_terminal(board):
         nodes_evaluated[0] = nodes_evaluated[0] + 1
-        return float(color) * evaluate(board)
+        val = float(color) * evaluate(board)
+        if tt != None:
+            tt.store(key, depth, val, EXACT, None)
+        return val
     best_value = float("-inf")
-    moves = list(board.get_valid_moves())
-    for move in moves:
-        board.move_in_place(move)
-        val = -1.0 * negamax(board, depth - 1, -beta, -alpha, -color)
+    best_move = None
+    moves = board.get_valid_move_codes()
+    if ordering != None:
+        moves = ordering.order(moves, ply, hash_move)
+    else:
+        moves = list(moves)
+    serial_count = leaf_batching(moves, depth)
+    for move in moves[:serial_count]:
+        board.move_in_place(move, validate=False)
+        val = -1.0 * negamax(board, depth - 1, -beta, -alpha, -color,
+                             nodes_evaluated, tt, ordering, ply + 1)
         board.undo_move_in_place(move)
-        best_value = max(best_value, val)
+        if val > best_value or best_move == None:
+            best_value = val
+            best_move = move
         alpha = max(alpha, val)
         if alpha >= beta:
+            if ordering != None:
+                ordering.record_cutoff(move, ply, depth)
             break
+    if alpha < beta and serial_count < len(moves):
+        # Every child is a leaf: evaluate the rest in batches.
+        val, move = search_leaf_batches(board, moves[serial_count:], alpha,
+                                        beta, color, nodes_evaluated)
+        if val > best_value:
+            best_value = val
+            best_move = move
+        if val >= beta and ordering != None:
+            ordering.record_cutoff(move, ply, depth)
+    if tt != None:
+        if best_value <= alpha_orig:
+            flag = UPPER_BOUND
+        elif best_value >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        tt.store(key, depth, best_value, flag, best_move)
     return best_value
 
+def negamax_split(board, depth, alpha, beta, color, nodes_evaluated, tt=None,
+                  ordering=None, ply=1, amazon_move=None):
+    """
+    Like negamax, but each turn is searched as two half plies: first the
+    side to move chooses which amazon to move where, then where to shoot the
+    arrow.  depth is in half plies.  Amazon moves are searched in order of
+    how many arrow shots the amazon has from its new square, so a cutoff
+    after a good amazon move prunes every arrow shot of the amazon moves
+    after it, and a search can stop half way through a turn: a board with
+    only the amazon moved is evaluated as if its arrow were already shot.
+    amazon_move is the packed move code (with no arrow) of the amazon move
+    already made on board, if any.
+    """
+    poll_cancellation()
+    alpha_orig = alpha
+    key = board.hash_key ^ table_key ^ SPLIT_SEARCH_KEY
+    hash_move = None
+    if tt != None:
+        entry = tt.probe(key)
+        if entry != None:
+            hash_move = entry[3]
+        if entry != None and entry[0] >= depth:
+            tt_depth, tt_score, tt_flag, tt_move = entry
+            if tt_flag == EXACT:
+                return tt_score
+            elif tt_flag == LOWER_BOUND:
+                alpha = max(alpha, tt_score)
+            elif tt_flag == UPPER_BOUND:
+                beta = min(beta, tt_score)
+            if alpha >= beta:
+                return tt_score
+    if depth > 0 and amazon_move == None:
+        val = solved_value(board)
+        if val != None:
+            if tt != None:
+                tt.store(key, SOLVED_DEPTH, val, EXACT, None)
+            return val
+    if depth == 0 or (amazon_move == None and is_terminal(board)):
+        nodes_evaluated[0] = nodes_evaluated[0] + 1
+        val = float(color) * evaluate(board)
+        if tt != None:
+            tt.store(key, depth, val, EXACT, None)
+        return val
+    best_value = float("-inf")
+    best_move = None
+    bits = board.bits
+    empty = bits.empty
+    queen_reach = bits.ray_table.queen_reach
+    if amazon_move == None:
+        # Choose the amazon move, most mobile landing square first.
+        moves = list(bits.generate_amazon_moves(board._to_move))
+        moves.sort(key=lambda move: -count_bits(queen_reach(
+            (move >> TO_SHIFT) & MOVE_FIELD_MASK,
+            empty | (1 << (move & MOVE_FIELD_MASK)))))
+        if hash_move in moves:
+            moves.remove(hash_move)
+            moves.insert(0, hash_move)
+        for move in moves:
+            board.move_amazon_in_place(move)
+            val = negamax_split(board, depth - 1, alpha, beta, color,
+                                nodes_evaluated, tt, ordering, ply, move)
+            board.undo_move_amazon_in_place(move)
+            if val > best_value or best_move == None:
+                best_value = val
+                best_move = move
+            alpha = max(alpha, val)
+            if alpha >= beta:
+                break
+    else:
+        # Choose where to shoot the arrow.
+        to = (amazon_move >> TO_SHIFT) & MOVE_FIELD_MASK
+        moves = [amazon_move | (arrow << ARROW_SHIFT)
+                 for arrow in iter_bits(queen_reach(to, empty))]
+        if ordering != None:
+            moves = ordering.order(moves, ply, hash_move)
+        serial_count = leaf_batching(moves, depth)
+        for move in moves[:serial_count]:
+            arrow = move >> ARROW_SHIFT
+            board.shoot_arrow_in_place(arrow)
+            val = -1.0 * negamax_split(board, depth - 1, -beta, -alpha,
+                                       -color, nodes_evaluated, tt, ordering,
+                                       ply + 1)
+            board.undo_shoot_arrow_in_place(arrow)
+            if val > best_value or best_move == None:
+                best_value = val
+                best_move = move
+            alpha = max(alpha, val)
+            if alpha >= beta:
+                if ordering != None:
+                    ordering.record_cutoff(move, ply, (depth + 1) / 2)
+                break
+        if alpha < beta and serial_count < len(moves):
+            val, move = search_leaf_batches(board, moves[serial_count:],
+                                            alpha, beta, color,
+                                            nodes_evaluated)
+            if val > best_value:
+                best_value = val
+                best_move = move
+            if val >= beta and ordering != None:
+                ordering.record_cutoff(move, ply, 1)
+    if tt != None:
+        if best_value <= alpha_orig:
+            flag = UPPER_BOUND
+        elif best_value >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        tt.store(key, depth, best_value, flag, best_move)
+    return best_value
+
+def set_evaluation(name):
+    """Makes this process evaluate boards with the evaluation called name."""
+    global evaluation, table_key, grid_evaluation
+    evaluation = EVALUATIONS[name]
+    table_key = EVALUATION_KEYS[name]
+    grid_evaluation = GRID_EVALUATIONS[name]
+
+def get_move_ordering(sid):
+    """Returns this process's MoveOrdering, prepared for search sid."""
+    global move_ordering_search_id
+    if sid != move_ordering_search_id:
+        move_ordering.new_search()
+        move_ordering_search_id = sid
+    return move_ordering
+
 #@profile
 def decide(input_list):
     """
     Main function for a thinker process to run.
     Evaluate a chunk of moves from the given moves list to the given depth,
-    starting at starting_index.
+    starting at starting_index.  If board and moves are None, they are read
+    from the search's shared buffer instead.  Moves are packed move codes (see
+    Board.encode_move), and so is the returned best_move.  If the optional
+    eighth item is True, the moves are searched with negamax_split and depth
+    is in half plies.  The optional ninth item names the evaluation function
+    to use (see EVALUATIONS).
+    Returns None if there was no work to do, or a result marked "aborted" if
+    the search was cancelled or ran out of time.  Otherwise the result's
+    move_values lists the (move, value, exact) of every move evaluated.
+
+    Each move is searched with the best root score found so far, by this
+    or any other worker of the search (see worker_pool.get_root_bound), as
+    its lower bound.  A move that can't beat that score is only searched far
+    enough to prove so, and its value is just an upper bound: exact is False.
     """
+    global search_id, search_abort_time, poll_countdown
     board = input_list[0]
     moves = input_list[1]
-    move_count = len(moves)
     starting_index = input_list[2]
     chunk_size = input_list[3]
     depth = input_list[4]
     abort_time = input_list[5]
+    search_id = input_list[6]
+    split = len(input_list) > 7 and input_list[7]
+    search = negamax_split if split else negamax
+    set_evaluation(input_list[8] if len(input_list) > 8
+                   else DEFAULT_EVALUATION)
+    search_abort_time = abort_time
+    poll_countdown = 0 # check right away in case we're already cancelled
+
+    aborted = {"aborted": True, "starting_index": starting_index,
+               "search_id": search_id}
 
-    if (starting_index >= move_count):
+    if board == None:
+        # The position and moves were published to a shared buffer (see
+        # worker_pool.publish_position) rather than sent with the task.
+        board, chunk = worker_pool.attach_position(search_id, starting_index,
+                                                   chunk_size)
+        if board == None:
+            return aborted
+    else:
+        chunk = moves[starting_index:starting_index + chunk_size]
+    if not chunk:
         # print 'Process %s: Aborting: no work to do.' % current_process().name
         return None
-    if (starting_index + chunk_size > move_count):
-        chunk_size = move_count - starting_index
+    chunk_size = len(chunk)
 
     # Decision statistics.
     total_time = 0
@@ -110,35 +552,53 @@ def decide(input_list):
 
     # Evaluate each root move at this depth.
     total_move_values = 0
+    move_values = []
     curr_best_value = (float("-inf") if board.to_move == 'white' 
                        else float("inf"))
     curr_best_move = 'resign'
     tm = board.to_move
-    for i in range(starting_index, starting_index + chunk_size):
-        move = moves[i]
-        board.move_in_place(move)
-        if abort_time != None and time() > abort_time:
-            # print 'Process %s: Aborting: out of time.' % current_process().name
-            board.undo_move_in_place(move)
-            return None # Out of time.  Abort mission.
+    tt = worker_pool.get_transposition_table()
+    tt.reset_stats()
+    ordering = get_move_ordering(search_id)
+    # Start tracking the board's regions here at the root, so the endgame
+    # checks in the search (see solved_value) get them updated move by move.
+    board.get_regions()
+    for move in chunk:
+        board.move_in_place(move, validate=False)
         val = None
+        # Scores are from the mover's point of view; values from WHITE's.
+        alpha = worker_pool.get_root_bound(search_id)
+        if tm == 'white':
+            alpha = max(alpha, curr_best_value)
+        else:
+            alpha = max(alpha, -curr_best_value)
+        try:
+            score = -1.0 * search(board, depth, float("-inf"), -alpha,
+                                  BLACK if tm == 'white' else WHITE,
+                                  nodes_evaluated, tt, ordering)
+        except SearchCancelled:
+            # Cancelled or out of time.  Abort mission.  Rather than unwind
+            # the board, forget it so it isn't reused.
+            worker_pool.release_position()
+            # print 'Process %s: Aborting.' % current_process().name
+            return aborted
+        val = score if tm == 'white' else -score
+        exact = score > alpha or alpha == float("-inf")
+        if exact:
+            worker_pool.raise_root_bound(search_id, score)
         if tm == 'white':
-            val = negamax(board, depth, float("-inf"), float("inf"), WHITE,
-                nodes_evaluated)
             # Maximize highest possible evaluation.
             if (val > curr_best_value):
                 curr_best_value = val
                 curr_best_move = move
         else:
-            val = (-1.0 *
-                negamax(board, depth, float("-inf"), float("inf"), BLACK,
-                    nodes_evaluated))
             # Minimize highest possible evaluation.
             if (val < curr_best_value):
                 curr_best_value = val
                 curr_best_move = move
         board.undo_move_in_place(move)
         total_move_values += val
+        move_values.append((move, val, exact))
         # print "Process %s: Move %d: %s: mobility score %f." % (current_process().name, i, str(move), val)
         # print "  curr_best_move: %s, curr_best_value: %f" % (str(curr_best_move), curr_best_value)
 
@@ -156,15 +616,124 @@ def decide(input_list):
         "best_move_value": curr_best_value,
         "time": total_time,
         "starting_index": starting_index,
+        "search_id": search_id,
         "moves_evaluated": chunk_size,
+        "move_values": move_values,
         "avg_move_value": total_move_values / float(chunk_size),
-        "boards_evaluated": nodes_evaluated[0]
+        "boards_evaluated": nodes_evaluated[0],
+        "tt_stats": tt.stats()
     }
 
-# Spin up AI thinker process.
-freeze_support() # Some weird compatibility thing having to do with installers.
-PROCESS_COUNT = 3
-pool = Pool(processes=PROCESS_COUNT)
+def root_batch_size(move_count, process_count):
+    """
+    Returns how many root moves to put in each task given to the workers.
+    """
+    batches = process_count * ROOT_BATCHES_PER_PROCESS
+    return max(1, min(MAX_ROOT_BATCH_SIZE, (move_count + batches - 1) / batches))
+
+def order_moves(moves, outputs, to_move):
+    """
+    Returns moves sorted best first for to_move by the values reported in
+    the decide() outputs.  A move with an exact value goes before one whose
+    value is only a bound, other moves of equal value keep their order, and
+    moves without a value go last.
+    """
+    values = {}
+    for output in outputs:
+        if output != None:
+            for move, value, exact in output['move_values']:
+                values[move] = (value, exact)
+    sign = -1.0 if to_move == 'white' else 1.0
+    def key(mv):
+        if mv not in values:
+            return (float("inf"), True)
+        value, exact = values[mv]
+        return (sign * value, not exact)
+    return sorted(moves, key=key)
+
+def rank_root_moves(board, moves, rng):
+    """
+    Returns the move codes moves sorted best first for the side to move on
+    board by the evaluation of the boards they lead to, so that a Monte
+    Carlo tree's progressive widening tries the promising ones first.
+    Evaluating every move is only cheap enough with NumPy (see
+    evaluate_children); without it, the moves are just shuffled.
+    """
+    moves = list(moves)
+    rng.shuffle(moves)
+    if numpy_eval.HAVE_NUMPY and moves:
+        sign = 1.0 if board.to_move == 'white' else -1.0
+        scores = evaluate_children(board, moves)
+        ranked = sorted(zip(scores, range(len(moves))),
+                        key=lambda entry: -sign * entry[0])
+        moves = [moves[i] for score, i in ranked]
+    return moves
+
+def get_mcts_tree(sid, board, moves):
+    """
+    Returns this process's MonteCarloTree for search sid, creating it for a
+    copy of board with the given root move codes if it's a new search.
+    """
+    global mcts_tree, mcts_tree_search_id
+    if sid != mcts_tree_search_id:
+        rng = Random()
+        board = Board.decode_position(board.encode_position())
+        mcts_tree = mcts.MonteCarloTree(board, evaluate,
+                                        rank_root_moves(board, moves, rng),
+                                        rng)
+        mcts_tree_search_id = sid
+    return mcts_tree
+
+def decide_mcts(input_list):
+    """
+    Worker task of a Monte Carlo search: grows this process's tree for the
+    search by playouts for slice seconds, or until abort_time, and reports
+    its root move statistics.  input_list is [board, moves, move_count,
+    search_id, slice, abort_time, evaluation_name]; if board and moves are
+    None, they are read from the search's shared buffer (move_count moves).
+    The tree outlives the task, so every task of the search that this
+    process runs adds to the same tree, and each result covers all of them.
+    Returns a result marked "aborted" if the search was cancelled.
+    """
+    global search_id, search_abort_time, poll_countdown
+    board = input_list[0]
+    moves = input_list[1]
+    move_count = input_list[2]
+    search_id = input_list[3]
+    slice_time = input_list[4]
+    abort_time = input_list[5]
+    set_evaluation(input_list[6])
+    # Time is checked here between playouts, so a slice always finishes
+    # with a report.
+    search_abort_time = None
+    poll_countdown = 0
+    aborted = {"aborted": True, "search_id": search_id}
+    start_time = time()
+    end_time = start_time + slice_time
+    if abort_time != None:
+        end_time = min(end_time, abort_time)
+    if mcts_tree_search_id != search_id:
+        if board == None:
+            board, moves = worker_pool.attach_position(search_id, 0,
+                                                       move_count)
+            if board == None:
+                return aborted
+    tree = get_mcts_tree(search_id, board, moves)
+    try:
+        while True:
+            poll_cancellation()
+            tree.playout()
+            if time() >= end_time:
+                break
+    except SearchCancelled:
+        return aborted
+    return {
+        "search_id": search_id,
+        "worker": current_process().name,
+        "playouts": tree.playouts,
+        "move_stats": tree.move_stats(),
+        "time": time() - start_time
+    }
 
 class AIPlayer(Player):
     def __init__(self, color, **kwargs):
@@ -172,20 +741,45 @@ class AIPlayer(Player):
         self.difficulty = 5
         if 'difficulty' in kwargs:
             self.difficulty = kwargs['difficulty']
+        # Search each turn as an amazon move and an arrow shot (see
+        # negamax_split), deepening half a ply at a time.
+        self.split_turns = kwargs.get('split_turns', False)
+        # Name of the board evaluation function to use (see EVALUATIONS).
+        self.evaluation = kwargs.get('evaluation', DEFAULT_EVALUATION)
+        if self.evaluation not in EVALUATIONS:
+            raise ValueError("Unknown evaluation %s" % str(self.evaluation))
+        # Name of the search to use (see SEARCHES).
+        self.search = kwargs.get('search', DEFAULT_SEARCH)
+        if self.search not in SEARCHES:
+            raise ValueError("Unknown search %s" % str(self.search))
+        # OpeningBook to play book positions from (see opening_book.py), or
+        # None for no book.  By default, the book at
+        # opening_book.DEFAULT_BOOK_PATH is used if there is one.
+        if 'opening_book' in kwargs:
+            self.opening_book = kwargs['opening_book']
+        else:
+            self.opening_book = opening_book.get_default_book()
+        # (move, value) of the moves whose values the last search found
+        # exactly, best first, with values from WHITE's point of view.
+        self.last_move_values = []
+        self.mcts_pending = []
+        self.mcts_outputs = {}
         self.results = None
         self.results_to_collect = 0
         self.board = None
-        
+        self.search_id = None
+        self.root_moves = None
+
     def __str__(self):
         return "Computer AI"
 
-    def launch_workers(self, depth):
+    def sample_root_moves(self):
         """
-        Split the board evaluation task into PROCESS_COUNT chunks and delegate
-        it to the worker processes.
+        Returns the root moves to consider: all of them, or an evenly spaced
+        sample of them on easier difficulties.
         """
         sample_size_target = 4 + int((float(self.difficulty - 1) / 9.0) * 1600.0)
-        all_moves = self.board.get_valid_moves()
+        all_moves = self.board.get_valid_move_codes()
 
         moves = all_moves
         if len(all_moves) > sample_size_target:
@@ -196,44 +790,125 @@ class AIPlayer(Player):
                 if i % sample_every == 0:
                     moves.append(mv)
                 i += 1
-        move_count = len(moves)
-        chunk_size = int(move_count / PROCESS_COUNT) + 1
-        abort_time = None
-        input_tasks = [[self.board, moves, i * chunk_size, chunk_size, depth, abort_time]
-            for i in range(PROCESS_COUNT)]
+        return list(moves)
+
+    def launch_workers(self, depth):
+        """
+        Queue the root moves for evaluation to the given depth by the worker
+        processes.  The moves are split into small batches that each go to
+        whichever worker is free next, and results are collected in the order
+        they finish.  After the first iteration, the moves are queued best
+        first according to the last completed iteration.
+        The board and moves are published to a shared buffer for the workers
+        to read, and only sent along with each task if they don't fit.
+        """
+        if self.root_moves == None:
+            self.root_moves = self.sample_root_moves()
+        elif self.completed_output != None:
+            self.root_moves = order_moves(self.root_moves,
+                                          self.completed_output,
+                                          self.board.to_move)
+        moves = self.root_moves
+        worker_pool.reset_root_bound(self.search_id)
+        batch_size = root_batch_size(len(moves), worker_pool.process_count())
+        # Always let the first iteration finish so there is a move to make.
+        abort_time = self.abort_time if depth > 0 else None
+        self.iteration_start_time = time()
+        if worker_pool.publish_position(self.search_id, self.board, moves):
+            input_tasks = [[None, None, i, batch_size, depth, abort_time,
+                            self.search_id, self.split_turns,
+                            self.evaluation]
+                for i in range(0, len(moves), batch_size)]
+        else:
+            input_tasks = [[self.board, moves[i:i + batch_size], 0,
+                            batch_size, depth, abort_time, self.search_id,
+                            self.split_turns, self.evaluation]
+                for i in range(0, len(moves), batch_size)]
         self.output_tasks = []
-        self.results_to_collect = PROCESS_COUNT
-        # print ('Main Process: Launching ' + str(PROCESS_COUNT) +
-        #     ' workers to process ' + str(move_count) + ' out of ' + str(len(all_moves)) + ' moves at depth ' +
+        self.results_to_collect = len(input_tasks)
+        # print ('Main Process: Launching ' + str(len(input_tasks)) +
+        #     ' tasks to process ' + str(len(moves)) + ' moves at depth ' +
         #     str(depth) + '.')
-        self.results = pool.imap(decide, input_tasks)
-        # self.sync_output = []
-        # for task in input_tasks:
-        #     self.sync_output.append(decide(task))
+        self.results = worker_pool.get_pool().imap_unordered(decide,
+                                                             input_tasks)
 
-    def start_thinking(self, board, clock=None):
-        """Start considering the next move for the specified game."""
+    def start_thinking(self, board, clock=None, move_time=None):
+        """
+        Start considering the next move for the specified game.  If the
+        player's Clock is given, search deeper and deeper until the time
+        allocated for this move runs out; otherwise search to the default
+        depth.  move_time, if given, is the number of seconds to spend
+        instead of the time allocated from the clock.
+        """
         # Perform a deepening recursive search through the move tree until we
         # run out of time or hit our target depth.
+        self.stop_thinking()
+        self.search_id = worker_pool.new_search_id()
         self.results = None
         self.results_to_collect = 0
         self.board = board
-        self.target_depth = 0
+        self.root_moves = None
         self.current_depth = 0
         self.last_completed_depth = -1
-        self.target_time = None
+        self.completed_output = None
         self.start_time = time()
-        self.launch_workers(self.current_depth)
+        self.target_time = allocate_time(clock, board)
+        if move_time != None:
+            self.target_time = move_time
+        if self.target_time == None:
+            self.target_depth = 0
+            self.abort_time = None
+        else:
+            self.target_depth = MAX_SEARCH_DEPTH
+            if self.split_turns:
+                self.target_depth *= 2
+            self.abort_time = self.start_time + self.target_time
+        # A won endgame the solver can prove needs no search, and neither
+        # does a position in the opening book.  The solver plays moves out,
+        # so it gets a copy rather than the game's board.
+        self.known_move = regions.winning_move(Board(prev_board=board))
+        self.known_move_value = 'won endgame (solved)'
+        if self.known_move == None and self.opening_book != None:
+            self.known_move = self.opening_book.best_move(board)
+            self.known_move_value = 'opening book'
+        if self.known_move != None:
+            return
+        if self.search == 'mcts':
+            self.launch_mcts()
+        else:
+            self.launch_workers(self.current_depth)
 
     def stop_thinking(self):
-        """Stop considering moves, whether or not a move was decided."""
-        pass
+        """
+        Stop considering moves, whether or not a move was decided.  Any worker
+        tasks still running for the search are cancelled and their results
+        will be ignored.
+        """
+        if self.search_id != None:
+            worker_pool.cancel_search(self.search_id)
+            self.search_id = None
+        self.results = None
+        self.results_to_collect = 0
+        self.board = None
+        self.root_moves = None
+        self.output_tasks = []
+        self.completed_output = None
+        self.mcts_pending = []
+        self.mcts_outputs = {}
+        self.known_move = None
+
+    def is_out_of_time(self):
+        return self.abort_time != None and time() >= self.abort_time
 
     def next_move(self):
         """
         Return the move decided on after the last call to start_thinking(),
         or return None if the next move is not decided yet.
         """
+        if self.known_move != None:
+            return self.finish_known_move()
+        if self.search == 'mcts':
+            return self.next_mcts_move()
         if self.results == None:
            return self.results
         try:
@@ -241,72 +916,248 @@ class AIPlayer(Player):
             while self.results_to_collect > 0:
                 self.output_tasks.append(self.results.next(timeout=0.05))
                 self.results_to_collect -= 1
+        except TimeoutError:
+            if self.completed_output != None and self.is_out_of_time():
+                # Out of time: abandon the iteration in progress and go with
+                # the last one that finished.
+                return self.finish_thinking()
+            return None
 
-            # self.output_tasks = self.sync_output
+        # self.output_tasks = self.sync_output
 
-            # Are we really done, or should we try for a deeper ply?
-            self.last_completed_depth = self.current_depth
-            if (self.current_depth < self.target_depth):
-                self.current_depth += 1
+        for output in self.output_tasks:
+            if output != None and output.get('aborted'):
+                # This iteration ran out of time part way through.
+                if self.completed_output != None:
+                    return self.finish_thinking()
+                # No iteration has finished yet (the first one has no time
+                # limit, so a worker lost the published position): run it
+                # again.
                 self.launch_workers(self.current_depth)
                 return None
+        self.completed_output = self.output_tasks
+        self.last_completed_depth = self.current_depth
+        iteration_time = time() - self.iteration_start_time
 
-            # TODO: if we ran out of time, return none.
-
-            # OK we're really done.  Aggregate worker process results.
-            total_time = time() - self.start_time
-            best_move = 'resign'
-            best_move_value = (float('-inf') if self.board.to_move == 'white'
-                else float('inf'))
-            total_boards_evaluated = 0
-            total_avg_move_value = 0
-            total_moves_evaluated = 0
-            for output in self.output_tasks:
-                if output == None:
-                    # This was an aborted worker process - no work or 
-                    # ran out of time.
-                    continue
-                if self.board.to_move == 'white':
-                    if output['best_move_value'] > best_move_value:
-                        best_move = output['best_move']
-                        best_move_value = output['best_move_value']
-                else:
-                    if output['best_move_value'] < best_move_value:
-                        best_move = output['best_move']
-                        best_move_value = output['best_move_value']
-                total_boards_evaluated += output['boards_evaluated']
-                total_avg_move_value += (output['avg_move_value'] *
-                    float(output['moves_evaluated']))
-                total_moves_evaluated += output['moves_evaluated']
+        # Are we really done, or should we try for a deeper ply?  Don't start
+        # a ply we can't expect to finish.
+        growth = DEEPENING_GROWTH
+        if self.split_turns:
+            # Each iteration only adds half a ply.
+            growth = DEEPENING_GROWTH ** 0.5
+        if (self.current_depth < self.target_depth and
+            not self.is_out_of_time() and
+            (iteration_time * growth) < (self.abort_time - time())):
+            self.current_depth += 1
+            self.launch_workers(self.current_depth)
+            return None
+
+        return self.finish_thinking()
+
+    def finish_thinking(self):
+        """
+        Aggregate the worker process results of the last completed search
+        iteration, reset for the next search, and return the chosen move.
+        """
+        # Results arrive in no particular order, so break ties between equally
+        # good moves by the order the moves were queued in.
+        ranked_moves = order_moves(self.root_moves, self.completed_output,
+                                   self.board.to_move)
+        best_move = ranked_moves[0] if ranked_moves else 'resign'
+        best_move_value = (float('-inf') if self.board.to_move == 'white'
+            else float('inf'))
+        total_boards_evaluated = 0
+        tt_stats = {"hits": 0, "misses": 0, "collisions": 0, "stores": 0}
+        total_avg_move_value = 0
+        total_moves_evaluated = 0
+        exact_values = {}
+        for output in self.completed_output:
+            if output == None:
+                # This was a worker process with no work to do.
+                continue
+            for move, value, exact in output['move_values']:
+                if move == best_move:
+                    best_move_value = value
+                if exact:
+                    exact_values[move] = value
+            total_boards_evaluated += output['boards_evaluated']
+            for stat in tt_stats:
+                tt_stats[stat] += output['tt_stats'][stat]
+            total_avg_move_value += (output['avg_move_value'] *
+                float(output['moves_evaluated']))
+            total_moves_evaluated += output['moves_evaluated']
+        if total_moves_evaluated > 0:
             total_avg_move_value /= float(total_moves_evaluated)
+        if best_move != 'resign':
+            best_move = self.board.decode_move(best_move)
+
+        # Resign if a win seems unlikely.
+        if self.board.to_move == 'white':
+            if best_move_value < 20.0:
+                best_move = 'resign'
+        else:
+            if best_move_value > 80.0:
+                best_move = 'resign'
+
+        depth_units = ' half plies' if self.split_turns else ''
+        self.print_decision(best_move, best_move_value, [
+            ('avg. move value', total_avg_move_value),
+            ('target depth', str(self.target_depth) + depth_units),
+            ('actual depth', str(self.last_completed_depth) + depth_units),
+            ('boards evaluated', total_boards_evaluated),
+            ('hash table', '%(hits)d hits, %(misses)d misses, '
+             '%(collisions)d collisions, %(stores)d stores' % tt_stats)])
+
+        # Reset members, cancelling any iteration still in progress.
+        self.stop_thinking()
+        self.input_tasks = None
+        self.last_move_values = [(move, exact_values[move])
+                                 for move in ranked_moves
+                                 if move in exact_values]
+
+        return best_move
+
+    def launch_mcts(self):
+        """
+        Start a Monte Carlo search of the root moves: publish the position
+        and keep a task running on every worker (see decide_mcts).  Without
+        a clock, the search runs for MCTS_PLAYOUTS_PER_DIFFICULTY playouts
+        per worker per difficulty level.
+        """
+        self.root_moves = self.sample_root_moves()
+        self.mcts_outputs = {}
+        self.mcts_pending = []
+        self.target_playouts = None
+        if self.abort_time == None:
+            self.target_playouts = (MCTS_PLAYOUTS_PER_DIFFICULTY *
+                                    self.difficulty *
+                                    worker_pool.process_count())
+        self.mcts_task = [None, None, len(self.root_moves), self.search_id,
+                          MCTS_SLICE, self.abort_time, self.evaluation]
+        if not worker_pool.publish_position(self.search_id, self.board,
+                                            self.root_moves):
+            self.send_mcts_position()
+        self.queue_mcts_tasks()
+
+    def send_mcts_position(self):
+        """
+        Send the board and root moves along with every Monte Carlo task from
+        now on, instead of through the shared buffer.
+        """
+        self.mcts_task = [self.board, self.root_moves] + self.mcts_task[2:]
+
+    def queue_mcts_tasks(self):
+        """Queue tasks until there is one per worker in flight."""
+        pool = worker_pool.get_pool()
+        while len(self.mcts_pending) < worker_pool.process_count():
+            self.mcts_pending.append(pool.apply_async(decide_mcts,
+                                                      (self.mcts_task,)))
+
+    def mcts_playouts(self):
+        """Returns the playouts reported by all the workers so far."""
+        return sum(output['playouts'] for output in self.mcts_outputs.values())
+
+    def next_mcts_move(self):
+        """
+        next_move() for a Monte Carlo search: collects finished worker tasks
+        and keeps the workers busy until the time or playouts run out, then
+        returns the move chosen so far.  The search only ends once at least
+        one worker has reported, so tasks keep being queued until one has.
+        """
+        if self.board == None:
+            return None
+        if not self.root_moves:
+            return self.finish_mcts()
+        pending = []
+        for result in self.mcts_pending:
+            if not result.ready():
+                pending.append(result)
+                continue
+            output = result.get()
+            if output.get('aborted'):
+                # The worker couldn't read the shared buffer, which may have
+                # been reused since: don't rely on it again.
+                self.send_mcts_position()
+                continue
+            # Each report covers the worker's whole tree, so only its latest
+            # counts.
+            latest = self.mcts_outputs.get(output['worker'])
+            if latest == None or output['playouts'] > latest['playouts']:
+                self.mcts_outputs[output['worker']] = output
+        self.mcts_pending = pending
+        if self.target_playouts == None:
+            done = self.is_out_of_time()
+        else:
+            done = self.mcts_playouts() >= self.target_playouts
+        if done and self.mcts_outputs:
+            return self.finish_mcts()
+        self.queue_mcts_tasks()
+        if self.mcts_pending:
+            self.mcts_pending[0].wait(0.05)
+        return None
 
-            # Resign if a win seems unlikely.
+    def finish_mcts(self):
+        """
+        Merge the workers' Monte Carlo trees, reset for the next search, and
+        return the most visited root move.
+        """
+        stats = mcts.merge_move_stats([output['move_stats']
+            for output in self.mcts_outputs.values()])
+        best = mcts.best_move(stats)
+        best_move_value = (float('-inf') if self.board.to_move == 'white'
+            else float('inf'))
+        chosen = 'resign'
+        if best != None:
+            chosen = self.board.decode_move(best[0])
+            # Rewards are from the mover's point of view; values from
+            # WHITE's.
+            reward = best[2] / best[1]
             if self.board.to_move == 'white':
-                if best_move_value < 20.0:
-                    best_move = 'resign'
+                best_move_value = 100.0 * reward
             else:
-                if best_move_value > 80.0:
-                    best_move = 'resign'
-
-            print self.board.to_move.capitalize() + ' moves ' + str(best_move) + '.'
-            print '        move value: ' + str(best_move_value)
-            print '    possible moves: ' + str(len(self.board.get_valid_moves()))
-            print '   avg. move value: ' + str(total_avg_move_value)
-            # print ('       target time: ' + str(self.target_time) +
-            #     (' sec' if type(self.target_time) == int else ''))
-            print '       actual time: ' + str(int(total_time)) + ' sec'
-            # print '      target depth: ' + str(self.target_depth)
-            # print '      actual depth: ' + str(self.last_completed_depth)
-            print '  boards evaluated: ' + str(total_boards_evaluated)
-
-            # Reset members.
-            self.results = None
-            self.results_to_collect = 0
-            self.board = None
-            self.output_tasks = []
-            self.input_tasks = None
-
-            return best_move
+                best_move_value = 100.0 * (1.0 - reward)
 
-        except TimeoutError:
-            return None
+        # Resign if a win seems unlikely.
+        if self.board.to_move == 'white':
+            if best_move_value < 20.0:
+                chosen = 'resign'
+        else:
+            if best_move_value > 80.0:
+                chosen = 'resign'
+
+        search_stats = [('playouts', self.mcts_playouts()),
+                        ('trees', len(self.mcts_outputs)),
+                        ('root moves tried', len(stats))]
+        if best != None:
+            search_stats.append(('best move visits', best[1]))
+        self.print_decision(chosen, best_move_value, search_stats)
+
+        # Reset members, cancelling any tasks still running.
+        self.stop_thinking()
+
+        return chosen
+
+    def finish_known_move(self):
+        """
+        Reset for the next search and return the move found without
+        searching: one the endgame solver found to win, or a book move.
+        """
+        best_move = self.board.decode_move(self.known_move)
+        self.print_decision(best_move, self.known_move_value)
+        self.stop_thinking()
+        return best_move
+
+    def print_decision(self, best_move, value, search_stats=()):
+        """
+        Print a summary of the move decided on: the move, its value (or how
+        it was found), the time taken, and the (label, value) pairs of
+        search_stats.
+        """
+        print self.board.to_move.capitalize() + ' moves ' + str(best_move) + '.'
+        lines = [('move value', value),
+                 ('possible moves', len(self.board.get_valid_move_codes())),
+                 ('target time', str(self.target_time) +
+                  (' sec' if self.target_time != None else '')),
+                 ('actual time', str(int(time() - self.start_time)) + ' sec')]
+        for label, stat in lines + list(search_stats):
+            print '%18s: %s' % (label, stat)
@@ -0,0 +1,229 @@
+from rays import get_ray_table
+from move import TO_SHIFT, ARROW_SHIFT
+from square import get_square_table
+
+# Board index constants, matching those exported by board.py.
+EMPTY = 0
+WHITE = 1
+BLACK = 2
+ARROW = 3
+
+def iter_bits(bits):
+    """Yields the index of each set bit in bits, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+def count_bits(bits):
+    """Returns the number of set bits in bits."""
+    return bin(bits).count('1')
+
+class BitBoard(object):
+    """
+    Occupancy of a Game of the Amazons board stored as integer bitboards: one
+    for white amazons, one for black amazons and one for arrows.
+
+    Square (x, y) maps to bit y * stride + x, where stride is one more than the
+    board width.  The extra column of each row is a guard column that is never
+    part of the board, so a shift that walks off the east or west edge lands
+    on a guard bit and is masked away by the valid-squares mask.  Shifts off
+    the top are masked the same way and shifts off the bottom simply fall off
+    the end of the integer.
+    """
+
+    def __init__(self, width, height, white=0, black=0, arrows=0):
+        self.width = width
+        self.height = height
+        self.stride = width + 1
+        self.white = white
+        self.black = black
+        self.arrows = arrows
+
+        row = (1 << width) - 1
+        valid = 0
+        for y in range(height):
+            valid |= row << (y * self.stride)
+        self.valid = valid
+
+        s = self.stride
+        # Shift amounts for the eight queen directions, in the same order as
+        # board.DIRECTIONS: N, NE, E, SE, S, SW, W, NW.
+        self.shifts = (s, s + 1, 1, 1 - s, -s, -s - 1, -1, s - 1)
+
+        self.ray_table = get_ray_table(width, height)
+        self.square_table = get_square_table(width, height)
+
+    @classmethod
+    def from_squares(cls, width, height, white_amazons, black_amazons, arrows):
+        """
+        Builds a BitBoard from Squares lists, raising a ValueError if a square
+        is off the board or occupied twice.
+        """
+        bb = cls(width, height)
+        for sqs, occupant in ((white_amazons, WHITE), (black_amazons, BLACK),
+                              (arrows, ARROW)):
+            for sq in sqs:
+                if (sq[0] >= width or sq[1] >= height):
+                    raise ValueError("Board position %s is not on the board" %
+                                     str(sq))
+                i = bb.index(sq[0], sq[1])
+                if bb.occupant(i) != EMPTY:
+                    raise ValueError("Board position %s is occupied twice" %
+                                     str(sq))
+                bb.place(i, occupant)
+        return bb
+
+    def copy(self):
+        return BitBoard(self.width, self.height, self.white, self.black,
+                        self.arrows)
+
+    def index(self, x, y):
+        """Returns the bit index of square (x, y)."""
+        return y * self.stride + x
+
+    def coords(self, i):
+        """Returns the (x, y) coordinates of bit index i."""
+        return (i % self.stride, i // self.stride)
+
+    def square(self, i):
+        """Returns the shared Square for bit index i."""
+        return self.square_table[i]
+
+    @property
+    def occupied(self):
+        return self.white | self.black | self.arrows
+
+    @property
+    def empty(self):
+        return self.valid & ~(self.white | self.black | self.arrows)
+
+    def amazons(self, side):
+        """Returns the amazon bitboard for side (WHITE or BLACK)."""
+        return self.white if side == WHITE else self.black
+
+    def occupant(self, i):
+        """Returns EMPTY, WHITE, BLACK or ARROW for bit index i."""
+        bit = 1 << i
+        if self.white & bit:
+            return WHITE
+        if self.black & bit:
+            return BLACK
+        if self.arrows & bit:
+            return ARROW
+        return EMPTY
+
+    def place(self, i, occupant):
+        bit = 1 << i
+        if occupant == WHITE:
+            self.white |= bit
+        elif occupant == BLACK:
+            self.black |= bit
+        elif occupant == ARROW:
+            self.arrows |= bit
+
+    def remove(self, i, occupant):
+        bit = 1 << i
+        if occupant == WHITE:
+            self.white &= ~bit
+        elif occupant == BLACK:
+            self.black &= ~bit
+        elif occupant == ARROW:
+            self.arrows &= ~bit
+
+    def move(self, side, frm, to, arrow):
+        """Moves side's amazon from frm to to and shoots an arrow at arrow."""
+        if side == WHITE:
+            self.white ^= (1 << frm) | (1 << to)
+        else:
+            self.black ^= (1 << frm) | (1 << to)
+        self.arrows |= 1 << arrow
+
+    def undo_move(self, side, frm, to, arrow):
+        """Reverses move(side, frm, to, arrow)."""
+        if side == WHITE:
+            self.white ^= (1 << frm) | (1 << to)
+        else:
+            self.black ^= (1 << frm) | (1 << to)
+        self.arrows &= ~(1 << arrow)
+
+    def move_amazon(self, side, frm, to):
+        """Moves (or unmoves) side's amazon between frm and to."""
+        if side == WHITE:
+            self.white ^= (1 << frm) | (1 << to)
+        else:
+            self.black ^= (1 << frm) | (1 << to)
+
+    def queen_reach(self, i, empty):
+        """
+        Returns the bitboard of squares a queen on bit index i can reach
+        through the squares set in empty, using the precomputed ray masks for
+        this board size.
+        """
+        return self.ray_table.queen_reach(i, empty)
+
+    def generate_moves(self, side):
+        """
+        Yields a (from, to, arrow) tuple of bit indices for every legal move
+        for side.
+        """
+        empty = self.empty
+        queen_reach = self.ray_table.queen_reach
+        for frm in iter_bits(self.amazons(side)):
+            arrow_empty = empty | (1 << frm)
+            for to in iter_bits(queen_reach(frm, empty)):
+                for arrow in iter_bits(queen_reach(to, arrow_empty)):
+                    yield (frm, to, arrow)
+
+    def generate_move_codes(self, side):
+        """
+        Yields the packed move code (see move.pack_move) of every legal move
+        for side.
+        """
+        empty = self.empty
+        queen_reach = self.ray_table.queen_reach
+        for frm in iter_bits(self.amazons(side)):
+            arrow_empty = empty | (1 << frm)
+            for to in iter_bits(queen_reach(frm, empty)):
+                base = frm | (to << TO_SHIFT)
+                for arrow in iter_bits(queen_reach(to, arrow_empty)):
+                    yield base | (arrow << ARROW_SHIFT)
+
+    def generate_amazon_moves(self, side):
+        """
+        Yields the packed move code of every amazon move (from, to) for side,
+        with the arrow field left 0.
+        """
+        empty = self.empty
+        queen_reach = self.ray_table.queen_reach
+        for frm in iter_bits(self.amazons(side)):
+            for to in iter_bits(queen_reach(frm, empty)):
+                yield frm | (to << TO_SHIFT)
+
+    def count_moves(self, side):
+        """
+        Returns the number of legal moves for side without enumerating them:
+        the sum, over every square each amazon can reach, of the number of
+        arrow shots from that square with the amazon's origin vacated.
+        """
+        empty = self.empty
+        queen_reach = self.ray_table.queen_reach
+        total = 0
+        for frm in iter_bits(self.amazons(side)):
+            arrow_empty = empty | (1 << frm)
+            for to in iter_bits(queen_reach(frm, empty)):
+                total += bin(queen_reach(to, arrow_empty)).count('1')
+        return total
+
+    def has_moves(self, side):
+        """
+        Returns True if side has any legal move.  An amazon that can move at
+        all can always shoot back at the square it left, so this only needs
+        to find one amazon with somewhere to go.
+        """
+        empty = self.empty
+        queen_reach = self.ray_table.queen_reach
+        for frm in iter_bits(self.amazons(side)):
+            if queen_reach(frm, empty):
+                return True
+        return False
@@ -1,7 +1,11 @@
-from square import Square
+from square import Square, get_square_table
 from squares import Squares
-from move import Move
+from move import Move, unpack_move
 from invalid_move_error import InvalidMoveError
+from bitboard import BitBoard, count_bits, iter_bits
+from zobrist import get_zobrist_table
+from regions import Region, RegionTracker
+import symmetry
 
 # Board index constants.
 EMPTY = 0
@@ -34,53 +38,43 @@ DIRECTIONS = [
     (-1, 1)   # northwest
 ]
 
-# I was seeing funky behavior with this generator when it was an instance
-# method on Board - self references seemed to behave weirdly - I pulled it
-# outside the class.
-def generate_valid_moves(b):
-    max_dist = max(b.width, b.height)
-    # Bizarrely, for amz in b.current_amazons doesn't seem to work here.
-    for j in range(len(b.current_amazons)):
-        amz = b.current_amazons[j]
-        i = 0
-        # For each amazon,
-        for amz_dir in DIRECTIONS:
-            # For each amazon direction,
-            for amz_dist in range(1, max_dist):
-                # For each amazon distance,
-                amz_target_x = amz.x + (amz_dir[0] * amz_dist)
-                amz_target_y = amz.y + (amz_dir[1] * amz_dist)
-                if (amz_target_x < 0 or amz_target_x >= b.width or
-                    amz_target_y < 0 or amz_target_y >= b.height or
-                    b[amz_target_x][amz_target_y] != EMPTY):
-                    # Outside the board or hit something -
-                    # done with this direction.
-                    break
-                for arr_dir in DIRECTIONS:
-                    # For each arrow direction,
-                    for arr_dist in range(1, max_dist):
-                        # For each arrow distance,
-                        arr_x = amz_target_x + (arr_dir[0] * arr_dist)
-                        arr_y = amz_target_y + (arr_dir[1] * arr_dist)
-                        if (arr_x < 0 or arr_x >= b.width or
-                            arr_y < 0 or arr_y >= b.height or
-                            (b[arr_x][arr_y] != EMPTY and
-                                not (arr_x == amz.x and arr_y == amz.y))):
-                            # Outside the board or hit something
-                            # besides the old position of the moving
-                            # amazon - done with this direction.
-                            break
-                        # Return the move.
-                        i += 1
-                        yield Move(amz,
-                            (amz_target_x, amz_target_y),
-                            (arr_x, arr_y))
+def generate_valid_moves(b, side=None):
+    """
+    Yields a Move for every legal move available to side (WHITE or BLACK) on
+    Board b, defaulting to the side to move.  Moves are enumerated on b's
+    bitboards and only converted to Move objects as they are yielded.
+    """
+    if side == None:
+        side = b._to_move
+    squares = b.bits.square_table
+    for frm, to, arrow in b.bits.generate_moves(side):
+        yield Move(squares[frm], squares[to], squares[arrow])
+
+def side_constant(side):
+    """
+    Returns WHITE or BLACK for side given as a board constant or as 'white',
+    'black', 'w' or 'b'.
+    """
+    if side == WHITE or side == BLACK:
+        return side
+    if type(side) == str:
+        side = side.lower()
+        if side in ['white', 'w']:
+            return WHITE
+        if side in ['black', 'b']:
+            return BLACK
+    raise ValueError(("side should be Board.WHITE, Board.BLACK, 'white', "
+                      "'black', 'w', or 'b'"))
 
 class Board(object):
     """
     A Game of the Amazons board.  Encapsulates the state of the board at a
     specific turn during a game, and functionality for enumerating legal moves,
     calculating territory, and such.
+
+    hash_key holds a 64-bit Zobrist hash of the position (including the side
+    to move), kept up to date incrementally by move_in_place and
+    undo_move_in_place.
     """
 
     @classmethod
@@ -92,6 +86,9 @@ class Board(object):
                  black_amazons="a7, d10, g10, j7", arrows="", to_move=WHITE,
                  prev_board=None, move=None, is_debug=False):
         self.is_debug = is_debug
+        # Tracks the board's regions once they're first asked for (see
+        # get_regions).
+        self._region_tracker = None
         if (prev_board == None and move == None):
             # Regular constructor.
             self.width = width
@@ -100,6 +97,11 @@ class Board(object):
             self.black_amazons = Squares(black_amazons)
             self.arrows = Squares(arrows)
             self.to_move = to_move
+            self.bits = BitBoard.from_squares(width, height,
+                                              self.white_amazons,
+                                              self.black_amazons, self.arrows)
+            self.zobrist = get_zobrist_table(width, height)
+            self.hash_key = self.zobrist.hash(self.bits, self._to_move)
 
         elif isinstance(prev_board, Board) and move == None:
             # Copy constructor.
@@ -109,6 +111,9 @@ class Board(object):
             self.black_amazons = Squares(prev_board.black_amazons)
             self.arrows = Squares(prev_board.arrows)
             self.to_move = prev_board.to_move
+            self.bits = prev_board.bits.copy()
+            self.zobrist = prev_board.zobrist
+            self.hash_key = prev_board.hash_key
 
         elif isinstance(prev_board, Board) and isinstance(move, Move):
             # Move constructor - construct a board like prev_board but with
@@ -141,6 +146,12 @@ class Board(object):
             # Flip whose turn it is.
             self._to_move = WHITE if prev_board.to_move == 'black' else BLACK
 
+            self.bits = BitBoard.from_squares(self.width, self.height,
+                                              self.white_amazons,
+                                              self.black_amazons, self.arrows)
+            self.zobrist = prev_board.zobrist
+            self.hash_key = self.zobrist.hash(self.bits, self._to_move)
+
         else:
             raise ValueError('Invalid Board constructor arguments')
 
@@ -229,9 +240,41 @@ class Board(object):
         query in other methods to see if we need to generate them or not.
         """
         if not hasattr(self, '_valid_moves'):
-            self._valid_moves = [mv for mv in generate_valid_moves(self)]
+            width = self.width
+            self._valid_moves = [Move.from_code(code, width)
+                                 for code in self.get_valid_move_codes()]
         return self._valid_moves
 
+    def get_valid_move_codes(self):
+        """
+        Memoizes and/or returns the list of legal moves for the side to move
+        as packed move codes (see encode_move), in the same order as
+        get_valid_moves().
+        """
+        if not hasattr(self, '_valid_move_codes'):
+            self._valid_move_codes = list(
+                self.bits.generate_move_codes(self._to_move))
+        return self._valid_move_codes
+
+    def count_valid_moves(self, side=None):
+        """
+        Returns the number of legal moves side would have in this position,
+        defaulting to the side to move.  The count is computed on the
+        bitboards without building any Move objects.
+        """
+        side = self._to_move if side == None else side_constant(side)
+        if side == self._to_move and hasattr(self, '_valid_move_codes'):
+            return len(self._valid_move_codes)
+        return self.bits.count_moves(side)
+
+    def has_valid_moves(self, side=None):
+        """
+        Returns True if side (defaulting to the side to move) has at least one
+        legal move in this position.
+        """
+        side = self._to_move if side == None else side_constant(side)
+        return self.bits.has_moves(side)
+
     def get_valid_opponent_moves(self):
         """
         Memoizes and/or returns the list of valid moves the opponent would have
@@ -239,9 +282,9 @@ class Board(object):
         opponent's turn.
         """
         if not hasattr(self, '_valid_opponent_moves'):
-            inv = self.get_inverse()
-            self._valid_opponent_moves = [mv for mv in 
-                generate_valid_moves(inv)]
+            side = WHITE if self._to_move == BLACK else BLACK
+            self._valid_opponent_moves = [mv for mv in
+                generate_valid_moves(self, side)]
         return self._valid_opponent_moves
 
     def __getitem__(self, index):
@@ -276,46 +319,16 @@ class Board(object):
         by any arrow or amazon (not including one that may be at start).
         Returns False otherwise.
         """
-        cur = start
-
-        # Figure out which direction to move.
-        dir = {'x': 0, 'y': 0}
-        if cur.x < end.x:
-            dir['x'] = 1
-        elif cur.x == end.x:
-            dir['x'] = 0
-        else: # cur.x > end.x
-            dir['x'] = -1
-        if cur.y < end.y:
-            dir['y'] = 1
-        elif cur.y == end.y:
-            dir['y'] = 0
-        else: # cur.y > end.y
-            dir['y'] = -1
-        if dir['x'] == 0 and dir['y'] == 0:
-            return False
-
-        # Attempt to walk the path.
-        while (cur != end):
-            try:
-                cur = Square(cur.x + dir['x'], cur.y + dir['y'])
-            except ValueError:
-                # Must have gone off the board in a negative direction.
+        bits = self.bits
+        for sq in (start, end):
+            if sq.x >= self.width or sq.y >= self.height:
                 return False
 
-            if cur == ignore:
-                continue
-
-            try:
-                occupant = self[cur.x][cur.y]
-                if (occupant != EMPTY):
-                    return False
-            except IndexError:
-                # We must have walked off the board due to the target not being
-                # in a straight line from the starting square.
-                return False
-
-        return True
+        empty = bits.empty
+        if ignore != None:
+            empty |= 1 << bits.index(ignore.x, ignore.y)
+        return bits.ray_table.is_path_clear(bits.index(start.x, start.y),
+                                            bits.index(end.x, end.y), empty)
 
     def check_is_move_valid(self, move):
         """
@@ -335,7 +348,8 @@ class Board(object):
 
         # Make sure there's an amazon of the right color at the specified
         # from location.
-        amz = self[frm[0]][frm[1]]
+        bits = self.bits
+        amz = bits.occupant(bits.index(frm.x, frm.y))
         if amz != self._to_move:
             raise InvalidMoveError('No ' + self.to_move +
                                    ' amazon at ' + str(frm))
@@ -379,62 +393,287 @@ class Board(object):
         if hasattr(self, '_valid_moves'):
             # del self._valid_moves[:]
             del self._valid_moves
+        if hasattr(self, '_valid_move_codes'):
+            del self._valid_move_codes
         if hasattr(self, '_columns'):
             # for c in self._columns:
             #     del c[:]
             # del self._columns[:]
             del self._columns
 
-    def move_in_place(self, move):
+    def move_in_place(self, move, validate=True):
         """
         Makes the specified move on this board object, without creating a new
-        board.  If the specified move is not legal for this board, an
-        InvalidMoveError is raised.
+        board.  The move may be anything Move() accepts or a packed move code
+        (see encode_move).  If the specified move is not legal for this board,
+        an InvalidMoveError is raised, unless validate is False, which the AI
+        search uses for move codes it generated from this board itself.
         """
-        self.check_is_move_valid(move);
+        if isinstance(move, (int, long)):
+            code = move
+            if validate:
+                self.check_is_move_valid(self.decode_move(code))
+        else:
+            move = Move(move)
+            if validate:
+                self.check_is_move_valid(move)
+            code = self.encode_move(move)
 
         self.clear_memos()
+        start, end, arrow = unpack_move(code)
+        squares = self.bits.square_table
 
         # Move the amazon.
-        start = move[0]
-        end = move[1]
-        arrow = move[2]
-
-        move_us = (self.white_amazons if self.to_move == 'white'
+        move_us = (self.white_amazons if self._to_move == WHITE
                    else self.black_amazons)
 
-        move_us.remove(start)
-        move_us.append(end)
+        move_us.remove(squares[start])
+        move_us.append(squares[end])
 
         # Shoot the arrow.
-        self.arrows.append(arrow)
+        self.arrows.append(squares[arrow])
+
+        self.bits.move(self._to_move, start, end, arrow)
+        self.hash_key ^= self.zobrist.move_delta(self._to_move, start, end,
+                                                 arrow)
+        if self._region_tracker != None:
+            self._region_tracker.place_arrow(arrow)
 
         # Flip whose turn it is.
-        self._to_move = WHITE if self.to_move == 'black' else BLACK
+        self._to_move = WHITE if self._to_move == BLACK else BLACK
 
     def undo_move_in_place(self, move):
         """
-        Undoes the specified move on this board object, without creating a new
-        board.
+        Undoes the specified move (a Move or packed move code) on this board
+        object, without creating a new board.
         """
+        code = (move if isinstance(move, (int, long))
+                else self.encode_move(move))
+
         self.clear_memos()
+        start, end, arrow = unpack_move(code)
+        squares = self.bits.square_table
 
         # Un-move the amazon.
-        start = move[0]
-        end = move[1]
-        arrow = move[2]
-
-        move_us = (self.white_amazons if self.to_move == 'black'
+        moved = WHITE if self._to_move == BLACK else BLACK
+        move_us = (self.white_amazons if moved == WHITE
                    else self.black_amazons)
 
-        move_us.remove(end)
-        move_us.append(start)
+        move_us.remove(squares[end])
+        move_us.append(squares[start])
 
         # Un-shoot the arrow.
-        self.arrows.remove(arrow)
+        self.arrows.remove(squares[arrow])
+
+        self.bits.undo_move(moved, start, end, arrow)
+        self.hash_key ^= self.zobrist.move_delta(moved, start, end, arrow)
+        self.unshoot_tracked_arrow(arrow)
 
         # Flip whose turn it is.
-        self._to_move = WHITE if self.to_move == 'black' else BLACK
+        self._to_move = moved
+
+    def move_amazon_in_place(self, code):
+        """
+        Makes only the amazon move of packed move code on this board: the side
+        to move stays the same until shoot_arrow_in_place() finishes the
+        turn.  The AI search uses this to choose amazon moves and arrow shots
+        separately.  Nothing is validated, and the move generation methods
+        shouldn't be used on a board with a turn half made.
+        """
+        self.clear_memos()
+        start, end, arrow = unpack_move(code)
+        squares = self.bits.square_table
+        move_us = (self.white_amazons if self._to_move == WHITE
+                   else self.black_amazons)
+        move_us.remove(squares[start])
+        move_us.append(squares[end])
+        self.bits.move_amazon(self._to_move, start, end)
+        self.hash_key ^= self.zobrist.amazon_delta(self._to_move, start, end)
+
+    def undo_move_amazon_in_place(self, code):
+        """Undoes move_amazon_in_place(code)."""
+        self.clear_memos()
+        start, end, arrow = unpack_move(code)
+        squares = self.bits.square_table
+        move_us = (self.white_amazons if self._to_move == WHITE
+                   else self.black_amazons)
+        move_us.remove(squares[end])
+        move_us.append(squares[start])
+        self.bits.move_amazon(self._to_move, start, end)
+        self.hash_key ^= self.zobrist.amazon_delta(self._to_move, start, end)
+
+    def shoot_arrow_in_place(self, arrow):
+        """
+        Finishes a turn begun with move_amazon_in_place() by shooting an
+        arrow at square index arrow.
+        """
+        self.clear_memos()
+        self.arrows.append(self.bits.square_table[arrow])
+        self.bits.place(arrow, ARROW)
+        self.hash_key ^= self.zobrist.arrow_delta(arrow)
+        self._to_move = WHITE if self._to_move == BLACK else BLACK
+        if self._region_tracker != None:
+            self._region_tracker.place_arrow(arrow)
+
+    def undo_shoot_arrow_in_place(self, arrow):
+        """Undoes shoot_arrow_in_place(arrow)."""
+        self.clear_memos()
+        self.arrows.remove(self.bits.square_table[arrow])
+        self.bits.remove(arrow, ARROW)
+        self.hash_key ^= self.zobrist.arrow_delta(arrow)
+        self._to_move = WHITE if self._to_move == BLACK else BLACK
+        self.unshoot_tracked_arrow(arrow)
+
+    def unshoot_tracked_arrow(self, arrow):
+        """
+        Updates the tracked regions, if any, for the arrow at square index
+        arrow having been removed.
+        """
+        if (self._region_tracker != None and
+            not self._region_tracker.remove_arrow(arrow)):
+            # Shot before the regions were tracked: start over.
+            self._region_tracker = None
+
+    def get_regions(self):
+        """
+        Returns the list of Regions (see regions.py) the arrows have walled
+        the board into.  They are found the first time this is called and
+        then kept up to date by the in place move methods, which only need
+        to redo the region each arrow lands in, and only if it was cut in two.
+        """
+        if self._region_tracker == None:
+            self._region_tracker = RegionTracker(self.bits)
+        return [Region(self.bits, mask)
+                for mask in self._region_tracker.masks]
+
+    def square_index(self, square):
+        """
+        Returns the bitboard index of square, anything Square() accepts, or
+        square itself if it already is one.
+        """
+        if isinstance(square, (int, long)):
+            return square
+        square = Square(square)
+        return self.bits.index(square[0], square[1])
+
+    def region_of(self, square):
+        """
+        Returns the bitboard of the squares in the same region as square (see
+        square_index), or 0 if there is an arrow on it.
+        """
+        if self._region_tracker == None:
+            self._region_tracker = RegionTracker(self.bits)
+        return self._region_tracker.region_of(self.square_index(square))
+
+    def region_size(self, square):
+        """
+        Returns the number of squares, empty or holding an amazon, in the
+        region of square.
+        """
+        return count_bits(self.region_of(square))
+
+    def region_amazons(self, square):
+        """
+        Returns (white, black) bitboards of the amazons in the region of
+        square.
+        """
+        region = self.region_of(square)
+        return (region & self.bits.white, region & self.bits.black)
+
+    def encode_move(self, move):
+        """
+        Returns the packed move code for move (anything Move() accepts) on
+        this board.  Move codes store the from, to and arrow square indices
+        in one int, which is far cheaper to generate, store and send to
+        worker processes than a Move.
+        """
+        return Move(move).to_code(self.width)
+
+    def decode_move(self, code):
+        """Returns the Move for a packed move code on this board."""
+        return Move.from_code(code, self.width)
+
+    def transformed(self, transform):
+        """
+        Returns a new Board with this position flipped and turned by
+        transform (see symmetry.py), with the same side to move.  Raises a
+        ValueError if transform isn't a symmetry of this board's shape.
+        """
+        if not 0 <= transform < symmetry.transform_count(self.width,
+                                                          self.height):
+            raise ValueError("Transform %s is not a symmetry of a %dx%d board"
+                             % (str(transform), self.width, self.height))
+        square_map = symmetry.get_square_map(self.width, self.height,
+                                             transform)
+        bits = self.bits
+        squares = [[bits.square(square_map[i]) for i in iter_bits(mask)]
+                   for mask in (bits.white, bits.black, bits.arrows)]
+        return Board(self.width, self.height, squares[0], squares[1],
+                     squares[2], self._to_move)
+
+    def canonical_form(self):
+        """
+        Returns (board, transform): the canonical variant of this position
+        (see symmetry.canonical_transform), which all its mirror images
+        share, as a new Board, and the transform that makes it from this
+        one.  Moves are mapped between the two with transform_move and
+        untransform_move.
+        """
+        transform = symmetry.canonical_transform(self.bits)[0]
+        return (self.transformed(transform), transform)
+
+    def canonical_key(self):
+        """
+        Returns (key, transform): the hash_key the canonical variant of this
+        position would have (see canonical_form), for keying caches that
+        should treat mirror images alike, and the transform that makes the
+        variant from this position.  Cheaper than canonical_form, as no
+        Board is built.
+        """
+        transform, masks = symmetry.canonical_transform(self.bits)
+        variant = BitBoard(self.width, self.height, *masks)
+        return (self.zobrist.hash(variant, self._to_move), transform)
+
+    def transform_move(self, code, transform):
+        """
+        Returns what packed move code on this board becomes on
+        self.transformed(transform).
+        """
+        return symmetry.transform_move(
+            code, symmetry.get_square_map(self.width, self.height, transform))
+
+    def untransform_move(self, code, transform):
+        """
+        Returns the packed move code on this board that packed move code on
+        self.transformed(transform) came from.
+        """
+        return self.transform_move(code, symmetry.inverse(transform))
+
+    def encode_position(self):
+        """
+        Returns the position as a flat list of ints: width, height, side to
+        move, the numbers of white amazons, black amazons and arrows, then the
+        bitboard square index of each of them.  Used to hand positions to
+        worker processes without pickling; see decode_position.
+        """
+        bits = self.bits
+        indices = [[bits.index(sq[0], sq[1]) for sq in sqs]
+                   for sqs in (self.white_amazons, self.black_amazons,
+                               self.arrows)]
+        return ([self.width, self.height, self._to_move] +
+                [len(i) for i in indices] +
+                indices[0] + indices[1] + indices[2])
+
+    @classmethod
+    def decode_position(cls, words):
+        """Returns a new Board for a list made by encode_position."""
+        width, height, to_move, white_count, black_count = [
+            int(w) for w in words[:5]]
+        table = get_square_table(width, height)
+        squares = [table[i] for i in words[6:]]
+        return cls(width, height, squares[:white_count],
+                   squares[white_count:white_count + black_count],
+                   squares[white_count + black_count:], to_move)
 
     def get_inverse(self):
         """
@@ -443,6 +682,7 @@ class Board(object):
         """
         b = Board(prev_board=self)
         b._to_move = WHITE if b.to_move == 'black' else BLACK
+        b.hash_key ^= b.zobrist.black_to_move
         return b
 
 # Export board index constants as properties of the Board class.
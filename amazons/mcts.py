@@ -0,0 +1,196 @@
+from math import log, sqrt
+from random import Random
+
+from bitboard import iter_bits, WHITE
+from move import pack_move
+
+# UCT exploration constant, for rewards between 0.0 (loss) and 1.0 (win).
+EXPLORATION = 0.7
+
+# Progressive widening: a node visited n times may have at most
+# WIDENING_BASE + WIDENING_FACTOR * n ** WIDENING_EXPONENT children, so with
+# thousands of moves per position the tree grows deeper instead of spending
+# every playout trying each move once.
+WIDENING_BASE = 1
+WIDENING_FACTOR = 2.0
+WIDENING_EXPONENT = 0.5
+
+# Random moves played from a new leaf before the position is evaluated.
+ROLLOUT_PLIES = 4
+
+class Node(object):
+    """
+    A node of a MonteCarloTree: the position after move (a packed move code,
+    None for the root).  wins is the total reward of the playouts through
+    the node for the side that made move.
+    """
+
+    __slots__ = ('move', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, move=None, untried=None):
+        self.move = move
+        self.children = []
+        self.untried = untried # moves not yet expanded, last one first
+        self.visits = 0
+        self.wins = 0.0
+
+def widening_limit(visits):
+    """Returns how many children a node with visits playouts may have."""
+    return WIDENING_BASE + int(WIDENING_FACTOR * visits ** WIDENING_EXPONENT)
+
+def random_move(bits, side, rng):
+    """
+    Returns the packed move code of a random legal move for side on BitBoard
+    bits, or None if side has no moves.  An amazon that can move is chosen
+    at random, then where it moves, then where it shoots, which is much
+    faster than choosing uniformly among all the moves.
+    """
+    empty = bits.empty
+    queen_reach = bits.ray_table.queen_reach
+    amazons = [frm for frm in iter_bits(bits.amazons(side))
+               if queen_reach(frm, empty)]
+    if not amazons:
+        return None
+    frm = rng.choice(amazons)
+    to = rng.choice(list(iter_bits(queen_reach(frm, empty))))
+    arrow = rng.choice(list(iter_bits(queen_reach(to, empty | (1 << frm)))))
+    return pack_move(frm, to, arrow)
+
+class MonteCarloTree(object):
+    """
+    A Monte Carlo search tree for the position on board, searched with UCT
+    and progressive widening (see WIDENING_FACTOR).  Each playout walks down
+    the tree, adds one node, plays ROLLOUT_PLIES random moves from it and
+    scores the result with evaluate, a function returning a board evaluation
+    from 0.0 to 100.0 (or -inf or inf for a lost or won game) from WHITE's
+    point of view.
+
+    The search is anytime: call playout() as many times as there is time
+    for, and read the results with move_stats().  board is changed during
+    each playout but always restored afterwards.
+
+    root_moves, if given, are the move codes to consider at the root, best
+    first; progressive widening tries them in that order.  Moves elsewhere
+    in the tree are tried in random order.
+    """
+
+    def __init__(self, board, evaluate, root_moves=None, rng=None):
+        self.board = board
+        self.evaluate = evaluate
+        self.rng = rng if rng != None else Random()
+        self.root_side = board._to_move
+        untried = None
+        if root_moves != None:
+            untried = list(reversed(root_moves))
+        self.root = Node(None, untried)
+        self.playouts = 0
+
+    def untried_moves(self):
+        """Returns the moves of the tree's board, shuffled."""
+        moves = list(self.board.get_valid_move_codes())
+        self.rng.shuffle(moves)
+        return moves
+
+    def select(self, node):
+        """Returns the child of node with the highest UCT value."""
+        scale = EXPLORATION * sqrt(log(node.visits))
+        best = None
+        best_value = float("-inf")
+        for child in node.children:
+            value = (child.wins / child.visits +
+                     scale / sqrt(child.visits))
+            if value > best_value:
+                best = child
+                best_value = value
+        return best
+
+    def rollout(self):
+        """
+        Plays random moves on the tree's board from its current position and
+        returns WHITE's reward for where they lead, leaving the board as it
+        found it.
+        """
+        board = self.board
+        bits = board.bits
+        made = []
+        for ply in range(ROLLOUT_PLIES):
+            move = random_move(bits, board._to_move, self.rng)
+            if move == None:
+                break
+            board.move_in_place(move, validate=False)
+            made.append(move)
+        score = self.evaluate(board)
+        for move in reversed(made):
+            board.undo_move_in_place(move)
+        return min(1.0, max(0.0, score / 100.0))
+
+    def playout(self):
+        """Runs one playout and adds what it found to the tree."""
+        board = self.board
+        node = self.root
+        path = [node]
+        while True:
+            if node.untried == None:
+                node.untried = self.untried_moves()
+            if node.untried and len(node.children) < widening_limit(
+                node.visits):
+                child = Node(node.untried.pop())
+                node.children.append(child)
+                board.move_in_place(child.move, validate=False)
+                path.append(child)
+                break
+            if not node.children:
+                # No moves: the game is over.
+                break
+            node = self.select(node)
+            board.move_in_place(node.move, validate=False)
+            path.append(node)
+        reward = self.rollout()
+        for node in reversed(path[1:]):
+            board.undo_move_in_place(node.move)
+        # The root side made the moves into the nodes at odd depths.
+        white_moves_first = self.root_side == WHITE
+        for depth, node in enumerate(path):
+            node.visits += 1
+            if (depth % 2 == 1) == white_moves_first:
+                node.wins += reward
+            else:
+                node.wins += 1.0 - reward
+        self.playouts += 1
+
+    def move_stats(self):
+        """
+        Returns a list of (move, visits, wins) for every root move searched,
+        with wins from the point of view of the side to move at the root.
+        """
+        return [(child.move, child.visits, child.wins)
+                for child in self.root.children]
+
+def merge_move_stats(stats_lists):
+    """
+    Returns the (move, visits, wins) totals of several lists of move_stats(),
+    such as those of independent trees for the same position.
+    """
+    totals = {}
+    order = []
+    for stats in stats_lists:
+        for move, visits, wins in stats:
+            if move not in totals:
+                totals[move] = [0, 0.0]
+                order.append(move)
+            totals[move][0] += visits
+            totals[move][1] += wins
+    return [(move, totals[move][0], totals[move][1]) for move in order]
+
+def best_move(stats):
+    """
+    Returns the (move, visits, wins) of the most visited move in a list of
+    move_stats(), breaking ties by average reward, or None if it's empty.
+    """
+    best = None
+    for entry in stats:
+        if (best == None or entry[1] > best[1] or
+            (entry[1] == best[1] and
+             entry[2] / entry[1] > best[2] / best[1])):
+            best = entry
+    return best
@@ -1,15 +1,54 @@
+from square import Square
 from squares import Squares
 from invalid_move_error import InvalidMoveError
 
+# Packed move codes hold the from, to and arrow square indices of a move in
+# one int, MOVE_FIELD_BITS bits each, from lowest to highest.  Square indices
+# are bitboard indices: y * (board width + 1) + x.
+MOVE_FIELD_BITS = 16
+MOVE_FIELD_MASK = (1 << MOVE_FIELD_BITS) - 1
+TO_SHIFT = MOVE_FIELD_BITS
+ARROW_SHIFT = MOVE_FIELD_BITS * 2
+
+def pack_move(frm, to, arrow):
+    """Returns the packed move code for the given square indices."""
+    return frm | (to << TO_SHIFT) | (arrow << ARROW_SHIFT)
+
+def unpack_move(code):
+    """Returns the (from, to, arrow) square indices of a packed move code."""
+    return (code & MOVE_FIELD_MASK, (code >> TO_SHIFT) & MOVE_FIELD_MASK,
+            code >> ARROW_SHIFT)
+
 class Move(Squares):
     """
     Represents a single move in a game of Amazons. Just a Squares that's not
     ordered by default to preserve the intended order of the move squares.
     """
 
+    @classmethod
+    def from_code(cls, code, width):
+        """
+        Returns the Move for a packed move code on a board of the given width.
+        """
+        stride = width + 1
+        frm, to, arrow = unpack_move(code)
+        return cls(Square.at(frm % stride, frm // stride),
+                   Square.at(to % stride, to // stride),
+                   Square.at(arrow % stride, arrow // stride))
+
     def __init__(self, *args):
         super(Move, self).__init__(*args, sort=False)
 
         if len(self) != 3:
             raise InvalidMoveError(('A move must specify three squares: from, '
-                                    'to, and arrow locations'))
\ No newline at end of file
+                                    'to, and arrow locations'))
+
+    def to_code(self, width):
+        """
+        Returns the packed move code for this move on a board of the given
+        width.
+        """
+        stride = width + 1
+        return pack_move(self[0][1] * stride + self[0][0],
+                         self[1][1] * stride + self[1][0],
+                         self[2][1] * stride + self[2][0])
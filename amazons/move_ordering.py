@@ -0,0 +1,76 @@
+from move import TO_SHIFT
+
+# Killer moves remembered per ply.
+KILLER_SLOTS = 2
+
+# History scores are divided by this at the start of each new search, so
+# what was learned about the last position counts for less than what is
+# learned about this one.
+HISTORY_AGING = 8
+
+class MoveOrdering(object):
+    """
+    Orders the moves at each search node so the ones most likely to cause an
+    alpha-beta cutoff are searched first:
+
+    1. the hash move: the best move the transposition table has stored for
+       the position,
+    2. the killer moves: the last KILLER_SLOTS moves that caused a cutoff at
+       the same ply,
+    3. every other move, by its history score: the sum of depth * depth over
+       every cutoff a move with the same destination and arrow squares has
+       caused, anywhere in the tree.
+
+    Moves are packed move codes (see move.pack_move), and history is keyed by
+    code >> TO_SHIFT, the to and arrow squares.  One MoveOrdering is meant to
+    be kept for a whole search, so that each iterative deepening iteration
+    starts from what the previous ones learned.
+    """
+
+    def __init__(self):
+        self.killers = {}
+        self.history = {}
+
+    def new_search(self):
+        """
+        Forgets the killer moves and ages the history scores, for searching a
+        new position.
+        """
+        self.killers = {}
+        history = {}
+        for key, score in self.history.iteritems():
+            score /= HISTORY_AGING
+            if score:
+                history[key] = score
+        self.history = history
+
+    def order(self, moves, ply, hash_move=None):
+        """
+        Returns the list of move codes moves in the order they should be
+        searched at ply.
+        """
+        first = []
+        for move in [hash_move] + self.killers.get(ply, []):
+            if move != None and move not in first and move in moves:
+                first.append(move)
+        history = self.history
+        if history:
+            rest = sorted(moves, key=lambda move: -history.get(
+                move >> TO_SHIFT, 0))
+        else:
+            rest = list(moves)
+        if first:
+            rest = [move for move in rest if move not in first]
+        return first + rest
+
+    def record_cutoff(self, move, ply, depth):
+        """
+        Records that move caused a beta cutoff at ply, with depth plies left
+        to search.
+        """
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLER_SLOTS:]
+        key = move >> TO_SHIFT
+        self.history[key] = self.history.get(key, 0) + depth * depth
@@ -0,0 +1,192 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from bitboard import iter_bits, EMPTY, WHITE, BLACK, ARROW
+from move import TO_SHIFT, ARROW_SHIFT, MOVE_FIELD_MASK
+
+# NumPy versions of the territory kernels in territory.py, for evaluating many
+# positions at once.  Positions are held as a stack of uint8 occupancy grids
+# of shape (positions, height, width), indexed [n, y, x], and every kernel
+# works on the whole stack with array operations, so NumPy's per-call
+# overhead is paid once per batch instead of once per position.
+#
+# NumPy is optional: if it can't be imported, HAVE_NUMPY is False and the
+# search evaluates positions one at a time with the bitboard kernels.
+HAVE_NUMPY = numpy != None
+
+# Distance given to squares a side can never reach.
+UNREACHABLE = 255
+
+# The eight queen directions as (dx, dy), in the same order as rays.DIRECTIONS.
+DIRECTIONS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0),
+              (-1, 1)]
+
+def occupancy_grids(boards):
+    """
+    Returns a (len(boards), height, width) uint8 array of EMPTY, WHITE, BLACK
+    and ARROW for the squares of each Board, which must all be the same size.
+    """
+    first = boards[0].bits
+    grids = numpy.zeros((len(boards), first.height, first.width), numpy.uint8)
+    stride = first.stride
+    for n, board in enumerate(boards):
+        bits = board.bits
+        grid = grids[n]
+        for mask, occupant in ((bits.white, WHITE), (bits.black, BLACK),
+                               (bits.arrows, ARROW)):
+            for i in iter_bits(mask):
+                grid[i // stride, i % stride] = occupant
+    return grids
+
+def shift(a, dx, dy):
+    """
+    Returns a copy of the stack of grids a with every grid moved dx columns
+    and dy rows, so that shift(a, dx, dy)[n, y + dy, x + dx] == a[n, y, x].
+    Squares moved in from off the board are zero (False).
+    """
+    out = numpy.zeros_like(a)
+    height, width = a.shape[-2:]
+    if abs(dx) >= width or abs(dy) >= height:
+        return out
+    dst_y = slice(max(dy, 0), height + min(dy, 0))
+    dst_x = slice(max(dx, 0), width + min(dx, 0))
+    src_y = slice(max(-dy, 0), height + min(-dy, 0))
+    src_x = slice(max(-dx, 0), width + min(-dx, 0))
+    out[..., dst_y, dst_x] = a[..., src_y, src_x]
+    return out
+
+def queen_reach(frontier, empty):
+    """
+    Returns the boolean grids of the empty squares a queen on any square set
+    in frontier can reach in one move.  Each direction is filled with
+    Kogge-Stone doubling: log2(board size) steps instead of one per square.
+    """
+    reach = numpy.zeros_like(frontier)
+    size = max(frontier.shape[-2:])
+    for dx, dy in DIRECTIONS:
+        lit = frontier
+        open_run = empty
+        step = 1
+        while step < size:
+            lit = lit | (open_run & shift(lit, dx * step, dy * step))
+            open_run = open_run & shift(open_run, dx * step, dy * step)
+            step *= 2
+        reach |= lit & empty
+    return reach
+
+def king_reach(frontier, empty):
+    """
+    Returns the boolean grids of the empty squares next to any square set in
+    frontier.
+    """
+    reach = numpy.zeros_like(frontier)
+    for dx, dy in DIRECTIONS:
+        reach |= shift(frontier, dx, dy)
+    return reach & empty
+
+def distances(grids, side, reach=queen_reach):
+    """
+    Returns uint8 grids of the number of moves (queen moves, or king moves if
+    reach is king_reach) side's amazons need to reach each empty square, or
+    UNREACHABLE.  Occupied squares are UNREACHABLE too.
+    """
+    empty = grids == EMPTY
+    frontier = grids == side
+    seen = frontier.copy()
+    dist = numpy.empty(grids.shape, numpy.uint8)
+    dist.fill(UNREACHABLE)
+    d = 0
+    while frontier.any():
+        d += 1
+        frontier = reach(frontier, empty) & ~seen
+        seen |= frontier
+        dist[frontier] = d
+    return dist
+
+def reach_counts(empty):
+    """
+    Returns int16 grids of the number of squares set in the boolean grids
+    empty that a queen on each square could move to: the total length of the
+    runs of empty squares in the eight directions from it.
+    """
+    total = numpy.zeros(empty.shape, numpy.int16)
+    for dx, dy in DIRECTIONS:
+        # open_run[n, y, x] is set while the k squares from (x, y) towards
+        # (dx, dy), not counting (x, y) itself, are all empty.
+        open_run = shift(empty, -dx, -dy)
+        k = 1
+        while open_run.any():
+            total += open_run
+            k += 1
+            open_run &= shift(empty, -dx * k, -dy * k)
+    return total
+
+def move_counts(grids, side):
+    """
+    Returns an array of the number of legal moves side has in each grid, as
+    BitBoard.count_moves counts them: the sum, over every square each amazon
+    can reach, of the number of arrow shots from that square with the
+    amazon's origin vacated.  Every grid must have the same number of
+    amazons of side.
+    """
+    count = len(grids)
+    empty = grids == EMPTY
+    rows, ys, xs = numpy.nonzero(grids == side)
+    amazons = len(rows) // max(1, count)
+    # nonzero() lists squares in grid order, so each grid's amazons are
+    # consecutive.
+    ys = ys.reshape(count, amazons)
+    xs = xs.reshape(count, amazons)
+    rows = numpy.arange(count)
+    totals = numpy.zeros(count, numpy.int64)
+    for k in range(amazons):
+        origin = numpy.zeros(grids.shape, numpy.bool_)
+        origin[rows, ys[:, k], xs[:, k]] = True
+        reach = queen_reach(origin, empty)
+        arrows = reach_counts(empty | origin)
+        totals += (arrows * reach).sum(axis=(1, 2))
+    return totals
+
+def has_moves(grids, side):
+    """
+    Returns a boolean array of whether side has any legal move in each grid:
+    whether any of its amazons has an empty square next to it.
+    """
+    return king_reach(grids == side, grids == EMPTY).any(axis=(1, 2))
+
+def child_grids(board, moves):
+    """
+    Returns the stack of occupancy grids of the positions after each of the
+    packed move codes moves by the side to move on board.  board may also
+    have only the amazon move of a turn made (see
+    Board.move_amazon_in_place), with moves finishing that turn.
+    """
+    stride = board.bits.stride
+    codes = numpy.array(moves, numpy.int64)
+    count = len(codes)
+    grids = numpy.repeat(occupancy_grids([board]), count, axis=0)
+    rows = numpy.arange(count)
+    for squares, occupant in (
+        (codes & MOVE_FIELD_MASK, EMPTY),
+        ((codes >> TO_SHIFT) & MOVE_FIELD_MASK, board._to_move),
+        ((codes >> ARROW_SHIFT) & MOVE_FIELD_MASK, ARROW)):
+        grids[rows, squares // stride, squares % stride] = occupant
+    return grids
+
+def territory_balances(grids, to_move, tie_break, reach=queen_reach):
+    """
+    Returns an array of territory.territory_balance for each grid: the number
+    of squares white reaches first minus the number black does, with each
+    tied square counting tie_break for the side to move.  to_move is an
+    array of the side (WHITE or BLACK) to move in each position.
+    """
+    white = distances(grids, WHITE, reach)
+    black = distances(grids, BLACK, reach)
+    reached = white != UNREACHABLE
+    tied = ((white == black) & reached).sum(axis=(1, 2))
+    owned = (white < black).sum(axis=(1, 2)) - (black < white).sum(axis=(1, 2))
+    tie_value = numpy.where(numpy.asarray(to_move) == WHITE, tie_break,
+                            -tie_break)
+    return owned + tie_value * tied
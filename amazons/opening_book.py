@@ -0,0 +1,171 @@
+import mmap
+import os
+import struct
+import tempfile
+
+# Opening book files are a header followed by fixed size entries sorted by
+# position hash, and within a position best first.  Positions are stored in
+# their canonical form (see Board.canonical_key), so one entry serves a
+# position and all its mirror images.  Each entry is one scored candidate
+# move: the canonical hash, the packed move code on the canonical board and
+# the score the search gave the move, from WHITE's point of view like every
+# other search value.  Books are only ever memory mapped and binary
+# searched, never read in whole, so every process using one shares the same
+# pages of it.
+MAGIC = 'AMZBOOK2'
+HEADER = struct.Struct('<8sIII') # magic, board width, height, entry count
+ENTRY = struct.Struct('<QQd')    # position hash, move code, score
+
+# Where AIPlayers look for a book when they aren't given one.
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'res', 'opening_book.bin')
+
+def write_book(path, width, height, positions):
+    """
+    Writes an opening book for boards of the given size to path.
+    positions maps canonical position hashes to lists of (move code, score)
+    for the canonical position's candidate moves, best first.  The file is
+    written to a temporary file first and then renamed into place, so a
+    process reading the old book never sees a half written one.
+    """
+    entries = []
+    for key, moves in positions.iteritems():
+        for move, score in moves:
+            entries.append((key, move, score))
+    entries.sort(key=lambda entry: entry[0]) # stable: keeps best first
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='amazons_book_', dir=directory)
+    f = os.fdopen(fd, 'wb')
+    try:
+        f.write(HEADER.pack(MAGIC, width, height, len(entries)))
+        for entry in entries:
+            f.write(ENTRY.pack(*entry))
+    finally:
+        f.close()
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(temp_path, path)
+
+def build_book(board, analyze, plies, breadth, positions=None):
+    """
+    Returns book positions (see write_book) for board and every position
+    reached from it by following one of the breadth best moves of each
+    position, up to plies moves deep.  analyze(board) returns the list of
+    (move code, score) of the candidate moves for board, best first: the
+    results of a deep search, say.  The breadth best candidates of each
+    position are stored.  Positions already in positions, such as those
+    reached by another move order or mirror images of them, aren't
+    analyzed again.
+    """
+    if positions == None:
+        positions = {}
+    if plies <= 0:
+        return positions
+    key, transform = board.canonical_key()
+    if key in positions:
+        return positions
+    moves = analyze(board)[:breadth]
+    if not moves:
+        return positions
+    positions[key] = [(board.transform_move(move, transform), score)
+                      for move, score in moves]
+    for move, score in moves:
+        board.move_in_place(move, validate=False)
+        build_book(board, analyze, plies - 1, breadth, positions)
+        board.undo_move_in_place(move)
+    return positions
+
+class OpeningBook(object):
+    """
+    A read-only opening book file (see write_book), memory mapped and
+    searched in place.  Raises a ValueError if the file isn't a book.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.path.getsize(path)
+        if size < HEADER.size:
+            self.file.close()
+            raise ValueError("%s is not an opening book" % path)
+        self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+        magic, self.width, self.height, self.entry_count = HEADER.unpack_from(
+            self.map, 0)
+        if (magic != MAGIC or
+            size < HEADER.size + self.entry_count * ENTRY.size):
+            self.close()
+            raise ValueError("%s is not an opening book" % path)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __len__(self):
+        """Returns the number of entries (candidate moves) in the book."""
+        return self.entry_count
+
+    def entry(self, i):
+        """Returns the (position hash, move code, score) of entry i."""
+        return ENTRY.unpack_from(self.map, HEADER.size + i * ENTRY.size)
+
+    def find(self, key):
+        """
+        Returns the list of (move code, score) stored for position hash key,
+        best first, or an empty list if the position isn't in the book.
+        """
+        lo = 0
+        hi = self.entry_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        moves = []
+        while lo < self.entry_count:
+            entry_key, move, score = self.entry(lo)
+            if entry_key != key:
+                break
+            moves.append((move, score))
+            lo += 1
+        return moves
+
+    def lookup(self, board):
+        """
+        Returns the list of (move code, score) the book has for board, best
+        first, mapped back from the canonical board (see
+        Board.canonical_key).  Only moves legal on board are returned, so a
+        hash collision can't produce an illegal move, and a board of another
+        size gets none.
+        """
+        if board.width != self.width or board.height != self.height:
+            return []
+        key, transform = board.canonical_key()
+        moves = self.find(key)
+        if not moves:
+            return []
+        legal = set(board.get_valid_move_codes())
+        moves = [(board.untransform_move(move, transform), score)
+                 for move, score in moves]
+        return [(move, score) for move, score in moves if move in legal]
+
+    def best_move(self, board):
+        """Returns the book's best move code for board, or None."""
+        moves = self.lookup(board)
+        return moves[0][0] if moves else None
+
+# The book at DEFAULT_BOOK_PATH, opened on first use.
+default_book = None
+
+def get_default_book():
+    """
+    Returns the OpeningBook at DEFAULT_BOOK_PATH, or None if there isn't a
+    usable one there.
+    """
+    global default_book
+    if default_book == None and os.path.exists(DEFAULT_BOOK_PATH):
+        try:
+            default_book = OpeningBook(DEFAULT_BOOK_PATH)
+        except (ValueError, IOError, OSError, mmap.error):
+            pass
+    return default_book
@@ -10,6 +10,9 @@ from board import Board,BLACK,WHITE
 from game import Game
 from player import Player,NetworkPlayer,GameHostPlayer
 from ai_player import AIPlayer
+import worker_pool
+from territory import estimated_territory, secured_territory
+from bitboard import iter_bits
 from clock import Clock
 import socket
 
@@ -222,6 +225,7 @@ class PygameRunner(object):
                 if ((b.to_move == 'white' and self.w_clock != None and
                     self.w_clock.is_over) or (b.to_move == 'black' and
                     self.b_clock != None and self.b_clock.is_over)):
+                    self.stop_ai_thinking()
                     g.move('time_over')
                     self.start_current_move()
                     self.sounds['bounce'].play()
@@ -248,6 +252,7 @@ class PygameRunner(object):
         for event in pygame.event.get():
             self.gui_app.event(event) # Let the GUI know about it.
             if event.type == QUIT:
+                self.stop_ai_thinking()
                 self.quitting = True
 
             elif event.type == MOUSEMOTION:
@@ -286,6 +291,9 @@ class PygameRunner(object):
         gs = self.game_settings
         s = self.app_settings
 
+        self.stop_ai_thinking()
+        worker_pool.clear_transposition_table()
+
         # Instantiate game and players.
         self.game = Game(gs['width'], gs['height'], gs['white_amazons'],
                          gs['black_amazons'], gs['arrows'], gs['to_move'])
@@ -329,6 +337,7 @@ class PygameRunner(object):
         self.transition_tick = 0
 
     def back_to_title(self, *args):
+        self.stop_ai_thinking()
         self.set_phase(self.PHASE_TRANSITION_BACK)
         self.transition_tick = 0
 
@@ -389,7 +398,9 @@ class PygameRunner(object):
             self.set_phase(self.PHASE_WAIT_FOR_AI)
             self.switch_clock()
             self.sounds['bounce'].play()
-            curr_player.start_thinking(self.game.board)
+            clock = (self.w_clock if (board.to_move == "white")
+                     else self.b_clock)
+            curr_player.start_thinking(self.game.board, clock)
         elif isinstance(curr_player, NetworkPlayer):
             self.set_phase(self.PHASE_WAIT_FOR_REMOTE)
             try:
@@ -403,6 +414,15 @@ class PygameRunner(object):
 
         self.switch_clock()
 
+    def stop_ai_thinking(self):
+        """
+        Cancel any search an AI player is running, so the worker processes
+        are free for the next one.
+        """
+        for player in (self.white_player, self.black_player):
+            if isinstance(player, AIPlayer):
+                player.stop_thinking()
+
     def switch_clock(self):
         """Hit the game clock switch."""
         board = self.game.board
@@ -419,9 +439,8 @@ class PygameRunner(object):
         if sq == None:
             return
         board = self.game.board
-        sq = Square(sq)
         if sq in board.current_amazons:
-            self.amazon_in_hand = Square(sq)
+            self.amazon_in_hand = sq
             self.set_phase(self.PHASE_PLACE_AMAZON)
 
     def drop_amazon(self):
@@ -433,7 +452,6 @@ class PygameRunner(object):
             self.start_current_move()
             return
         board = self.game.board
-        sq = Square(sq)
         if (sq == self.amazon_in_hand):
             # User clicked and released on an amazon - keep that amazon picked.
             return
@@ -452,7 +470,6 @@ class PygameRunner(object):
         if sq == None:
             self.start_current_move() # Invalid square.  Restart current move.
             return
-        sq = Square(sq)
         if board.is_path_clear(self.amazon_in_hand, sq):
             self.amazon_target = sq
             self.set_phase(self.PHASE_SHOOT_ARROW)
@@ -467,7 +484,6 @@ class PygameRunner(object):
         if sq == None:
             self.start_current_move() # Invalid square.  Restart current move.
             return
-        sq = Square(sq)
         if board.is_path_clear(self.amazon_target, sq, ignore=self.amazon_in_hand):
             arrow_target = sq
             mv = Move(self.amazon_in_hand, self.amazon_target, arrow_target)
@@ -485,6 +501,7 @@ class PygameRunner(object):
             return
 
     def resign(self):
+        self.stop_ai_thinking()
         self.game.move('resign')
         self.start_current_move()
         self.sounds['bounce'].play()
@@ -562,6 +579,20 @@ class PygameRunner(object):
         board_y = self.get_board_y()
         self.blit_clipped(board_surf, board_x, board_y)
 
+        # Draw territory if the option is on.
+        marking = self.app_settings['territory_marking']
+        if marking != TERRITORY_MARK_NONE:
+            if marking == TERRITORY_MARK_SECURED:
+                white, black = secured_territory(board)
+            else:
+                white, black = estimated_territory(board)
+            bits = board.bits
+            for mask, surf in ((white, self.surfaces['white_territory']),
+                               (black, self.surfaces['black_territory'])):
+                for i in iter_bits(mask):
+                    x, y = bits.coords(i)
+                    self.blit_clipped(surf, *self.get_screen_pos(x, y))
+
         # Draw amazons.
         amz_surf = self.surfaces['white']
         for amz in board.white_amazons:
@@ -592,8 +623,6 @@ class PygameRunner(object):
         # Draw message.
         self.render_text_centered(self.msg, (self.screen_w / 2), 10)
 
-        # TODO Draw territory if the option is on.
-
     def render_text_centered(self, text, x_center, y):
         font = self.fonts['comicsansms']
         msg_surf = font.render(text, False, self.colors['white'])
@@ -638,7 +667,6 @@ class PygameRunner(object):
         c_square = self.get_cursor_square()
         if (c_square == None):
             return
-        c_square = Square(c_square)
         indicator_pos = self.get_screen_pos(c_square[0], c_square[1])
         is_legal = False
         if self.phase == self.PHASE_PICK_AMAZON:
@@ -827,6 +855,7 @@ class PygameRunner(object):
                     self.is_visible = False
                     self.connect(gui.CLICK,self.on_click,None)
                 def on_click(self, *args):
+                    runner.stop_ai_thinking()
                     runner.game.undo(how_many=2)
                     runner.start_current_move()
                     runner.sounds['bounce'].play()
@@ -1085,22 +1114,22 @@ class PygameRunner(object):
             b_byoyomi_seconds_label.disabled = not b_use_byoyomi
             c.add(b_byoyomi_seconds_label, 215, 370)
 
-            # c.add(gui.Label('Board'), 0, 400)
+            c.add(gui.Label('Board'), 0, 400)
             territory_marking = s['territory_marking']
             territory_group = gui.Group(name='territory_group',
                                         value=territory_marking)
             no_territory_button = gui.Radio(territory_group,
                                             TERRITORY_MARK_NONE)
-            # c.add(no_territory_button, 20, 420)
-            # c.add(gui.Label('No Territory Markings'), 40, 420)
+            c.add(no_territory_button, 20, 420)
+            c.add(gui.Label('No Territory Markings'), 40, 420)
             secured_territory_button = gui.Radio(territory_group,
                                                  TERRITORY_MARK_SECURED)
-            # c.add(secured_territory_button, 20, 440)
-            # c.add(gui.Label('Show Secured Territory'), 40, 440)
+            c.add(secured_territory_button, 20, 440)
+            c.add(gui.Label('Show Secured Territory'), 40, 440)
             estimated_territory_button = gui.Radio(territory_group,
                                                    TERRITORY_MARK_ESTIMATED)
-            # c.add(estimated_territory_button, 20, 460)
-            # c.add(gui.Label('Show Estimated Territory'), 40, 460)
+            c.add(estimated_territory_button, 20, 460)
+            c.add(gui.Label('Show Estimated Territory'), 40, 460)
 
             show_ai_details_switch = gui.Switch(value=s['show_ai_details'],
                                                 name='show_ai_details')
@@ -1229,7 +1258,7 @@ class PygameRunner(object):
                 s['b_byoyomi_periods'] = int(f['b_byoyomi_periods'].value)
                 s['b_byoyomi_seconds'] = int(f['b_byoyomi_seconds'].value)
 
-                # s['territory_marking'] = f['territory_group'].value
+                s['territory_marking'] = f['territory_group'].value
                 # s['show_ai_details'] = f['show_ai_details'].value
 
                 dialog.close()
@@ -1435,8 +1464,8 @@ class PygameRunner(object):
 
     def get_board_pos(self, screen_x, screen_y):
         """
-        Converts screen coordinates to a board square (column, row) tuple.
-        Returns None if the given coordinates are not on the board.
+        Converts screen coordinates to the shared Square at that board
+        position.  Returns None if the given coordinates are not on the board.
         """
         board_x = self.get_board_x()
         board_y = self.get_board_y()
@@ -1450,14 +1479,14 @@ class PygameRunner(object):
             square_x = int((screen_x - (board_x + BORDER_PX)) / SQUARE_PX)
             square_y = int(bottom_square - 
                            ((screen_y - (board_y + BORDER_PX)) / SQUARE_PX))
-            return (square_x, square_y)
+            return Square.at(square_x, square_y)
         else:
             return None
 
     def get_cursor_square(self):
         """
-        Returns the (x, y) or (col, row) square the cursor is hovering over,
-        or None if the cursor is not over a square.
+        Returns the Square the cursor is hovering over, or None if the cursor
+        is not over a square.
         """
         return self.get_board_pos(self.mouse['x'], self.mouse['y'])
 
@@ -0,0 +1,98 @@
+from memoize import memoized
+
+# Queen directions in the same order as board.DIRECTIONS: N, NE, E, SE, S, SW,
+# W, NW.
+DIRECTIONS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0),
+              (-1, 1)]
+
+# Directions whose bit index increases as the ray moves away from its origin,
+# so the nearest blocker is the lowest set bit rather than the highest.
+ASCENDING = (True, True, True, False, False, False, False, True)
+
+class RayTable(object):
+    """
+    Precomputed queen rays for one board size, using the same bit indices as
+    BitBoard (y * (width + 1) + x).  For every on-board square index i,
+    masks[i][d] is the bitboard of the squares along direction d, stopping
+    at the board edge.
+
+    Entries for guard-column indices are None.  Build tables with
+    get_ray_table() so each board size is only computed once.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.stride = width + 1
+        self.masks = [None] * (self.stride * height)
+        for y in range(height):
+            for x in range(width):
+                masks = []
+                for dx, dy in DIRECTIONS:
+                    mask = 0
+                    rx = x + dx
+                    ry = y + dy
+                    while 0 <= rx < width and 0 <= ry < height:
+                        mask |= 1 << (ry * self.stride + rx)
+                        rx += dx
+                        ry += dy
+                    masks.append(mask)
+                self.masks[y * self.stride + x] = tuple(masks)
+
+    def queen_reach(self, i, empty):
+        """
+        Returns the bitboard of squares a queen on square index i can reach
+        through the squares set in empty, cutting each ray at its nearest
+        blocker.
+        """
+        masks = self.masks
+        reach = 0
+        d = 0
+        for ray in masks[i]:
+            blockers = ray & ~empty
+            if blockers:
+                if ASCENDING[d]:
+                    nearest = (blockers & -blockers).bit_length() - 1
+                else:
+                    nearest = blockers.bit_length() - 1
+                ray ^= masks[nearest][d] | (1 << nearest)
+            reach |= ray
+            d += 1
+        return reach
+
+    def direction(self, frm, to):
+        """
+        Returns the index of the direction leading from square index frm to
+        square index to, or None if they are not on a common queen line.
+        """
+        bit = 1 << to
+        d = 0
+        for ray in self.masks[frm]:
+            if ray & bit:
+                return d
+            d += 1
+        return None
+
+    def between(self, frm, to):
+        """
+        Returns the bitboard of squares a queen passes over moving from square
+        index frm to square index to, including to but not frm, or None if
+        the two squares are not on a common queen line.
+        """
+        d = self.direction(frm, to)
+        if d == None:
+            return None
+        return self.masks[frm][d] ^ self.masks[to][d]
+
+    def is_path_clear(self, frm, to, empty):
+        """
+        Returns True if a queen on square index frm can move to square index
+        to through the squares set in empty.
+        """
+        between = self.between(frm, to)
+        return between != None and (between & ~empty) == 0
+
+@memoized
+def get_ray_table(width, height):
+    """Returns the shared RayTable for boards of the given size."""
+    return RayTable(width, height)
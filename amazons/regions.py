@@ -0,0 +1,369 @@
+from bitboard import iter_bits, count_bits, WHITE, BLACK
+
+# Late in the game the arrows wall the board off into regions that amazons
+# can't move between.  A region holding amazons of only one side is that
+# side's alone, and all that matters about it is how many moves the side can
+# still make in it.  Once no region is contested, or the contested ones are
+# small, the winner can be worked out exactly.
+
+# Regions with at most this many empty squares have their move counts found
+# exactly by search; bigger ones only get bounds.
+EXACT_REGION_SQUARES = 12
+
+# Contested regions are only searched out if they have at most this many
+# empty squares in all.
+CONTESTED_SOLVE_SQUARES = 8
+
+# Owned region move count bounds, keyed by region contents (see
+# owned_moves).  Cleared when it holds more than MAX_CACHED_REGIONS entries.
+MAX_CACHED_REGIONS = 100000
+region_cache = {}
+
+class Region(object):
+    """
+    A set of squares of a BitBoard that are connected by king moves through
+    empty and amazon squares.  squares, empty, white and black are bitboards
+    of all the region's squares, its empty squares and the white and black
+    amazons in it.
+    """
+
+    def __init__(self, bits, squares):
+        self.squares = squares
+        self.empty = squares & bits.empty
+        self.white = squares & bits.white
+        self.black = squares & bits.black
+
+    def owner(self):
+        """
+        Returns WHITE or BLACK if only that side has amazons in the region,
+        or None if both or neither do.
+        """
+        if self.white and not self.black:
+            return WHITE
+        if self.black and not self.white:
+            return BLACK
+        return None
+
+    def is_contested(self):
+        return self.white != 0 and self.black != 0
+
+def flood(bits, seed, squares):
+    """
+    Returns the bitboard of the squares of squares connected to the squares
+    of seed by king moves through squares.
+    """
+    shifts = bits.shifts
+    region = frontier = seed
+    while frontier:
+        grown = 0
+        for s in shifts:
+            if s > 0:
+                grown |= frontier << s
+            else:
+                grown |= frontier >> -s
+        frontier = grown & squares & ~region
+        region |= frontier
+    return region
+
+def component_masks(bits, squares):
+    """
+    Returns the list of bitboards of the groups of squares of squares that
+    are connected by king moves.
+    """
+    masks = []
+    while squares:
+        region = flood(bits, squares & -squares, squares)
+        squares &= ~region
+        masks.append(region)
+    return masks
+
+def find_regions(bits):
+    """
+    Returns the list of Regions of BitBoard bits: the groups of empty and
+    amazon squares connected by king moves, found by flood filling with
+    bitboard shifts.
+    """
+    return [Region(bits, mask)
+            for mask in component_masks(bits, bits.valid & ~bits.arrows)]
+
+class RegionTracker(object):
+    """
+    Keeps the regions of a BitBoard (see find_regions) up to date as arrows
+    are shot and unshot, so they don't have to be found from scratch after
+    every move.
+
+    Union-find would be the usual tool for connectivity, but it only merges
+    sets, and arrows only ever split regions.  Instead, the region an arrow
+    lands in is only flood filled again if the arrow's neighbours in it
+    aren't connected to one another around it (otherwise it can't have been
+    cut in two), and every change is logged so remove_arrow() can undo it
+    at once.  masks is the list of region bitboards.
+    """
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.masks = component_masks(bits, bits.valid & ~bits.arrows)
+        # (arrow, index in masks, old mask, masks it was replaced by at
+        # index, masks appended) for each arrow placed.
+        self.log = []
+
+    def place_arrow(self, i):
+        """Updates the regions for an arrow shot at square index i."""
+        bit = 1 << i
+        for n, mask in enumerate(self.masks):
+            if mask & bit:
+                break
+        else:
+            raise ValueError("Square %d is not in any region" % i)
+        rest = mask & ~bit
+        pieces = self.split(rest, i)
+        self.masks[n:n + 1] = pieces[:1]
+        self.masks.extend(pieces[1:])
+        self.log.append((i, n, mask, len(pieces[:1]), len(pieces[1:])))
+
+    def remove_arrow(self, i):
+        """
+        Undoes place_arrow(i), which must be the last arrow placed.  Returns
+        False, changing nothing, if it wasn't: the regions must then be found
+        again from scratch.
+        """
+        if not self.log or self.log[-1][0] != i:
+            return False
+        i, n, mask, kept, appended = self.log.pop()
+        if appended:
+            del self.masks[-appended:]
+        self.masks[n:n + kept] = [mask]
+        return True
+
+    def split(self, squares, i):
+        """
+        Returns the list of regions squares, a region with square index i
+        just taken out of it, falls into.
+        """
+        if not squares:
+            return []
+        bit = 1 << i
+        around = 0
+        for s in self.bits.shifts:
+            if s > 0:
+                around |= bit << s
+            else:
+                around |= bit >> -s
+        around &= squares
+        if around & (around - 1) == 0:
+            # At most one neighbour: nothing went through i.
+            return [squares]
+        if flood(self.bits, around & -around, around) == around:
+            return [squares]
+        return component_masks(self.bits, squares)
+
+    def region_of(self, i):
+        """
+        Returns the bitboard of the region holding square index i, or 0 if
+        there's an arrow on it.
+        """
+        bit = 1 << i
+        for mask in self.masks:
+            if mask & bit:
+                return mask
+        return 0
+
+def most_moves(queen_reach, empty, amazons, cache):
+    """
+    Returns the largest number of moves amazons can make one after another
+    with no opponent moving, on the empty squares empty, searched out
+    exactly.  Results are memoized in cache.
+    """
+    key = (empty, amazons)
+    if key in cache:
+        return cache[key]
+    # Each move fills one more square, so this is as many as there can be.
+    limit = count_bits(empty)
+    best = 0
+    for frm in iter_bits(amazons):
+        frm_bit = 1 << frm
+        for to in iter_bits(queen_reach(frm, empty)):
+            to_bit = 1 << to
+            moved_empty = (empty | frm_bit) & ~to_bit
+            moved = (amazons & ~frm_bit) | to_bit
+            for arrow in iter_bits(queen_reach(to, moved_empty)):
+                count = 1 + most_moves(queen_reach,
+                                       moved_empty & ~(1 << arrow), moved,
+                                       cache)
+                if count > best:
+                    best = count
+                    if best == limit:
+                        cache[key] = best
+                        return best
+    cache[key] = best
+    return best
+
+def greedy_moves(bits, empty, amazons):
+    """
+    Returns the number of moves amazons can make one after another with no
+    opponent moving, on the empty squares empty, by greedily moving to the
+    square with the most empty neighbours and shooting at the one with the
+    fewest, so dead ends get filled first.  A lower bound on most_moves.
+    """
+    queen_reach = bits.ray_table.queen_reach
+    shifts = bits.shifts
+    def neighbours(i, empty):
+        count = 0
+        for s in shifts:
+            if 0 <= i + s and empty & (1 << (i + s)):
+                count += 1
+        return count
+    count = 0
+    while True:
+        best = None
+        for frm in iter_bits(amazons):
+            for to in iter_bits(queen_reach(frm, empty)):
+                score = neighbours(to, empty)
+                if best == None or score > best[0]:
+                    best = (score, frm, to)
+        if best == None:
+            return count
+        score, frm, to = best
+        empty = (empty | (1 << frm)) & ~(1 << to)
+        amazons = (amazons & ~(1 << frm)) | (1 << to)
+        arrow = min(iter_bits(queen_reach(to, empty)),
+                    key=lambda i: neighbours(i, empty))
+        empty &= ~(1 << arrow)
+        count += 1
+
+def owned_moves(bits, region):
+    """
+    Returns (lower, upper) bounds on the number of moves the owner of region
+    (see Region.owner) can make in it, which are equal when the region is
+    small enough to search out (see EXACT_REGION_SQUARES).  Bounds are
+    memoized in region_cache by the region's contents moved to the corner
+    of the board, so the same region found anywhere is only counted once.
+    """
+    stride = bits.stride
+    offset = (min(i // stride for i in iter_bits(region.squares)) * stride +
+              min(i % stride for i in iter_bits(region.squares)))
+    empty = region.empty >> offset
+    amazons = (region.white | region.black) >> offset
+    key = (bits.width, bits.height, empty, amazons)
+    if key not in region_cache:
+        if len(region_cache) > MAX_CACHED_REGIONS:
+            region_cache.clear()
+        empty_count = count_bits(empty)
+        if empty_count > EXACT_REGION_SQUARES:
+            bounds = (greedy_moves(bits, empty, amazons), empty_count)
+        else:
+            count = most_moves(bits.ray_table.queen_reach, empty, amazons, {})
+            bounds = (count, count)
+        region_cache[key] = bounds
+    return region_cache[key]
+
+def contested_winner(queen_reach, empty, white, black, to_move, spare, cache):
+    """
+    Returns True if to_move wins with best play on the contested squares
+    empty, with white and black amazons, when each side can also make
+    spare[side] moves elsewhere that the other can't interfere with.
+    Results are memoized in cache.
+    """
+    key = (empty, white, black, to_move, spare[WHITE], spare[BLACK])
+    if key in cache:
+        return cache[key]
+    other = BLACK if to_move == WHITE else WHITE
+    amazons = white if to_move == WHITE else black
+    result = False
+    if spare[to_move] > 0:
+        spare[to_move] -= 1
+        result = not contested_winner(queen_reach, empty, white, black,
+                                      other, spare, cache)
+        spare[to_move] += 1
+    for frm in iter_bits(amazons):
+        if result:
+            break
+        frm_bit = 1 << frm
+        for to in iter_bits(queen_reach(frm, empty)):
+            if result:
+                break
+            to_bit = 1 << to
+            moved_empty = (empty | frm_bit) & ~to_bit
+            moved = (amazons & ~frm_bit) | to_bit
+            for arrow in iter_bits(queen_reach(to, moved_empty)):
+                after = moved_empty & ~(1 << arrow)
+                if to_move == WHITE:
+                    won = contested_winner(queen_reach, after, moved, black,
+                                           other, spare, cache)
+                else:
+                    won = contested_winner(queen_reach, after, white, moved,
+                                           other, spare, cache)
+                if not won:
+                    result = True
+                    break
+    cache[key] = result
+    return result
+
+def solve(board, max_contested=CONTESTED_SOLVE_SQUARES, cache=None):
+    """
+    Returns WHITE or BLACK, whichever wins board with best play, if that can
+    be worked out exactly from its regions, or None if it can't.
+
+    With no contested regions, each side can make a fixed number of moves
+    in its own regions, and the side to move wins if it has more than its
+    opponent.  Contested regions with at most max_contested empty squares in
+    all are searched out, with the moves each side has in its own regions as
+    spare moves it can make at any time.  Searches of positions that follow
+    from one another can share a cache dict of results.
+    """
+    bits = board.bits
+    all_regions = board.get_regions()
+    contested = [region for region in all_regions if region.is_contested()]
+    # Give up before counting any moves if the contested regions are too big
+    # to search, which is nearly always the case until late in the game.
+    if (contested and
+        sum(count_bits(region.empty) for region in contested) >
+        max_contested):
+        return None
+    lower = {WHITE: 0, BLACK: 0}
+    upper = {WHITE: 0, BLACK: 0}
+    for region in all_regions:
+        owner = region.owner()
+        if owner != None:
+            low, high = owned_moves(bits, region)
+            lower[owner] += low
+            upper[owner] += high
+    to_move = board._to_move
+    other = BLACK if to_move == WHITE else WHITE
+    if not contested:
+        # Each side moves in turn until one of them runs out, to_move first.
+        if lower[to_move] > upper[other]:
+            return to_move
+        if upper[to_move] <= lower[other]:
+            return other
+        return None
+    if lower != upper:
+        return None
+    empty = white = black = 0
+    for region in contested:
+        empty |= region.empty
+        white |= region.white
+        black |= region.black
+    if cache == None:
+        cache = {}
+    if contested_winner(bits.ray_table.queen_reach, empty, white, black,
+                        to_move, dict(lower), cache):
+        return to_move
+    return other
+
+def winning_move(board):
+    """
+    Returns the packed code of a move that keeps a win solve() has found for
+    the side to move on board, or None if there isn't one it can prove.
+    """
+    to_move = board._to_move
+    cache = {}
+    if solve(board, cache=cache) != to_move:
+        return None
+    for move in board.get_valid_move_codes():
+        board.move_in_place(move, validate=False)
+        winner = solve(board, cache=cache)
+        board.undo_move_in_place(move)
+        if winner == to_move:
+            return move
+    return None
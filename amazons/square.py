@@ -1,3 +1,5 @@
+from memoize import memoized
+
 VALUE_ERROR_MSG = "A Square must be specified by a column and row, like a1"
 
 class Square(object):
@@ -11,8 +13,18 @@ class Square(object):
     Square(0, 3)
     Square((0,3))
     Square()
+    Squares are immutable flyweights: every constructor form returns the one
+    shared, hashable instance for its coordinates, so constructing, copying
+    and comparing squares never allocates or re-parses once a square exists.
     """
 
+    __slots__ = ('square', 'x', 'y')
+
+    # Shared instances, keyed by (x, y) tuple and by each string they have
+    # been parsed from.
+    _interned = {}
+    _parsed = {}
+
     @classmethod
     def parse_str(cls, s):
         s = s.lower().strip()
@@ -33,40 +45,70 @@ class Square(object):
             raise ValueError(VALUE_ERROR_MSG);
         return (ord(column) - 97, int(row) - 1)
 
-    def __init__(self, *args):
+    @classmethod
+    def at(cls, x, y):
+        """
+        Returns the shared Square for non-negative int coordinates x and y,
+        skipping the argument checks the constructor does.
+        """
+        sq = cls._interned.get((x, y))
+        if sq == None:
+            sq = object.__new__(cls)
+            object.__setattr__(sq, 'square', (x, y))
+            object.__setattr__(sq, 'x', x)
+            object.__setattr__(sq, 'y', y)
+            cls._interned[(x, y)] = sq
+        return sq
+
+    def __new__(cls, *args):
         if (len(args) == 0):
-            self.square = (0,0)
+            return cls.at(0, 0)
         elif (len(args) == 1):
-            if (isinstance(args[0], Square)):
-                # construct from other Square (copy constructor)
-                self.square = (args[0][0], args[0][1])
-            elif (type(args[0]) == tuple):
+            arg = args[0]
+            if (isinstance(arg, Square)):
+                # "Copy" constructor: squares are immutable, so share it.
+                return arg
+            elif (type(arg) == tuple):
                 # construct from tuple
-                if (len(args[0]) != 2 or type(args[0][0]) != int or
-                    type(args[0][1]) != int):
+                if (len(arg) != 2 or type(arg[0]) != int or
+                    type(arg[1]) != int):
                     raise ValueError(("Squares can only be created from tuples "
                                       "of the form (int, int)"))
-                if (args[0][0] < 0 or args[0][1] < 0):
+                if (arg[0] < 0 or arg[1] < 0):
                     raise ValueError("Square coordinates cannot be negative")
-                self.square = args[0]
-            elif (type(args[0]) == str):
+                return cls.at(arg[0], arg[1])
+            elif (type(arg) == str):
                 # construct from string
-                self.square = Square.parse_str(args[0])
+                sq = cls._parsed.get(arg)
+                if sq == None:
+                    sq = cls.at(*Square.parse_str(arg))
+                    cls._parsed[arg] = sq
+                return sq
             else:
-                raise ValueError("Could not create Square from %s" % 
-                                 str(args[0]))
+                raise ValueError("Could not create Square from %s" %
+                                 str(arg))
         elif (len(args) == 2):
             # construct from two int arguments
             if (type(args[0]) == int and type(args[1]) == int):
                 if (args[0] < 0 or args[1] < 0):
                     raise ValueError("Square coordinates cannot be negative")
-                self.square = (args[0], args[1])
+                return cls.at(args[0], args[1])
             else:
                 raise ValueError("Could not create Square with args %s, %s" %
                                  (str(args[0]), str(args[1])))
         else:
             raise ValueError("Too many arguments to Square()")
 
+    def __setattr__(self, name, value):
+        raise AttributeError("Squares are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Squares are immutable")
+
+    def __reduce__(self):
+        # Unpickle to the shared instance rather than a new copy.
+        return (Square, self.square)
+
     def tuple(self):
         return self.square
 
@@ -78,14 +120,6 @@ class Square(object):
     def row(self):
         return self.square[1]
 
-    @property
-    def x(self):
-        return self.column
-
-    @property
-    def y(self):
-        return self.row
-
     def __str__(self):
         return str(unichr(self.square[0] + 97)) + str(self.square[1] + 1)
 
@@ -94,6 +128,8 @@ class Square(object):
     class form.
     """
     def __eq__(self, other):
+        if (other is self):
+            return True
         if (isinstance(other, Square)):
             pass # no conversion necessary for comparison
         elif (type(other) == str or type(other) == tuple):
@@ -103,11 +139,29 @@ class Square(object):
                 return False
         else:
             return False
-        return self[0] == other[0] and self[1] == other[1]
+        return self.square == other.square
 
     def __ne__(self, other):
         return not (self == other)
 
+    def __hash__(self):
+        # Hash like the equivalent tuple, which compares equal to the Square.
+        return hash(self.square)
+
     """Overload bracket operator."""
     def __getitem__(self, index):
-        return self.square[index]
\ No newline at end of file
+        return self.square[index]
+
+@memoized
+def get_square_table(width, height):
+    """
+    Returns a list of the shared Squares on a board of the given size, indexed
+    by bitboard square index (y * (width + 1) + x).  Guard column entries are
+    None.
+    """
+    stride = width + 1
+    table = [None] * (stride * height)
+    for y in range(height):
+        for x in range(width):
+            table[y * stride + x] = Square.at(x, y)
+    return table
@@ -7,29 +7,55 @@ class Squares(object):
     """
     An ordered list of squares on a game board, ordered from a1 in the lower left,
     left to right then low to high, to j10 in the upper right.  Internally
-    represented as a list of Square objects.
+    represented as a bitmask with one bit per square, numbered row by row,
+    which gives constant time membership tests, appends and removes, and
+    ordered iteration without sorting.  Holds each square at most once:
+    adding a square that is already there raises a ValueError.
+
+    Squares created with sort=False (like Move) instead keep their squares in
+    the order given, in a list.
     """
 
     def remove(self, sq):
-        self.squares.remove(sq)
+        sq = Square(sq)
         if self.sort:
-            self.squares.sort(key=lambda sq: ((sq[1] * self.row_width) + sq[0]))
+            bit = self._bit(sq)
+            if bit == 0 or not self.mask & bit:
+                raise ValueError("%s is not in Squares" % str(sq))
+            self.mask ^= bit
+            self._count -= 1
+            self._list = None
+        else:
+            self._list.remove(sq)
 
     def append(self, sq):
-        self.squares.append(sq)
+        sq = Square(sq)
         if self.sort:
-            self.squares.sort(key=lambda sq: ((sq[1] * self.row_width) + sq[0]))
+            if sq[0] >= self.row_width:
+                self._widen(sq[0] + 1)
+            bit = 1 << (sq[1] * self.row_width + sq[0])
+            if self.mask & bit:
+                raise ValueError("%s is already in Squares" % str(sq))
+            self.mask |= bit
+            self._count += 1
+            self._list = None
+        else:
+            self._list.append(sq)
 
-    def clear(self, sq):
-        del self.squares[:]
+    def clear(self, sq=None):
+        self.mask = 0
+        self._count = 0
+        self._list = [] if not self.sort else None
 
     def __init__(self, *args, **kwargs):
-        self.squares = []
+        self.mask = 0
+        self._count = 0
         self.row_width = 1 # track the widest row we've seen for ordering
 
         # sort the squares unless instructed otherwise
         self.sort = kwargs.get('sort', True)
 
+        squares = []
         if (len(args) == 1):
             if (type(args[0]) == str):
                 # construct from a string of Square strings, like "a1, f6, j10"
@@ -39,60 +65,110 @@ class Squares(object):
                 arr = s.split()
                 for s in arr:
                     if (len(s.strip()) > 0):
-                        sq = Square(s)
-                        self.squares.append(sq)
-                        if (sq[0] + 1) > self.row_width:
-                            self.row_width = (sq[0] + 1)
+                        squares.append(Square(s))
             elif (type(args[0]) == list):
                 # construct from a list of Square representations
                 for i in args[0]:
-                    sq = Square(i)
-                    self.squares.append(sq)
-                    if (sq[0] + 1) > self.row_width:
-                        self.row_width = (sq[0] + 1)
+                    squares.append(Square(i))
             elif (isinstance(args[0], Squares)):
                 # construct from another Squares object (copy constructor)
-                for i in args[0].squares:
-                    self.squares.append(Square(i))
-                self.row_width = args[0].row_width
+                other = args[0]
+                if self.sort and other.sort:
+                    self.mask = other.mask
+                    self._count = other._count
+                    self.row_width = other.row_width
+                else:
+                    squares.extend(other)
             else:
                 raise ValueError(VALUE_ERROR_MSG)
 
         elif (len(args) > 1):
             # try to consider the args as a list of individual square specifiers
             for arg in args:
-                sq = Square(arg)
-                self.squares.append(sq)
-                if (sq[0] + 1) > self.row_width:
-                    self.row_width = (sq[0] + 1)
+                squares.append(Square(arg))
 
         # else there were no args: leave this as an empty squares list
 
-        # sort the squares
         if self.sort:
-            self.squares.sort(key=lambda sq: ((sq[1] * self.row_width) + sq[0]))
+            self._list = None
+            for sq in squares:
+                if (sq[0] + 1) > self.row_width:
+                    self.row_width = (sq[0] + 1)
+            for sq in squares:
+                self.append(sq)
+        else:
+            self._list = squares
+
+    def _bit(self, sq):
+        """
+        Returns the mask bit for Square sq, or 0 if sq is outside the widest
+        row seen so far and so can't be in this Squares.
+        """
+        if sq[0] >= self.row_width:
+            return 0
+        return 1 << (sq[1] * self.row_width + sq[0])
+
+    def _widen(self, row_width):
+        """Renumbers the mask for rows row_width squares wide."""
+        squares = list(self)
+        self.row_width = row_width
+        self.mask = 0
+        for sq in squares:
+            self.mask |= 1 << (sq[1] * row_width + sq[0])
+
+    @property
+    def squares(self):
+        """A new list of the squares, in order."""
+        return list(self)
+
+    def _ordered(self):
+        """Returns the cached list of the squares, in order."""
+        if self._list == None:
+            self._list = list(self)
+        return self._list
 
     def __str__(self):
-        return ", ".join([str(Square(i)) for i in self.squares])
+        return ", ".join([str(i) for i in self])
 
     """Overload bracket operator."""
     def __getitem__(self, index):
-        return self.squares[index]
+        return self._ordered()[index]
 
     def __len__(self):
-        return len(self.squares)
+        if self.sort:
+            return self._count
+        return len(self._list)
 
-    """Allow iterating over each Square in the list."""
+    """
+    Allow iterating over each Square in the list.  Each call returns an
+    independent iterator, so iterations can be nested.
+    """
     def __iter__(self):
-        self._iter_pos = 0
-        return self
-
-    def next(self):
-        if self._iter_pos >= (len(self.squares)):
-            raise StopIteration
-        else:
-            self._iter_pos = self._iter_pos + 1
-            return self.squares[self._iter_pos - 1]
+        if not self.sort:
+            return iter(self._list)
+        if self._list != None:
+            return iter(self._list)
+        return self._iter_mask()
+
+    def _iter_mask(self):
+        at = Square.at
+        row_width = self.row_width
+        mask = self.mask
+        while mask:
+            low = mask & -mask
+            i = low.bit_length() - 1
+            yield at(i % row_width, i // row_width)
+            mask ^= low
+
+    def __contains__(self, sq):
+        if not isinstance(sq, Square):
+            try:
+                sq = Square(sq)
+            except Exception:
+                return False
+        if self.sort:
+            return (self.mask & self._bit(sq)) != 0
+        return sq in self._list
 
     """
     Allow equality testing using strings, tuples, lists, or other strings
@@ -106,10 +182,12 @@ class Squares(object):
                 return False
         if (len(self) != len(other)):
             return False
-        for i in range(len(self.squares)):
-            if (self.squares[i] != other.squares[i]):
+        if (self.sort and other.sort and self.row_width == other.row_width):
+            return self.mask == other.mask
+        for sq, other_sq in zip(self, other):
+            if (sq is not other_sq):
                 return False
         return True
 
     def __ne__(self, other):
-        return not (self == other)
\ No newline at end of file
+        return not (self == other)
@@ -0,0 +1,89 @@
+from memoize import memoized
+from bitboard import iter_bits
+from move import pack_move, unpack_move
+
+# The symmetries of a board: the ways of flipping and turning it that map it
+# onto itself.  Transform t flips the board left to right if t & FLIP_X,
+# then top to bottom if t & FLIP_Y, then swaps rows and columns (reflects it
+# in its diagonal) if t & SWAP_XY.  Together these are the 8 symmetries of a
+# square; a rectangular board only has the 4 that don't swap rows and
+# columns.  Transform 0 leaves the board as it is.
+FLIP_X = 1
+FLIP_Y = 2
+SWAP_XY = 4
+IDENTITY = 0
+
+def transform_count(width, height):
+    """
+    Returns the number of symmetries of a board of the given size: transforms
+    0 up to this number map the board onto itself.
+    """
+    return 8 if width == height else 4
+
+def inverse(transform):
+    """Returns the transform that undoes transform."""
+    if transform & SWAP_XY:
+        # Swapping after flipping x is flipping y after swapping.
+        return (SWAP_XY | (FLIP_X if transform & FLIP_Y else 0) |
+                (FLIP_Y if transform & FLIP_X else 0))
+    return transform
+
+def transform_coords(width, height, transform, x, y):
+    """
+    Returns where transform takes square (x, y) on a width x height board.
+    """
+    if transform & FLIP_X:
+        x = width - 1 - x
+    if transform & FLIP_Y:
+        y = height - 1 - y
+    if transform & SWAP_XY:
+        x, y = y, x
+    return (x, y)
+
+@memoized
+def get_square_map(width, height, transform):
+    """
+    Returns a list mapping each bitboard square index of a width x height
+    board (y * (width + 1) + x) to the index transform takes it to.  Guard
+    column entries are None.
+    """
+    stride = width + 1
+    square_map = [None] * (stride * height)
+    for y in range(height):
+        for x in range(width):
+            tx, ty = transform_coords(width, height, transform, x, y)
+            square_map[y * stride + x] = ty * stride + tx
+    return square_map
+
+def transform_bits(mask, square_map):
+    """Returns bitboard mask with its squares moved by a get_square_map."""
+    result = 0
+    for i in iter_bits(mask):
+        result |= 1 << square_map[i]
+    return result
+
+def transform_move(code, square_map):
+    """Returns packed move code with its squares moved by a get_square_map."""
+    frm, to, arrow = unpack_move(code)
+    return pack_move(square_map[frm], square_map[to], square_map[arrow])
+
+def canonical_transform(bits):
+    """
+    Returns (transform, (white, black, arrows)) for the symmetry of BitBoard
+    bits whose (white, black, arrows) bitboards, compared as a tuple, are
+    the smallest, and those bitboards.  Every position has the same
+    canonical variant as its mirror images, so caches keyed on it find them
+    all.  When several symmetries give the same variant, the lowest
+    numbered one is returned.
+    """
+    width = bits.width
+    height = bits.height
+    best = None
+    for transform in range(transform_count(width, height)):
+        square_map = get_square_map(width, height, transform)
+        variant = (transform_bits(bits.white, square_map),
+                   transform_bits(bits.black, square_map),
+                   transform_bits(bits.arrows, square_map))
+        if best == None or variant < best[1]:
+            best = (transform, variant)
+    return best
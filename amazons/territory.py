@@ -0,0 +1,134 @@
+from bitboard import iter_bits, count_bits, WHITE, BLACK
+import numpy_eval
+
+# Territory evaluation weights: how much the queen distance and king distance
+# territory counts contribute to the score, and how much of a square both
+# sides reach equally fast counts for the side to move, who gets there first.
+QUEEN_WEIGHT = 0.7
+KING_WEIGHT = 0.3
+TIE_BREAK = 0.2
+
+def queen_distance_levels(bits, side):
+    """
+    Returns the queen move distance map of side's amazons on BitBoard bits as
+    a list of bitboards: entry d - 1 holds the empty squares an amazon of
+    side can reach in d queen moves but no fewer, ignoring arrows shot along
+    the way.  Squares side can never reach are in no entry.  Each square is
+    expanded once, so this takes time linear in the board area.
+    """
+    empty = bits.empty
+    queen_reach = bits.ray_table.queen_reach
+    frontier = bits.amazons(side)
+    seen = frontier
+    levels = []
+    while frontier:
+        reach = 0
+        for i in iter_bits(frontier):
+            reach |= queen_reach(i, empty)
+        frontier = reach & ~seen
+        seen |= frontier
+        if frontier:
+            levels.append(frontier)
+    return levels
+
+def king_distance_levels(bits, side):
+    """
+    Same as queen_distance_levels, but for king moves: one square in any of
+    the eight directions at a time.
+    """
+    empty = bits.empty
+    shifts = bits.shifts
+    frontier = bits.amazons(side)
+    seen = frontier
+    levels = []
+    while frontier:
+        reach = 0
+        for s in shifts:
+            if s > 0:
+                reach |= frontier << s
+            else:
+                reach |= frontier >> -s
+        frontier = reach & empty & ~seen
+        seen |= frontier
+        if frontier:
+            levels.append(frontier)
+    return levels
+
+def ownership(white_levels, black_levels):
+    """
+    Returns (white, black, tied) bitboards of the squares white reaches first,
+    black reaches first, and both reach in the same number of moves, given
+    both sides' distance maps.
+    """
+    white = black = tied = 0
+    white_seen = black_seen = 0
+    for d in range(max(len(white_levels), len(black_levels))):
+        w = white_levels[d] if d < len(white_levels) else 0
+        b = black_levels[d] if d < len(black_levels) else 0
+        white |= w & ~(black_seen | b)
+        black |= b & ~(white_seen | w)
+        tied |= w & b
+        white_seen |= w
+        black_seen |= b
+    return (white, black, tied)
+
+def territory_balance(bits, to_move, levels=queen_distance_levels):
+    """
+    Returns the number of squares white owns minus the number black owns by
+    the given distance maps, with each tied square counting TIE_BREAK for
+    to_move.
+    """
+    white, black, tied = ownership(levels(bits, WHITE), levels(bits, BLACK))
+    tie_value = TIE_BREAK if to_move == WHITE else -TIE_BREAK
+    return count_bits(white) - count_bits(black) + tie_value * count_bits(tied)
+
+def eval_territory(board):
+    """
+    Returns a territory score for the given board, from 0.0 (black owns every
+    empty square) to 100.0 (white does), mixing queen and king distance
+    territory by QUEEN_WEIGHT and KING_WEIGHT.
+    """
+    bits = board.bits
+    balance = (QUEEN_WEIGHT *
+               territory_balance(bits, board._to_move, queen_distance_levels) +
+               KING_WEIGHT *
+               territory_balance(bits, board._to_move, king_distance_levels))
+    return 50.0 + 50.0 * balance / max(1, count_bits(bits.empty))
+
+def eval_territory_grids(grids, to_move):
+    """
+    Returns an array of the eval_territory scores of a stack of NumPy
+    occupancy grids (see numpy_eval), given the side to move in each.
+    """
+    numpy = numpy_eval.numpy
+    balances = (QUEEN_WEIGHT *
+                numpy_eval.territory_balances(grids, to_move, TIE_BREAK,
+                                              numpy_eval.queen_reach) +
+                KING_WEIGHT *
+                numpy_eval.territory_balances(grids, to_move, TIE_BREAK,
+                                              numpy_eval.king_reach))
+    empty = (grids == numpy_eval.EMPTY).sum(axis=(1, 2))
+    return 50.0 + 50.0 * balances / numpy.maximum(1, empty)
+
+def estimated_territory(board):
+    """
+    Returns (white, black) bitboards of the empty squares each side reaches
+    in fewer queen moves than the other.
+    """
+    bits = board.bits
+    white, black, tied = ownership(queen_distance_levels(bits, WHITE),
+                                   queen_distance_levels(bits, BLACK))
+    return (white, black)
+
+def secured_territory(board):
+    """
+    Returns (white, black) bitboards of the empty squares only one side's
+    amazons can still reach.
+    """
+    bits = board.bits
+    white = black = 0
+    for level in queen_distance_levels(bits, WHITE):
+        white |= level
+    for level in queen_distance_levels(bits, BLACK):
+        black |= level
+    return (white & ~black, black & ~white)
@@ -0,0 +1,303 @@
+import unittest
+from random import Random
+
+import ai_player
+import numpy_eval
+import regions
+import worker_pool
+from ai_player import (AIPlayer, allocate_time, decide, negamax, negamax_split,
+                       order_moves,
+                       root_batch_size, WHITE, MIN_MOVE_TIME,
+                       MAX_ROOT_BATCH_SIZE)
+from board import Board
+from clock import Clock
+from transposition_table import TranspositionTable
+from territory import eval_territory
+from move_ordering import MoveOrdering
+
+class AIPlayerTest(unittest.TestCase):
+
+    def setUp(self):
+        # Forget any search a previous test left running in this process.
+        ai_player.search_id = None
+        ai_player.search_abort_time = None
+        ai_player.evaluation = ai_player.EVALUATIONS['mobility']
+        ai_player.table_key = 0
+        ai_player.grid_evaluation = ai_player.GRID_EVALUATIONS['mobility']
+
+    def small_board(self):
+        return Board(5, 5, 'a1, e5', 'a5, e1', 'c3, b4, d2', to_move='white')
+
+    def test_importing_does_not_start_workers(self):
+        self.assertTrue(worker_pool.pool == None)
+
+    def test_allocate_time(self):
+        b = Board()
+        self.assertTrue(allocate_time(None, b) == None)
+        # 92 empty squares: plan for 23 more moves.
+        self.assertAlmostEqual(allocate_time(Clock(0, 46, 0, 0), b), 1.5)
+        self.assertAlmostEqual(allocate_time(Clock(0, 46, 3, 10), b), 9.5)
+        self.assertAlmostEqual(allocate_time(Clock(0, 0, 3, 10), b), 7.5)
+        self.assertTrue(allocate_time(Clock(0, 0, 3, 0), b) == MIN_MOVE_TIME)
+
+    def test_negamax_with_transposition_table(self):
+        b = self.small_board()
+        plain = negamax(b, 1, float("-inf"), float("inf"), WHITE, [0])
+        tt = TranspositionTable(1 << 10)
+        cached = negamax(b, 1, float("-inf"), float("inf"), WHITE, [0], tt)
+        self.assertTrue(plain == cached)
+        self.assertTrue(tt.stores > 0)
+        again = negamax(b, 1, float("-inf"), float("inf"), WHITE, [0], tt)
+        self.assertTrue(again == plain)
+        self.assertTrue(tt.hits > 0)
+
+    def test_split_search(self):
+        b = self.small_board()
+        hash_key = b.hash_key
+        inf = float("inf")
+        # Two half plies make a whole turn, so the results agree.
+        for depth in (0, 1):
+            full = negamax(b, depth, -inf, inf, WHITE, [0])
+            split = negamax_split(b, depth * 2, -inf, inf, WHITE, [0])
+            self.assertTrue(full == split)
+        tt = TranspositionTable(1 << 10)
+        ordering = MoveOrdering()
+        self.assertTrue(negamax_split(b, 2, -inf, inf, WHITE, [0], tt,
+                                      ordering) == full)
+        self.assertTrue(negamax_split(b, 2, -inf, inf, WHITE, [0], tt,
+                                      ordering) == full)
+        # A half ply search stops with only an amazon moved.
+        negamax_split(b, 1, -inf, inf, WHITE, [0], tt, ordering)
+        self.assertTrue(b.hash_key == hash_key)
+        self.assertTrue(b.to_move == 'white')
+
+    @unittest.skipUnless(numpy_eval.HAVE_NUMPY, "NumPy is not installed")
+    def test_evaluate_children(self):
+        b = Board(6, 6, 'a1, f6', 'a6, f1', 'c3, d4')
+        b.move_in_place(b.get_valid_move_codes()[10])
+        moves = b.get_valid_move_codes()
+        for name in ('mobility', 'territory'):
+            ai_player.evaluation = ai_player.EVALUATIONS[name]
+            ai_player.grid_evaluation = ai_player.GRID_EVALUATIONS[name]
+            expected = []
+            for move in moves:
+                b.move_in_place(move)
+                expected.append(ai_player.evaluate(b))
+                b.undo_move_in_place(move)
+            self.assertTrue(ai_player.evaluate_children(b, moves) == expected)
+        # Lost positions score -inf or inf, like evaluate().
+        b = Board(4, 4, 'a1', 'd4', 'a3, b3, c3, c4, d3', to_move='white')
+        moves = b.get_valid_move_codes()
+        self.assertTrue(ai_player.evaluate_children(b, moves) ==
+                        [float("inf")] * len(moves))
+
+    @unittest.skipUnless(numpy_eval.HAVE_NUMPY, "NumPy is not installed")
+    def test_leaf_batching(self):
+        b = self.small_board()
+        inf = float("inf")
+        min_leaf_batch = ai_player.MIN_LEAF_BATCH
+        try:
+            for name in ('mobility', 'territory'):
+                ai_player.evaluation = ai_player.EVALUATIONS[name]
+                ai_player.grid_evaluation = ai_player.GRID_EVALUATIONS[name]
+                results = []
+                for batch in (1 << 30, 2):
+                    ai_player.MIN_LEAF_BATCH = batch
+                    results.append([
+                        negamax(b, 1, -inf, inf, WHITE, [0]),
+                        negamax(b, 2, -inf, inf, WHITE, [0], None,
+                                MoveOrdering()),
+                        negamax_split(b, 2, -inf, inf, WHITE, [0]),
+                        negamax_split(b, 3, -inf, inf, WHITE, [0], None,
+                                      MoveOrdering())])
+                self.assertTrue(results[0] == results[1])
+        finally:
+            ai_player.MIN_LEAF_BATCH = min_leaf_batch
+
+    def test_decide(self):
+        b = self.small_board()
+        moves = b.get_valid_move_codes()
+        sid = worker_pool.new_search_id()
+        result = decide([b, moves, 0, len(moves), 0, None, sid])
+        self.assertTrue(result['moves_evaluated'] == len(moves))
+        self.assertTrue(result['best_move'] in moves)
+        self.assertTrue(decide([b, moves, len(moves), 1, 0, None, sid]) ==
+                        None)
+        worker_pool.cancel_search(sid)
+        result = decide([b, moves, 0, len(moves), 0, None, sid])
+        self.assertTrue(result['aborted'])
+
+    def test_decide_from_shared_buffer(self):
+        b = self.small_board()
+        moves = b.get_valid_move_codes()
+        sid = worker_pool.new_search_id()
+        self.assertTrue(worker_pool.publish_position(sid, b, moves))
+        result = decide([None, None, 3, 4, 0, None, sid])
+        self.assertTrue([mv for mv, val, exact in result['move_values']] ==
+                        moves[3:7])
+        self.assertTrue(decide([None, None, len(moves), 4, 0, None, sid]) ==
+                        None)
+        # The buffer has been reused by a later search.
+        self.assertTrue(worker_pool.publish_position(
+            sid + worker_pool.POSITION_SLOTS, b, moves))
+        self.assertTrue(decide([None, None, 0, 4, 0, None, sid])['aborted'])
+        worker_pool.release_position()
+
+    def test_evaluation_choice(self):
+        self.assertTrue(AIPlayer(WHITE).evaluation == 'mobility')
+        self.assertTrue(AIPlayer(WHITE, evaluation='territory').evaluation ==
+                        'territory')
+        self.assertRaises(ValueError, AIPlayer, WHITE, evaluation='luck')
+        b = self.small_board()
+        moves = b.get_valid_move_codes()[:3]
+        result = decide([b, moves, 0, 3, 0, None,
+                         worker_pool.new_search_id(), False, 'territory'])
+        b.move_in_place(moves[0])
+        self.assertTrue(result['move_values'][0][1] == eval_territory(b))
+
+    def test_solved_endgame(self):
+        #   4  .  x  .  .
+        #   3  W  x  x  .
+        #   2  x  x  x  x
+        #   1  .  W  x  B
+        # White has 2 moves left of its own; black's amazon is shut in.
+        b = Board(4, 4, 'a3, b1', 'd1', 'b4, b3, c3, a2, b2, c2, d2, c1',
+                  to_move='black')
+        self.assertTrue(ai_player.solved_value(b) == float("-inf"))
+        inf = float("inf")
+        tt = TranspositionTable(1 << 10)
+        self.assertTrue(negamax(b, 3, -inf, inf, ai_player.BLACK, [0], tt) ==
+                        -inf)
+        self.assertTrue(tt.probe(b.hash_key)[0] == ai_player.SOLVED_DEPTH)
+        self.assertTrue(ai_player.solved_value(Board()) == None)
+        # The winner moves at once, without searching.
+        b = Board(4, 4, 'a3, b1', 'd1', 'b4, b3, c3, a2, b2, c2, d2, c1',
+                  to_move='white')
+        p = AIPlayer(WHITE)
+        p.start_thinking(b)
+        self.assertTrue(p.results == None)
+        # The solver worked on a copy, leaving the game's board alone.
+        self.assertTrue(b._region_tracker == None)
+        move = p.next_move()
+        b.move_in_place(move)
+        self.assertTrue(regions.solve(b) == Board.WHITE)
+
+    def test_search_choice(self):
+        self.assertTrue(AIPlayer(WHITE).search == 'negamax')
+        self.assertTrue(AIPlayer(WHITE, search='mcts').search == 'mcts')
+        self.assertRaises(ValueError, AIPlayer, WHITE, search='minimax')
+
+    def test_decide_mcts(self):
+        b = self.small_board()
+        moves = b.get_valid_move_codes()
+        sid = worker_pool.new_search_id()
+        task = [b, moves, len(moves), sid, 0.05, None, 'territory']
+        first = ai_player.decide_mcts(task)
+        self.assertTrue(first['search_id'] == sid)
+        self.assertTrue(first['playouts'] > 0)
+        self.assertTrue(sum(visits for move, visits, wins
+                            in first['move_stats']) == first['playouts'])
+        # The next task of the search grows the same tree.
+        second = ai_player.decide_mcts(task)
+        self.assertTrue(second['playouts'] > first['playouts'])
+        worker_pool.cancel_search(sid)
+        self.assertTrue(ai_player.decide_mcts(task)['aborted'])
+
+    def test_rank_root_moves(self):
+        b = self.small_board()
+        moves = b.get_valid_move_codes()
+        ranked = ai_player.rank_root_moves(b, moves, Random(1))
+        self.assertTrue(sorted(ranked) == sorted(moves))
+        if numpy_eval.HAVE_NUMPY:
+            scores = ai_player.evaluate_children(b, ranked)
+            self.assertTrue(scores == sorted(scores, reverse=True))
+
+    def test_root_batch_size(self):
+        self.assertTrue(root_batch_size(0, 4) == 1)
+        self.assertTrue(root_batch_size(10, 4) == 1)
+        self.assertTrue(root_batch_size(100, 4) == 4)
+        self.assertTrue(root_batch_size(2176, 4) == MAX_ROOT_BATCH_SIZE)
+
+    def test_order_moves(self):
+        outputs = [{"move_values": [(1, 50.0, True), (2, 70.0, True)]}, None,
+                   {"move_values": [(3, 30.0, True), (4, 70.0, True)]}]
+        self.assertTrue(order_moves([1, 2, 3, 4, 5], outputs, 'white') ==
+                        [2, 4, 1, 3, 5])
+        self.assertTrue(order_moves([1, 2, 3, 4, 5], outputs, 'black') ==
+                        [3, 1, 2, 4, 5])
+        # Exact values beat bounds of the same value.
+        outputs = [{"move_values": [(1, 70.0, False), (2, 70.0, True)]}]
+        self.assertTrue(order_moves([1, 2], outputs, 'white') == [2, 1])
+
+    def test_decide_reports_move_values(self):
+        b = self.small_board()
+        moves = b.get_valid_move_codes()[:5]
+        result = decide([b, moves, 0, 5, 0, None,
+                         worker_pool.new_search_id()])
+        self.assertTrue([mv for mv, val, exact in result['move_values']] ==
+                        moves)
+        self.assertTrue(result['best_move_value'] ==
+                        max(val for mv, val, exact in result['move_values']))
+
+    def test_decide_shares_root_bound(self):
+        b = self.small_board()
+        moves = b.get_valid_move_codes()
+        half = len(moves) / 2
+        full = decide([b, moves, 0, len(moves), 1, None,
+                       worker_pool.new_search_id()])
+        # Split the moves between two tasks of one search, as if they ran in
+        # different workers.
+        sid = worker_pool.new_search_id()
+        first = decide([b, moves[:half], 0, half, 1, None, sid])
+        second = decide([b, moves[half:], 0, len(moves) - half, 1, None, sid])
+        self.assertTrue(worker_pool.get_root_bound(sid) ==
+                        full['best_move_value'])
+        self.assertTrue(order_moves(moves, [first, second], 'white')[0] ==
+                        order_moves(moves, [full], 'white')[0])
+        # The second task only had to beat the first's best move.
+        self.assertTrue(not all(exact for mv, val, exact in
+                                second['move_values']))
+
+    def test_aborted_first_iteration_is_rerun(self):
+        class AbortedResults(object):
+            def next(self, timeout=None):
+                return {"aborted": True}
+        p = AIPlayer(WHITE, opening_book=None)
+        p.start_thinking(self.small_board())
+        # The first iteration comes back aborted, as when a worker can't
+        # attach to the published position: there is no move to fall back
+        # on yet, so it is run again.
+        p.results = AbortedResults()
+        self.assertTrue(p.next_move() == None)
+        self.assertTrue(p.completed_output == None)
+        self.assertTrue(p.results_to_collect > 0)
+        move = None
+        while move == None:
+            move = p.next_move()
+        self.assertTrue(move != None)
+        worker_pool.shutdown()
+
+    def test_aborted_mcts_tasks_are_requeued(self):
+        class AbortedResult(object):
+            def ready(self):
+                return True
+            def get(self):
+                return {"aborted": True}
+            def wait(self, timeout=None):
+                pass
+        b = self.small_board()
+        p = AIPlayer(WHITE, search='mcts', opening_book=None)
+        # Out of time at once, with every task so far aborted: more tasks
+        # are queued, with the position sent along, until one reports.
+        p.start_thinking(b, move_time=0.0)
+        p.mcts_pending = [AbortedResult()]
+        self.assertTrue(p.next_move() == None)
+        self.assertTrue(len(p.mcts_pending) > 0)
+        self.assertTrue(p.mcts_task[0] is b)
+        move = None
+        while move == None:
+            move = p.next_move()
+        worker_pool.shutdown()
+
+if __name__ == "__main__":
+    unittest.main() # run all tests
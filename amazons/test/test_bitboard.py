@@ -0,0 +1,85 @@
+import unittest
+
+from bitboard import BitBoard, iter_bits, count_bits, WHITE, BLACK
+from board import Board, DIRECTIONS, EMPTY
+
+def scan_moves(b, side):
+    """Enumerates moves by walking the board one square at a time."""
+    columns = b.get_board()
+    amazons = b.white_amazons if side == WHITE else b.black_amazons
+    moves = set()
+    for amz in amazons:
+        for dx, dy in DIRECTIONS:
+            x, y = amz.x + dx, amz.y + dy
+            while (0 <= x < b.width and 0 <= y < b.height and
+                   columns[x][y] == EMPTY):
+                for ax, ay in DIRECTIONS:
+                    ar_x, ar_y = x + ax, y + ay
+                    while (0 <= ar_x < b.width and 0 <= ar_y < b.height and
+                           (columns[ar_x][ar_y] == EMPTY or
+                            (ar_x, ar_y) == amz.tuple())):
+                        moves.add((amz.tuple(), (x, y), (ar_x, ar_y)))
+                        ar_x, ar_y = ar_x + ax, ar_y + ay
+                x, y = x + dx, y + dy
+    return moves
+
+class BitBoardTest(unittest.TestCase):
+
+    def bit_moves(self, b, side):
+        bits = b.bits
+        return set((bits.coords(f), bits.coords(t), bits.coords(a))
+                   for f, t, a in bits.generate_moves(side))
+
+    def test_bit_helpers(self):
+        self.assertTrue(list(iter_bits(0)) == [])
+        self.assertTrue(list(iter_bits(0x29)) == [0, 3, 5])
+        self.assertTrue(count_bits(0x29) == 3)
+        self.assertTrue(count_bits(1 << 200) == 1)
+
+    def test_index_and_guard_column(self):
+        bb = BitBoard(10, 10)
+        self.assertTrue(bb.stride == 11)
+        self.assertTrue(bb.index(3, 2) == 25)
+        self.assertTrue(bb.coords(25) == (3, 2))
+        self.assertTrue(count_bits(bb.valid) == 100)
+        self.assertFalse(bb.valid & (1 << bb.index(10, 0)))
+
+    def test_queen_reach_on_empty_board(self):
+        bb = BitBoard(10, 10)
+        self.assertTrue(count_bits(bb.queen_reach(bb.index(0, 0),
+                                                  bb.valid)) == 27)
+        self.assertTrue(count_bits(bb.queen_reach(bb.index(4, 4),
+                                                  bb.valid)) == 35)
+        bb = BitBoard(3, 7)
+        self.assertTrue(count_bits(bb.queen_reach(bb.index(2, 0),
+                                                  bb.valid)) == 10)
+
+    def test_moves_match_square_scan(self):
+        boards = [
+            Board(),
+            Board(6, 4, 'a1, f4', 'a4, f1', 'c2, d3'),
+            Board(7, 9, 'b2, g9', 'a9, g1', 'c3, c4, d5, e5', to_move='black'),
+            Board(white_amazons='a5, c10, c8, i2',
+                  black_amazons='a10, c9, a7, a4',
+                  arrows=('b10, d10, e10, f10, j10, a9, b9, d9, e9, h9, '
+                          'b8, d8, e8, h8, b7, c7, d7, a6, b6, d6, h6, i6'))
+        ]
+        for b in boards:
+            for side in (WHITE, BLACK):
+                moves = scan_moves(b, side)
+                self.assertTrue(self.bit_moves(b, side) == moves)
+                self.assertTrue(b.bits.count_moves(side) == len(moves))
+                self.assertTrue(b.bits.has_moves(side) == (len(moves) > 0))
+                amazon_moves = set((frm, to) for frm, to, arrow in moves)
+                codes = list(b.bits.generate_amazon_moves(side))
+                self.assertTrue(len(codes) == len(amazon_moves))
+                coords = b.bits.coords
+                self.assertTrue(set((coords(code & 0xffff), coords(code >> 16))
+                                    for code in codes) == amazon_moves)
+
+    def test_off_board_squares_are_rejected(self):
+        self.assertRaises(ValueError, Board, 10, 10, 'k5')
+        self.assertRaises(ValueError, Board, 10, 10, 'a1', 'a1')
+
+if __name__ == "__main__":
+    unittest.main() # run all tests
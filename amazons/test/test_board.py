@@ -1,6 +1,10 @@
 import unittest
 
 from board import Board
+from move import Move
+from square import Square
+from squares import Squares
+from invalid_move_error import InvalidMoveError
 
 """
 TODO: test for enumeration - should be 2 moves left
@@ -55,6 +59,7 @@ class BoardTest(unittest.TestCase):
         self.assertTrue(b.height == 10)
         self.assertTrue(b.to_move == "white")
         self.assertRaises(ValueError, Board, 10, 10, "invalid value")
+        self.assertRaises(ValueError, Board, 10, 10, "a4, a4, g1, j4")
         self.assertTrue(Board(to_move = Board.BLACK).to_move == "black")
         self.assertTrue(Board(to_move = 'black').to_move == "black")
         self.assertTrue(Board(to_move = 'b').to_move == "black")
@@ -77,7 +82,159 @@ class BoardTest(unittest.TestCase):
         pass
 
     def test_move_enumeration(self):
-        pass
+        db = self.default_board
+        self.assertTrue(len(db.get_valid_moves()) == 2176)
+        self.assertTrue(len(db.get_valid_opponent_moves()) == 2176)
+        b = Board(black_amazons='a10, c9, a7, a4',
+                  white_amazons='a5, c10, c8, i2',
+                  arrows=('b10, d10, e10, f10, j10, a9, b9, d9, e9, h9, '
+                          'b8, d8, e8, h8, b7, c7, d7, a6, b6, d6, h6, i6, '
+                          'b5, c5, g5, j5, b4, c4, f4, j4, b3, a2, b2, a1, b1'),
+                  to_move='black')
+        self.assertTrue(sorted(str(mv) for mv in b.get_valid_moves()) ==
+                        ['a4, a3, a4', 'a7, a8, a7'])
+
+    def test_move_counting(self):
+        db = self.default_board
+        self.assertTrue(db.count_valid_moves() == 2176)
+        self.assertTrue(db.count_valid_moves('black') == 2176)
+        self.assertTrue(db.has_valid_moves(Board.BLACK))
+        self.assertRaises(ValueError, db.count_valid_moves, 'purple')
+        b = Board(6, 5, 'a1, c3', 'f5', 'b1, b2, a2, e4, e5, f4')
+        self.assertTrue(b.count_valid_moves('white') ==
+                        len(b.get_valid_moves()))
+        self.assertTrue(b.count_valid_moves('black') ==
+                        len(b.get_valid_opponent_moves()))
+        self.assertTrue(b.count_valid_moves('black') == 0)
+        self.assertFalse(b.has_valid_moves('black'))
+
+    def test_move_in_place_and_undo(self):
+        b = Board()
+        mv = Move('d1, d7, g4')
+        b.move_in_place(mv)
+        self.assertTrue(b.to_move == "black")
+        self.assertTrue(b[3][6] == Board.WHITE)
+        self.assertTrue(b[6][3] == Board.ARROW)
+        self.assertTrue(b[3][0] == Board.EMPTY)
+        self.assertRaises(InvalidMoveError, b.check_is_move_valid,
+                          'a7, a3, a4')
+        b.undo_move_in_place(mv)
+        self.assertTrue(b.to_move == "white")
+        self.assertTrue(b.white_amazons == 'a4, d1, g1, j4')
+        self.assertTrue(len(b.arrows) == 0)
+        self.assertTrue(len(b.get_valid_moves()) == 2176)
+
+    def test_move_codes(self):
+        b = Board(12, 7, 'a1, l7', 'a7, l1')
+        mv = Move('a1, c3, l3')
+        code = b.encode_move(mv)
+        self.assertTrue(b.encode_move('a1 c3 l3') == code)
+        self.assertTrue(b.decode_move(code) == mv)
+        self.assertTrue(Move.from_code(code, 12) == mv)
+        codes = b.get_valid_move_codes()
+        moves = b.get_valid_moves()
+        self.assertTrue(len(codes) == len(moves))
+        for code, mv in zip(codes, moves):
+            self.assertTrue(b.decode_move(code) == mv)
+            self.assertTrue(b.encode_move(mv) == code)
+
+        b.move_in_place(code)
+        self.assertTrue(b.to_move == "black")
+        self.assertTrue(mv[1] in b.white_amazons)
+        self.assertFalse(mv[0] in b.white_amazons)
+        self.assertTrue(b.arrows == Squares([mv[2]]))
+        self.assertRaises(InvalidMoveError, b.move_in_place, code)
+        b.undo_move_in_place(code)
+        self.assertTrue(b.to_move == "white")
+        self.assertTrue(b.white_amazons == 'a1, l7')
+        self.assertTrue(len(b.arrows) == 0)
+
+    def test_is_path_clear(self):
+        db = self.default_board
+        self.assertTrue(db.is_path_clear(Square('d1'), Square('d9')))
+        self.assertFalse(db.is_path_clear(Square('d1'), Square('d10')))
+        self.assertFalse(db.is_path_clear(Square('a4'), Square('j4')))
+        self.assertTrue(db.is_path_clear(Square('a4'), Square('j4'),
+                                         ignore=Square('j4')))
+        self.assertFalse(db.is_path_clear(Square('d1'), Square('e3')))
+        self.assertFalse(db.is_path_clear(Square('d1'), Square('d1')))
+        self.assertFalse(db.is_path_clear(Square('d1'), Square('d11')))
+        self.assertFalse(db.is_path_clear(Square('j4'), Square('d10'),
+                                          ignore=Square('j4')))
+        self.assertTrue(db.is_path_clear(Square('g1'), Square('a7'),
+                                         ignore=Square('a7')))
+
+    def test_half_moves(self):
+        b = Board(5, 5, 'a1, e5', 'a5, e1', 'c3')
+        original = Board(prev_board=b)
+        code = b.encode_move('a1, b2, a1')
+        b.move_amazon_in_place(code)
+        self.assertTrue(b.to_move == 'white')
+        self.assertTrue(b.white_amazons == 'b2, e5')
+        self.assertTrue(b.hash_key != original.hash_key)
+        b.shoot_arrow_in_place(code >> 32)
+        moved = original.move(Move('a1, b2, a1'))
+        self.assertTrue(b.to_move == 'black')
+        self.assertTrue(b.arrows == moved.arrows)
+        self.assertTrue(b.hash_key == moved.hash_key)
+        self.assertTrue(b.bits.arrows == moved.bits.arrows)
+        b.undo_shoot_arrow_in_place(code >> 32)
+        b.undo_move_amazon_in_place(code)
+        self.assertTrue(b.hash_key == original.hash_key)
+        self.assertTrue(b.bits.white == original.bits.white)
+        self.assertTrue(b.white_amazons == original.white_amazons)
+        self.assertTrue(b.arrows == original.arrows)
+
+    def test_regions(self):
+        #   4  .  x  .  .
+        #   3  W  x  .  .
+        #   2  .  x  B  .
+        #   1  .  .  .  .
+        #      a  b  c  d
+        b = Board(4, 4, 'a3', 'c2', 'b4, b3, b2', to_move='black')
+        self.assertTrue(len(b.get_regions()) == 1)
+        self.assertTrue(b.region_size('a4') == 13)
+        self.assertTrue(b.region_of('b3') == 0)
+        # Walling off the left side splits the board in two.
+        b.move_in_place('c2, c1, b1')
+        regions = b.get_regions()
+        self.assertTrue(len(regions) == 2)
+        self.assertTrue(b.region_size(Square('a1')) == 4)
+        self.assertTrue(b.region_size('d4') == 8)
+        self.assertTrue(b.region_of('a3') != b.region_of('c3'))
+        white, black = b.region_amazons('a1')
+        self.assertTrue(white == 1 << b.square_index('a3') and black == 0)
+        white, black = b.region_amazons('c1')
+        self.assertTrue(white == 0 and black == 1 << b.square_index('c1'))
+        b.undo_move_in_place('c2, c1, b1')
+        self.assertTrue(len(b.get_regions()) == 1)
+        self.assertTrue(b.region_size('a4') == 13)
+        # Half moves are tracked too.
+        code = b.encode_move('c2, c1, b1')
+        b.move_amazon_in_place(code)
+        b.shoot_arrow_in_place(code >> 32)
+        self.assertTrue(len(b.get_regions()) == 2)
+        b.undo_shoot_arrow_in_place(code >> 32)
+        b.undo_move_amazon_in_place(code)
+        self.assertTrue(len(b.get_regions()) == 1)
+        # Undoing an arrow shot before the regions were tracked starts over.
+        b.move_in_place('c2, c1, b1')
+        b = Board(prev_board=b)
+        b.get_regions()
+        b.undo_move_in_place('c2, c1, b1')
+        self.assertTrue(len(b.get_regions()) == 1)
+
+    def test_encode_position(self):
+        b = Board(6, 5, 'a1, f5', 'b2', 'c3, d4', to_move='black')
+        words = b.encode_position()
+        self.assertTrue(words[:6] == [6, 5, Board.BLACK, 2, 1, 2])
+        b2 = Board.decode_position(words)
+        self.assertTrue(b2.width == 6 and b2.height == 5)
+        self.assertTrue(b2.to_move == 'black')
+        self.assertTrue(b2.white_amazons == 'a1, f5')
+        self.assertTrue(b2.black_amazons == 'b2')
+        self.assertTrue(b2.arrows == 'c3, d4')
+        self.assertTrue(b2.hash_key == b.hash_key)
 
     def test_territory_estimation(self):
         pass
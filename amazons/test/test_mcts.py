@@ -0,0 +1,75 @@
+import unittest
+from random import Random
+
+import ai_player
+from board import Board
+from bitboard import WHITE, BLACK
+from mcts import (MonteCarloTree, random_move, widening_limit,
+                  merge_move_stats, best_move)
+
+class MCTSTest(unittest.TestCase):
+
+    def winning_board(self):
+        # White wins at once with c2, b2, c2; no other move does.
+        return Board(4, 4, 'c2', 'c1', 'd3, d1, b3, b1, b4, a3, d2, c4',
+                     to_move='white')
+
+    def test_random_move(self):
+        rng = Random(1)
+        b = Board(6, 6, 'a1, f6', 'a6, f1', 'c3, d4')
+        move = random_move(b.bits, b._to_move, rng)
+        while move != None:
+            self.assertTrue(move in b.get_valid_move_codes())
+            b.move_in_place(move)
+            move = random_move(b.bits, b._to_move, rng)
+        self.assertTrue(not b.has_valid_moves())
+        b = Board(4, 4, 'a1', 'd4', 'a2, b1, b2', to_move='white')
+        self.assertTrue(random_move(b.bits, WHITE, rng) == None)
+
+    def test_playouts(self):
+        b = Board(6, 6, 'a1, f6', 'a6, f1', 'c3, d4')
+        hash_key = b.hash_key
+        tree = MonteCarloTree(b, ai_player.evaluate, rng=Random(2))
+        for i in range(200):
+            tree.playout()
+        # The board is left as it was.
+        self.assertTrue(b.hash_key == hash_key)
+        self.assertTrue(b.get_valid_move_codes() ==
+                        Board(6, 6, 'a1, f6', 'a6, f1',
+                              'c3, d4').get_valid_move_codes())
+        self.assertTrue(tree.playouts == 200)
+        self.assertTrue(tree.root.visits == 200)
+        stats = tree.move_stats()
+        self.assertTrue(sum(visits for move, visits, wins in stats) == 200)
+        self.assertTrue(len(stats) <= widening_limit(200))
+        for move, visits, wins in stats:
+            self.assertTrue(0.0 <= wins <= visits)
+
+    def test_root_moves(self):
+        b = Board(6, 6, 'a1, f6', 'a6, f1', 'c3, d4')
+        moves = b.get_valid_move_codes()[:3]
+        tree = MonteCarloTree(b, ai_player.evaluate, moves, Random(3))
+        for i in range(50):
+            tree.playout()
+        self.assertTrue([move for move, visits, wins in tree.move_stats()] ==
+                        moves)
+
+    def test_finds_win(self):
+        b = self.winning_board()
+        tree = MonteCarloTree(b, ai_player.evaluate, rng=Random(4))
+        for i in range(300):
+            tree.playout()
+        best = best_move(tree.move_stats())
+        self.assertTrue(str(b.decode_move(best[0])) == 'c2, b2, c2')
+        self.assertTrue(best[2] == best[1])
+
+    def test_merge_move_stats(self):
+        merged = merge_move_stats([[(1, 3, 1.5), (2, 1, 1.0)],
+                                   [(2, 4, 1.0), (3, 1, 0.0)]])
+        self.assertTrue(merged == [(1, 3, 1.5), (2, 5, 2.0), (3, 1, 0.0)])
+        self.assertTrue(best_move(merged) == (2, 5, 2.0))
+        self.assertTrue(best_move([(1, 2, 0.5), (2, 2, 1.5)]) == (2, 2, 1.5))
+        self.assertTrue(best_move([]) == None)
+
+if __name__ == "__main__":
+    unittest.main() # run all tests
@@ -0,0 +1,45 @@
+import unittest
+
+from move import pack_move
+from move_ordering import MoveOrdering, KILLER_SLOTS
+
+class MoveOrderingTest(unittest.TestCase):
+
+    def test_order(self):
+        mo = MoveOrdering()
+        moves = [pack_move(0, to, 9) for to in range(1, 6)]
+        self.assertTrue(mo.order(moves, 1) == moves)
+        self.assertTrue(mo.order(moves, 1, moves[3]) ==
+                        [moves[3]] + moves[:3] + moves[4:])
+        # A hash move that isn't legal here is ignored.
+        self.assertTrue(mo.order(moves, 1, pack_move(0, 7, 9)) == moves)
+
+    def test_killers(self):
+        mo = MoveOrdering()
+        moves = [pack_move(0, to, 9) for to in range(1, 6)]
+        mo.record_cutoff(moves[4], 2, 1)
+        mo.record_cutoff(moves[2], 2, 1)
+        mo.record_cutoff(moves[2], 2, 1)
+        self.assertTrue(mo.order(moves, 2)[:2] == [moves[2], moves[4]])
+        self.assertTrue(mo.order(moves, 2, moves[4])[:2] ==
+                        [moves[4], moves[2]])
+        for move in moves:
+            mo.record_cutoff(move, 2, 1)
+        self.assertTrue(len(mo.killers[2]) == KILLER_SLOTS)
+        mo.new_search()
+        self.assertTrue(mo.killers == {})
+
+    def test_history(self):
+        mo = MoveOrdering()
+        moves = [pack_move(0, to, 9) for to in range(1, 6)]
+        # History is shared by moves with the same to and arrow squares.
+        mo.record_cutoff(pack_move(20, 3, 9), 1, 4)
+        mo.record_cutoff(pack_move(20, 5, 9), 1, 2)
+        self.assertTrue(mo.order(moves, 2) ==
+                        [moves[2], moves[4], moves[0], moves[1], moves[3]])
+        self.assertTrue(mo.history[pack_move(0, 3, 9) >> 16] == 16)
+        mo.new_search()
+        self.assertTrue(mo.history == {pack_move(0, 3, 9) >> 16: 2})
+
+if __name__ == "__main__":
+    unittest.main() # run all tests
@@ -0,0 +1,81 @@
+import unittest
+
+import numpy_eval
+from board import Board, WHITE, BLACK
+from territory import (queen_distance_levels, king_distance_levels,
+                       eval_territory, eval_territory_grids)
+
+def level_grid(b, levels):
+    """Converts distance levels from territory.py to a distance grid."""
+    grid = [[numpy_eval.UNREACHABLE] * b.width for y in range(b.height)]
+    for d, level in enumerate(levels):
+        for y in range(b.height):
+            for x in range(b.width):
+                if level & (1 << b.bits.index(x, y)):
+                    grid[y][x] = d + 1
+    return grid
+
+@unittest.skipUnless(numpy_eval.HAVE_NUMPY, "NumPy is not installed")
+class NumpyEvalTest(unittest.TestCase):
+
+    def boards(self):
+        b = Board()
+        boards = [b.move(mv) for mv in b.get_valid_moves()[::100]]
+        boards.append(Board(white_amazons='a5, c10, c8, i2',
+                            black_amazons='a10, c9, a7, a4',
+                            arrows=('b10, d10, e10, f10, j10, a9, b9, d9, e9, '
+                                    'h9, b8, d8, e8, h8, b7, c7, d7, a6, b6, '
+                                    'd6, h6, i6')))
+        return boards
+
+    def test_shift(self):
+        a = numpy_eval.numpy.arange(6).reshape(1, 2, 3)
+        self.assertTrue(numpy_eval.shift(a, 1, 0).tolist() ==
+                        [[[0, 0, 1], [0, 3, 4]]])
+        self.assertTrue(numpy_eval.shift(a, -1, 1).tolist() ==
+                        [[[0, 0, 0], [1, 2, 0]]])
+        self.assertTrue(numpy_eval.shift(a, 0, 2).tolist() ==
+                        [[[0, 0, 0], [0, 0, 0]]])
+
+    def test_distances_match_bitboards(self):
+        boards = self.boards()
+        grids = numpy_eval.occupancy_grids(boards)
+        for side in (WHITE, BLACK):
+            queen = numpy_eval.distances(grids, side)
+            king = numpy_eval.distances(grids, side, numpy_eval.king_reach)
+            for n, b in enumerate(boards):
+                self.assertTrue(queen[n].tolist() == level_grid(b,
+                    queen_distance_levels(b.bits, side)))
+                self.assertTrue(king[n].tolist() == level_grid(b,
+                    king_distance_levels(b.bits, side)))
+
+    def test_move_counts(self):
+        boards = self.boards()
+        grids = numpy_eval.occupancy_grids(boards)
+        for side in (WHITE, BLACK):
+            counts = numpy_eval.move_counts(grids, side)
+            has_moves = numpy_eval.has_moves(grids, side)
+            for n, b in enumerate(boards):
+                self.assertTrue(counts[n] == b.bits.count_moves(side))
+                self.assertTrue(has_moves[n] == b.bits.has_moves(side))
+
+    def test_child_grids(self):
+        b = self.boards()[-1]
+        moves = b.get_valid_move_codes()
+        children = [b.move(b.decode_move(move)) for move in moves]
+        self.assertTrue(numpy_eval.child_grids(b, moves).tolist() ==
+                        numpy_eval.occupancy_grids(children).tolist())
+        # With the amazon move already made, the arrows finish the turn.
+        b.move_amazon_in_place(moves[0])
+        self.assertTrue(numpy_eval.child_grids(b, moves[:1]).tolist() ==
+                        numpy_eval.occupancy_grids(children[:1]).tolist())
+
+    def test_territory_grids(self):
+        boards = self.boards()
+        boards += [b.get_inverse() for b in boards]
+        scores = eval_territory_grids(numpy_eval.occupancy_grids(boards),
+                                      [b._to_move for b in boards])
+        self.assertTrue(scores.tolist() == [eval_territory(b) for b in boards])
+
+if __name__ == "__main__":
+    unittest.main() # run all tests
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import opening_book
+from ai_player import AIPlayer, WHITE
+from board import Board
+from move import pack_move
+from opening_book import OpeningBook, build_book, write_book
+
+class OpeningBookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'book.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def small_board(self):
+        return Board(5, 5, 'a1, e5', 'a5, e1', 'c3, b4, d2', to_move='white')
+
+    def test_round_trip(self):
+        # A position with no symmetry of its own, so each mirror image has
+        # just one move matching each book move.
+        b = Board(5, 5, 'a1, e5', 'a5, e1', 'c3, b4, d2, a2', to_move='white')
+        b = b.canonical_form()[0]
+        moves = list(b.get_valid_move_codes())
+        write_book(self.path, 5, 5, {
+            b.hash_key: [(moves[3], 60.0), (moves[0], 55.0)],
+            b.hash_key ^ 1: [(moves[1], 40.0)],
+            1: [(moves[2], 50.0)]})
+        book = OpeningBook(self.path)
+        self.assertTrue(len(book) == 4)
+        self.assertTrue(book.find(b.hash_key) ==
+                        [(moves[3], 60.0), (moves[0], 55.0)])
+        self.assertTrue(book.find(1) == [(moves[2], 50.0)])
+        self.assertTrue(book.find(2) == [])
+        self.assertTrue(book.best_move(b) == moves[3])
+        # Mirror images of a book position are found too.
+        for t in range(8):
+            mirror = b.transformed(t)
+            self.assertTrue(book.best_move(mirror) ==
+                            mirror.transform_move(moves[3], t))
+        book.close()
+
+    def test_lookup(self):
+        b = self.small_board().canonical_form()[0]
+        move = b.get_valid_move_codes()[0]
+        # An illegal move, as a hash collision could give, is left out.
+        illegal = pack_move(0, 0, 0)
+        write_book(self.path, 5, 5, {b.hash_key: [(illegal, 70.0),
+                                                  (move, 60.0)]})
+        book = OpeningBook(self.path)
+        self.assertTrue(book.lookup(b) == [(move, 60.0)])
+        self.assertTrue(book.best_move(Board()) == None)
+        book.close()
+
+    def test_bad_file(self):
+        f = open(self.path, 'wb')
+        f.write('not a book at all')
+        f.close()
+        self.assertRaises(ValueError, OpeningBook, self.path)
+        f = open(self.path, 'wb')
+        f.write('AMZ')
+        f.close()
+        self.assertRaises(ValueError, OpeningBook, self.path)
+
+    def test_build_book(self):
+        b = self.small_board()
+        analyzed = []
+        def analyze(board):
+            analyzed.append(board.hash_key)
+            moves = board.get_valid_move_codes()
+            return [(move, 50.0) for move in moves[:3]]
+        positions = build_book(b, analyze, 2, 2)
+        # The root and the positions after its two best moves.
+        self.assertTrue(len(positions) == 3)
+        self.assertTrue(len(analyzed) == 3)
+        self.assertTrue(b.canonical_key()[0] in positions)
+        self.assertTrue(all(len(moves) == 2 for moves in positions.values()))
+        self.assertTrue(b.hash_key == self.small_board().hash_key)
+
+    def test_ai_player_uses_book(self):
+        b = self.small_board()
+        key, transform = b.canonical_key()
+        move = b.get_valid_move_codes()[5]
+        write_book(self.path, 5, 5,
+                   {key: [(b.transform_move(move, transform), 60.0)]})
+        book = OpeningBook(self.path)
+        p = AIPlayer(WHITE, opening_book=book)
+        p.start_thinking(b)
+        self.assertTrue(p.results == None)
+        self.assertTrue(p.next_move() == b.decode_move(move))
+        book.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from random import Random
+
+from rays import get_ray_table, DIRECTIONS
+from bitboard import BitBoard
+
+class RayTableTest(unittest.TestCase):
+
+    def test_tables_are_cached_per_size(self):
+        self.assertTrue(get_ray_table(10, 10) is get_ray_table(10, 10))
+        self.assertFalse(get_ray_table(10, 10) is get_ray_table(8, 10))
+
+    def test_rays_are_bounded(self):
+        t = get_ray_table(10, 10)
+        c3 = 2 * t.stride + 2
+        north = t.masks[c3][DIRECTIONS.index((0, 1))]
+        self.assertTrue(north == sum(1 << (y * 11 + 2) for y in range(3, 10)))
+        southwest = t.masks[c3][DIRECTIONS.index((-1, -1))]
+        self.assertTrue(southwest == (1 << (1 * 11 + 1)) | 1)
+        self.assertTrue(t.masks[10] == None) # guard column
+
+    def walk_reach(self, bb, i, empty):
+        """Queen reach found by stepping along each direction in turn."""
+        x, y = bb.coords(i)
+        reach = 0
+        for dx, dy in DIRECTIONS:
+            rx = x + dx
+            ry = y + dy
+            while (0 <= rx < bb.width and 0 <= ry < bb.height and
+                   empty & (1 << bb.index(rx, ry))):
+                reach |= 1 << bb.index(rx, ry)
+                rx += dx
+                ry += dy
+        return reach
+
+    def test_reach_matches_walk(self):
+        rnd = Random(7)
+        for width, height in ((10, 10), (5, 8), (12, 3)):
+            bb = BitBoard(width, height)
+            squares = [i for i in range(bb.stride * height)
+                       if bb.valid & (1 << i)]
+            for trial in range(20):
+                for i in rnd.sample(squares, len(squares) / 3):
+                    bb.place(i, 3)
+                empty = bb.empty
+                for i in squares:
+                    self.assertTrue(bb.queen_reach(i, empty) ==
+                                    self.walk_reach(bb, i, empty))
+                bb.arrows = 0
+
+    def test_path_checks(self):
+        t = get_ray_table(10, 10)
+        a1 = 0
+        j10 = 9 * 11 + 9
+        e5 = 4 * 11 + 4
+        b3 = 2 * 11 + 1
+        empty = BitBoard(10, 10).valid
+        self.assertTrue(t.is_path_clear(a1, j10, empty))
+        self.assertFalse(t.is_path_clear(a1, b3, empty))
+        self.assertFalse(t.is_path_clear(a1, a1, empty))
+        self.assertFalse(t.is_path_clear(a1, j10, empty & ~(1 << e5)))
+        self.assertTrue(t.is_path_clear(a1, e5, empty))
+        self.assertFalse(t.is_path_clear(a1, e5, empty & ~(1 << e5)))
+
+if __name__ == "__main__":
+    unittest.main() # run all tests
@@ -0,0 +1,122 @@
+import unittest
+from random import Random
+
+import regions
+from board import Board, WHITE, BLACK
+from bitboard import count_bits
+from square import Square
+from regions import (find_regions, component_masks, owned_moves, solve,
+                     winning_move, RegionTracker, EXACT_REGION_SQUARES)
+
+def brute_force_winner(b, memo):
+    """Returns the winner of b by searching the whole game out."""
+    if b.hash_key not in memo:
+        winner = BLACK if b._to_move == WHITE else WHITE
+        for move in b.get_valid_move_codes():
+            b.move_in_place(move)
+            won = brute_force_winner(b, memo) == b._to_move
+            b.undo_move_in_place(move)
+            if not won:
+                winner = b._to_move
+                break
+        memo[b.hash_key] = winner
+    return memo[b.hash_key]
+
+class RegionsTest(unittest.TestCase):
+
+    def split_board(self):
+        #   4  .  x  .  .
+        #   3  W  x  B  .
+        #   2  x  x  x  x
+        #   1  .  W  .  B
+        #      a  b  c  d
+        return Board(4, 4, 'a3, b1', 'c3, d1', 'b4, b3, a2, b2, c2, d2',
+                     to_move='white')
+
+    def test_find_regions(self):
+        b = self.split_board()
+        found = find_regions(b.bits)
+        self.assertTrue(len(found) == 3)
+        self.assertTrue(sum(count_bits(r.squares) for r in found) == 10)
+        owners = sorted((r.owner(), count_bits(r.empty)) for r in found)
+        self.assertTrue(owners == [(None, 2), (WHITE, 1), (BLACK, 3)])
+        contested = [r for r in found if r.is_contested()]
+        self.assertTrue(len(contested) == 1)
+        self.assertTrue(count_bits(contested[0].white) == 1)
+        self.assertTrue(count_bits(contested[0].black) == 1)
+        # No arrows: one region holding everything.
+        self.assertTrue(len(find_regions(Board().bits)) == 1)
+
+    def test_region_tracker(self):
+        rng = Random(3)
+        b = Board(6, 6, 'a1, f6', 'a6, f1', '')
+        tracker = RegionTracker(b.bits)
+        def from_scratch():
+            bits = b.bits
+            return sorted(component_masks(bits, bits.valid & ~bits.arrows))
+        made = []
+        while b.has_valid_moves():
+            move = rng.choice(b.get_valid_move_codes())
+            b.move_in_place(move)
+            tracker.place_arrow(move >> 32)
+            made.append(move)
+            self.assertTrue(sorted(tracker.masks) == from_scratch())
+        self.assertTrue(len(tracker.masks) > 1)
+        while made:
+            move = made.pop()
+            b.undo_move_in_place(move)
+            self.assertTrue(tracker.remove_arrow(move >> 32))
+            self.assertTrue(sorted(tracker.masks) == from_scratch())
+        self.assertTrue(not tracker.remove_arrow(0))
+
+    def test_owned_moves(self):
+        b = self.split_board()
+        for region in find_regions(b.bits):
+            if region.owner() == WHITE:
+                self.assertTrue(owned_moves(b.bits, region) == (1, 1))
+            elif region.owner() == BLACK:
+                self.assertTrue(owned_moves(b.bits, region) == (3, 3))
+        # The same region elsewhere on the board is only searched once.
+        regions.region_cache.clear()
+        b = Board(5, 5, 'a1', 'e5', 'a3, b3, c3, d3, e3, c1, c2, c4, c5')
+        counts = [owned_moves(b.bits, r) for r in find_regions(b.bits)
+                  if r.owner() != None]
+        self.assertTrue(counts == [(3, 3), (3, 3)])
+        self.assertTrue(len(regions.region_cache) == 2)
+        # A big region only gets bounds.
+        b = Board(5, 5, 'a1', 'e5', 'a3, b3, c3, d3, e3')
+        for region in find_regions(b.bits):
+            low, high = owned_moves(b.bits, region)
+            if count_bits(region.empty) > EXACT_REGION_SQUARES:
+                self.assertTrue(low <= high == count_bits(region.empty))
+
+    def test_solve(self):
+        b = self.split_board()
+        self.assertTrue(solve(b) == brute_force_winner(b, {}))
+        self.assertTrue(solve(b, 0) == None)
+        self.assertTrue(solve(Board()) == None)
+        rng = Random(7)
+        names = [str(Square.at(x, y)) for x in range(5) for y in range(4)]
+        solved = 0
+        for trial in range(30):
+            s = rng.sample(names, 4 + rng.randint(7, 12))
+            b = Board(5, 4, ', '.join(s[:2]), ', '.join(s[2:4]),
+                      ', '.join(s[4:]), to_move=rng.choice(['white', 'black']))
+            winner = solve(b)
+            if winner != None:
+                solved += 1
+                self.assertTrue(winner == brute_force_winner(b, {}))
+        self.assertTrue(solved > 15)
+
+    def test_winning_move(self):
+        b = Board(4, 4, 'c2', 'c1', 'd3, d1, b3, b1, b4, a3, d2, c4',
+                  to_move='white')
+        move = winning_move(b)
+        self.assertTrue(move in b.get_valid_move_codes())
+        b.move_in_place(move)
+        self.assertTrue(solve(b) == WHITE)
+        # Black is lost, so has no winning move.
+        self.assertTrue(winning_move(b) == None)
+
+if __name__ == "__main__":
+    unittest.main() # run all tests
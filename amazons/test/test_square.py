@@ -1,6 +1,8 @@
 import unittest
 
-from square import Square
+import pickle
+
+from square import Square, get_square_table
 
 class SquareTest(unittest.TestCase):
 
@@ -44,7 +46,30 @@ class SquareTest(unittest.TestCase):
         self.assertTrue(sq2.tuple() == (4, 6))
         self.assertTrue(str(sq2) == 'e7')
         self.assertTrue(sq2 == sq)
-        self.assertFalse(sq.square is sq2.square) # are they really copies?
+        self.assertTrue(sq2 is sq) # squares are shared, immutable flyweights
+
+    def test_squares_are_interned_and_immutable(self):
+        sq = Square('c7')
+        self.assertTrue(Square(2, 6) is sq)
+        self.assertTrue(Square((2, 6)) is sq)
+        self.assertTrue(Square('7C') is sq)
+        self.assertTrue(Square.at(2, 6) is sq)
+        with self.assertRaises(AttributeError):
+            sq.square = (1, 1)
+        with self.assertRaises(AttributeError):
+            sq.x = 1
+        self.assertTrue(sq.x == 2 and sq.y == 6)
+        self.assertTrue(hash(sq) == hash((2, 6)))
+        self.assertTrue(len(set([sq, Square('c7'), Square('d7')])) == 2)
+        self.assertTrue({sq: 1}.get(Square(2, 6)) == 1)
+        self.assertTrue(pickle.loads(pickle.dumps(sq, 2)) is sq)
+
+    def test_square_table(self):
+        table = get_square_table(10, 10)
+        self.assertTrue(table is get_square_table(10, 10))
+        self.assertTrue(len(table) == 110)
+        self.assertTrue(table[25] is Square('d3'))
+        self.assertTrue(table[10] == None)
 
     def test_square_index_operator(self):
         sq = Square('i7')
@@ -123,5 +123,61 @@ class SquaresTest(unittest.TestCase):
         self.assertTrue('d7' in sqs)
         self.assertTrue((9, 9) in sqs)
 
+    def test_squares_append_and_remove(self):
+        sqs = Squares('c5, a2')
+        sqs.append('b1')
+        sqs.append((9, 9))
+        self.assertTrue(len(sqs) == 4)
+        # Each square can only be held once.
+        self.assertRaises(ValueError, sqs.append, Square('b1'))
+        self.assertTrue(len(sqs) == 4)
+        self.assertTrue(str(sqs) == 'b1, a2, c5, j10')
+        self.assertTrue(sqs[3] == 'j10')
+        sqs.remove('c5')
+        self.assertTrue(str(sqs) == 'b1, a2, j10')
+        self.assertFalse('c5' in sqs)
+        self.assertRaises(ValueError, sqs.remove, 'c5')
+        self.assertRaises(ValueError, sqs.remove, 'z1')
+        sqs.append('l2') # wider than any row seen so far
+        self.assertTrue(str(sqs) == 'b1, a2, l2, j10')
+        self.assertTrue(Squares('b1 a2 l2 j10') == sqs)
+
+    def test_duplicate_squares(self):
+        self.assertRaises(ValueError, Squares, 'a1 a1')
+        self.assertRaises(ValueError, Squares, ['b2', (1, 1)])
+        self.assertRaises(ValueError, Squares, 'a1', 'a1')
+        # Unsorted Squares (like Move) are plain lists.
+        self.assertTrue(len(Squares('a1 a1', sort=False)) == 2)
+
+    def test_squares_list_is_a_copy(self):
+        sqs = Squares('a1, b2')
+        sqs[0]
+        sqs.squares.append(Square('c3'))
+        self.assertTrue(len(sqs) == 2)
+        self.assertTrue(list(sqs) == ['a1', 'b2'])
+        self.assertFalse('c3' in sqs)
+
+    def test_squares_membership(self):
+        sqs = Squares('d7, g3, j10, a2')
+        self.assertTrue(Square('g3') in sqs)
+        self.assertTrue('3g' in sqs)
+        self.assertFalse('g4' in sqs)
+        self.assertFalse('z30' in sqs)
+        self.assertFalse('nonsense' in sqs)
+        self.assertFalse(None in sqs)
+
+    def test_squares_nested_iteration(self):
+        sqs = Squares('a1, b2, c3')
+        pairs = [(str(i), str(j)) for i in sqs for j in sqs]
+        self.assertTrue(len(pairs) == 9)
+        self.assertTrue(pairs[0] == ('a1', 'a1'))
+        self.assertTrue(pairs[8] == ('c3', 'c3'))
+        seen = []
+        for sq in sqs:
+            seen.append(sq)
+            sqs.remove(sq)
+        self.assertTrue(seen == ['a1', 'b2', 'c3'])
+        self.assertTrue(len(sqs) == 0)
+
 if __name__ == "__main__":
     unittest.main() # run all tests
\ No newline at end of file
@@ -0,0 +1,87 @@
+import unittest
+
+import symmetry
+from board import Board
+from move import pack_move
+from symmetry import (get_square_map, inverse, transform_bits,
+                      transform_coords, transform_count, transform_move)
+
+class SymmetryTest(unittest.TestCase):
+
+    def test_transform_count(self):
+        self.assertTrue(transform_count(10, 10) == 8)
+        self.assertTrue(transform_count(6, 5) == 4)
+
+    def test_transform_coords(self):
+        self.assertTrue(transform_coords(6, 5, 0, 1, 2) == (1, 2))
+        self.assertTrue(transform_coords(6, 5, symmetry.FLIP_X, 1, 2) ==
+                        (4, 2))
+        self.assertTrue(transform_coords(6, 5, symmetry.FLIP_Y, 1, 2) ==
+                        (1, 2))
+        self.assertTrue(transform_coords(6, 5, 3, 0, 0) == (5, 4))
+        self.assertTrue(transform_coords(4, 4, symmetry.SWAP_XY, 1, 3) ==
+                        (3, 1))
+
+    def test_square_maps(self):
+        for width, height in ((4, 4), (5, 3)):
+            stride = width + 1
+            squares = [y * stride + x
+                       for y in range(height) for x in range(width)]
+            maps = [get_square_map(width, height, t)
+                    for t in range(transform_count(width, height))]
+            for t, square_map in enumerate(maps):
+                # Every symmetry moves the squares onto one another.
+                self.assertTrue(sorted(square_map[i] for i in squares) ==
+                                squares)
+                # And its inverse moves them back.
+                back = maps[inverse(t)]
+                self.assertTrue(all(back[square_map[i]] == i
+                                    for i in squares))
+            self.assertTrue(len(set(tuple(m) for m in maps)) == len(maps))
+
+    def test_transform_bits_and_moves(self):
+        square_map = get_square_map(4, 4, symmetry.FLIP_X)
+        # a1 and b2 go to d1 and c2.
+        self.assertTrue(transform_bits(1 | 1 << 6, square_map) ==
+                        1 << 3 | 1 << 7)
+        self.assertTrue(transform_move(pack_move(0, 6, 12), square_map) ==
+                        pack_move(3, 7, 11))
+
+    def test_canonical_form(self):
+        b = Board()
+        b.move_in_place('d1, d7, g7')
+        canonical, transform = b.canonical_form()
+        key = canonical.hash_key
+        self.assertTrue(b.canonical_key() == (key, transform))
+        # Every mirror image has the same canonical form.
+        for t in range(8):
+            mirror = b.transformed(t)
+            self.assertTrue(mirror.canonical_key()[0] == key)
+            self.assertTrue(mirror.to_move == b.to_move)
+        # Different positions don't.
+        self.assertTrue(Board().canonical_key()[0] != key)
+        self.assertTrue(b.get_inverse().canonical_key()[0] != key)
+        # The start position is symmetric: it is its own canonical form.
+        start = Board()
+        self.assertTrue(start.canonical_form()[0].hash_key == start.hash_key)
+        self.assertRaises(ValueError, Board(6, 5, 'a1', 'b2').transformed,
+                          symmetry.SWAP_XY)
+
+    def test_move_mapping(self):
+        b = Board(6, 5, 'a1, f5', 'b2', 'c3, d4', to_move='black')
+        for t in range(transform_count(6, 5)):
+            mirror = b.transformed(t)
+            moves = sorted(b.transform_move(move, t)
+                           for move in b.get_valid_move_codes())
+            self.assertTrue(moves == sorted(mirror.get_valid_move_codes()))
+            for move in mirror.get_valid_move_codes():
+                self.assertTrue(
+                    b.transform_move(b.untransform_move(move, t), t) == move)
+            # Moving and then mirroring is mirroring and then moving.
+            move = b.get_valid_move_codes()[7]
+            after = b.move(b.decode_move(move)).transformed(t)
+            mirror.move_in_place(b.transform_move(move, t))
+            self.assertTrue(mirror.hash_key == after.hash_key)
+
+if __name__ == '__main__':
+    unittest.main()
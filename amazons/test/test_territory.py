@@ -0,0 +1,63 @@
+import unittest
+
+from board import Board, WHITE, BLACK
+from bitboard import count_bits
+from territory import (queen_distance_levels, king_distance_levels,
+                       ownership, territory_balance, eval_territory,
+                       estimated_territory, secured_territory, TIE_BREAK)
+
+def squares(b, mask):
+    """Returns the names of the squares set in mask, for readable asserts."""
+    return set(str(b.bits.square(i)) for i in range(b.bits.stride * b.height)
+               if mask & (1 << i))
+
+class TerritoryTest(unittest.TestCase):
+
+    def test_distance_levels(self):
+        b = Board(4, 4, 'a1', 'd4', 'b3, c2')
+        queen = queen_distance_levels(b.bits, WHITE)
+        self.assertTrue(len(queen) == 2)
+        self.assertTrue(squares(b, queen[0]) ==
+                        set(['a2', 'a3', 'a4', 'b1', 'c1', 'd1', 'b2', 'c3']))
+        self.assertTrue(squares(b, queen[1]) == set(['b4', 'c4', 'd2', 'd3']))
+        king = king_distance_levels(b.bits, WHITE)
+        self.assertTrue(len(king) == 3)
+        self.assertTrue(squares(b, king[0]) == set(['a2', 'b1', 'b2']))
+        self.assertTrue(squares(b, king[1]) == set(['a3', 'c1', 'c3']))
+        # Nothing wraps around the board edges.
+        b = Board(4, 4, 'd1', 'a4', 'c1, c2, d2')
+        self.assertTrue(queen_distance_levels(b.bits, WHITE) == [])
+        self.assertTrue(king_distance_levels(b.bits, WHITE) == [])
+
+    def test_ownership(self):
+        white, black, tied = ownership([1, 2 | 8], [2 | 4, 16])
+        self.assertTrue((white, black, tied) == (1 | 8, 2 | 4 | 16, 0))
+        white, black, tied = ownership([1 | 2], [2 | 4])
+        self.assertTrue((white, black, tied) == (1, 4, 2))
+
+    def test_balance_and_score(self):
+        b = Board(4, 4, 'a1', 'd4', 'b3, c2')
+        self.assertTrue(territory_balance(b.bits, WHITE) ==
+                        4 - 4 + 4 * TIE_BREAK)
+        self.assertTrue(territory_balance(b.bits, BLACK) ==
+                        4 - 4 - 4 * TIE_BREAK)
+        b = Board(4, 4, 'a1', 'd4', 'a3, b3, c3, c4')
+        self.assertTrue(eval_territory(b) > 50.0)
+        self.assertTrue(eval_territory(b.get_inverse()) > 50.0)
+        b = Board(4, 4, 'a1', 'd4', 'b1, b2, a2')
+        self.assertTrue(eval_territory(b) == 0.0)
+
+    def test_territory_markings(self):
+        b = Board(4, 4, 'a1', 'd4', 'a3, b3, c3, d3')
+        white, black = secured_territory(b)
+        self.assertTrue(squares(b, white) ==
+                        set(['b1', 'c1', 'd1', 'a2', 'b2', 'c2', 'd2']))
+        self.assertTrue(squares(b, black) == set(['a4', 'b4', 'c4']))
+        b = Board(4, 4, 'a1', 'd4', '')
+        white, black = estimated_territory(b)
+        self.assertTrue(count_bits(white) == count_bits(black))
+        self.assertTrue('a2' in squares(b, white))
+        self.assertTrue('d3' in squares(b, black))
+
+if __name__ == "__main__":
+    unittest.main() # run all tests
@@ -0,0 +1,89 @@
+import unittest
+
+from transposition_table import (TranspositionTable,
+                                 SharedTranspositionTable, EXACT, LOWER_BOUND,
+                                 UPPER_BOUND, TWO_TIER, DEPTH_PREFERRED,
+                                 ALWAYS_REPLACE)
+
+class TranspositionTableTest(unittest.TestCase):
+
+    def make_table(self, bucket_count, policy=TWO_TIER):
+        return TranspositionTable(bucket_count, policy)
+
+    def test_store_and_probe(self):
+        tt = self.make_table(16)
+        self.assertTrue(len(tt) == 32)
+        self.assertTrue(tt.probe(12345) == None)
+        tt.store(12345, 3, 42.5, LOWER_BOUND, 7)
+        self.assertTrue(tt.probe(12345) == (3, 42.5, LOWER_BOUND, 7))
+        self.assertTrue(tt.stats() == {"hits": 1, "misses": 1,
+                                       "collisions": 0, "stores": 1})
+        self.assertTrue(tt.probe(12345 + 16) == None)
+        self.assertTrue(tt.collisions == 1)
+        tt.clear()
+        self.assertTrue(tt.probe(12345) == None)
+        self.assertRaises(ValueError, TranspositionTable, 16, 'sometimes')
+
+    def test_two_tier_replacement(self):
+        tt = self.make_table(16, TWO_TIER)
+        tt.store(1, 5, 1.0, EXACT, None)
+        tt.store(17, 2, 2.0, EXACT, None) # shallower: always-replace slot
+        self.assertTrue(tt.probe(1) == (5, 1.0, EXACT, None))
+        self.assertTrue(tt.probe(17) == (2, 2.0, EXACT, None))
+        tt.store(33, 1, 3.0, EXACT, None) # replaces 17, keeps deep entry
+        self.assertTrue(tt.probe(1) != None)
+        self.assertTrue(tt.probe(17) == None)
+        tt.store(49, 6, 4.0, UPPER_BOUND, None) # deeper: demotes 1
+        self.assertTrue(tt.probe(49) == (6, 4.0, UPPER_BOUND, None))
+        self.assertTrue(tt.probe(1) == (5, 1.0, EXACT, None))
+        self.assertTrue(tt.probe(33) == None)
+
+    def test_single_slot_policies(self):
+        tt = self.make_table(16, DEPTH_PREFERRED)
+        tt.store(1, 5, 1.0, EXACT, None)
+        tt.store(17, 2, 2.0, EXACT, None)
+        self.assertTrue(tt.probe(1) != None)
+        self.assertTrue(tt.probe(17) == None)
+        tt = self.make_table(16, ALWAYS_REPLACE)
+        tt.store(1, 5, 1.0, EXACT, None)
+        tt.store(17, 2, 2.0, EXACT, None)
+        self.assertTrue(tt.probe(1) == None)
+        self.assertTrue(tt.probe(17) != None)
+
+class SharedTranspositionTableTest(TranspositionTableTest):
+
+    def setUp(self):
+        self.tables = []
+
+    def tearDown(self):
+        for tt in self.tables:
+            tt.delete()
+
+    def make_table(self, bucket_count, policy=TWO_TIER):
+        tt = SharedTranspositionTable.create(bucket_count, policy)
+        self.tables.append(tt)
+        return tt
+
+    def test_shared_between_mappings(self):
+        tt = self.make_table(16)
+        other = SharedTranspositionTable(tt.path)
+        self.assertTrue(len(other) == 32)
+        tt.store(1 << 63 | 5, 4, float("-inf"), EXACT, 0x30201)
+        self.assertTrue(other.probe(1 << 63 | 5) ==
+                        (4, float("-inf"), EXACT, 0x30201))
+        other.store(6, 1, 0.25, UPPER_BOUND, None)
+        self.assertTrue(tt.probe(6) == (1, 0.25, UPPER_BOUND, None))
+        other.clear()
+        self.assertTrue(tt.probe(6) == None)
+        other.delete()
+
+    def test_torn_entry_is_a_miss(self):
+        tt = self.make_table(16)
+        tt.store(3, 2, 10.0, EXACT, 7)
+        # Overwrite the score as if another process were half way through
+        # writing a different entry.
+        tt.map[3 * 2 * 24 + 8:3 * 2 * 24 + 16] = '\x01' * 8
+        self.assertTrue(tt.probe(3) == None)
+
+if __name__ == "__main__":
+    unittest.main() # run all tests
@@ -0,0 +1,46 @@
+import unittest
+
+import worker_pool
+from board import Board
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def test_search_ids(self):
+        sid = worker_pool.new_search_id()
+        self.assertTrue(worker_pool.new_search_id() == sid + 1)
+        self.assertFalse(worker_pool.is_cancelled(sid))
+        worker_pool.cancel_search(sid)
+        self.assertTrue(worker_pool.is_cancelled(sid))
+        self.assertFalse(worker_pool.is_cancelled(sid + 1))
+
+    def test_root_bounds(self):
+        sid = worker_pool.new_search_id()
+        self.assertTrue(worker_pool.get_root_bound(sid) == float("-inf"))
+        worker_pool.raise_root_bound(sid, 40.0)
+        worker_pool.raise_root_bound(sid, 30.0)
+        self.assertTrue(worker_pool.get_root_bound(sid) == 40.0)
+        self.assertTrue(worker_pool.get_root_bound(sid + 1) == float("-inf"))
+        worker_pool.reset_root_bound(sid)
+        self.assertTrue(worker_pool.get_root_bound(sid) == float("-inf"))
+
+    def test_publish_position(self):
+        b = Board(5, 5, 'a1, e5', 'a5, e1', 'c3')
+        moves = b.get_valid_move_codes()
+        sid = worker_pool.new_search_id()
+        self.assertTrue(worker_pool.publish_position(sid, b, moves))
+        board, chunk = worker_pool.attach_position(sid, 2, 5)
+        self.assertTrue(board.hash_key == b.hash_key)
+        self.assertTrue(chunk == moves[2:7])
+        # The board is decoded once per search.
+        self.assertTrue(worker_pool.attach_position(sid, 0, 1)[0] is board)
+        self.assertTrue(worker_pool.attach_position(sid + 1, 0, 1) ==
+                        (None, None))
+        worker_pool.release_position()
+        self.assertFalse(worker_pool.publish_position(sid, b,
+            [0] * worker_pool.POSITION_BUFFER_WORDS))
+
+    def test_process_count(self):
+        self.assertTrue(worker_pool.default_process_count() >= 1)
+
+if __name__ == "__main__":
+    unittest.main() # run all tests
@@ -0,0 +1,51 @@
+import unittest
+
+from board import Board
+from zobrist import ZobristTable, get_zobrist_table
+
+class ZobristTest(unittest.TestCase):
+
+    def test_tables_are_cached_and_deterministic(self):
+        t = get_zobrist_table(10, 10)
+        self.assertTrue(t is get_zobrist_table(10, 10))
+        self.assertTrue(t.keys == ZobristTable(10, 10).keys)
+        self.assertTrue(t.black_to_move == ZobristTable(10, 10).black_to_move)
+        self.assertTrue(t.keys[1][0] != get_zobrist_table(9, 10).keys[1][0])
+
+    def test_incremental_hash_matches_full_hash(self):
+        b = Board()
+        start_key = b.hash_key
+        self.assertTrue(start_key == Board().hash_key)
+        self.assertTrue(start_key != Board(to_move='black').hash_key)
+        moves = []
+        for i in range(6):
+            code = b.get_valid_move_codes()[i * 37]
+            b.move_in_place(code)
+            moves.append(code)
+            self.assertTrue(b.hash_key == b.zobrist.hash(b.bits, b._to_move))
+            self.assertTrue(b.hash_key == Board(prev_board=b).hash_key)
+            self.assertTrue(b.hash_key ==
+                            Board(white_amazons=b.white_amazons,
+                                  black_amazons=b.black_amazons,
+                                  arrows=b.arrows,
+                                  to_move=b.to_move).hash_key)
+        inv = b.get_inverse()
+        self.assertTrue(inv.hash_key == inv.zobrist.hash(inv.bits,
+                                                         inv._to_move))
+        for code in reversed(moves):
+            b.undo_move_in_place(code)
+        self.assertTrue(b.hash_key == start_key)
+
+    def test_transpositions_hash_equal(self):
+        a = Board()
+        a.move_in_place('d1, d5, d6')
+        a.move_in_place('d10, e9, e8')
+        a.move_in_place('g1, g5, g6')
+        b = Board()
+        b.move_in_place('g1, g5, g6')
+        b.move_in_place('d10, e9, e8')
+        b.move_in_place('d1, d5, d6')
+        self.assertTrue(a.hash_key == b.hash_key)
+
+if __name__ == "__main__":
+    unittest.main() # run all tests
@@ -0,0 +1,260 @@
+import mmap
+import os
+import struct
+import tempfile
+
+# Bound types for stored scores.
+EXACT = 0
+LOWER_BOUND = 1 # the real score is at least the stored score (a beta cutoff)
+UPPER_BOUND = 2 # the real score is at most the stored score (failed low)
+
+# Shared table entries are three unsigned 64-bit words: a check word, the
+# score's bits and a data word holding the move code, depth and flag.  The
+# check word is key ^ score bits ^ data, so an entry torn by two processes
+# writing it at once no longer matches its key and is just a miss.
+ENTRY = struct.Struct('<QQQ')
+DOUBLE = struct.Struct('<d')
+UINT64 = struct.Struct('<Q')
+MOVE_MASK = (1 << 48) - 1 # no move is stored as 0, which is never a move
+DEPTH_SHIFT = 48
+FLAG_SHIFT = 56
+USED = 1 << 63
+
+# Replacement policies.
+TWO_TIER = 'two_tier'               # depth-preferred slot + always-replace slot
+DEPTH_PREFERRED = 'depth_preferred' # keep the deeper of old and new entries
+ALWAYS_REPLACE = 'always_replace'   # newest entry always wins
+
+def check_policy(policy):
+    """Raises a ValueError if policy isn't a known replacement policy."""
+    if policy not in (TWO_TIER, DEPTH_PREFERRED, ALWAYS_REPLACE):
+        raise ValueError("Unknown replacement policy %s" % str(policy))
+
+class TranspositionTable(object):
+    """
+    A fixed-size cache of search results keyed by Board.hash_key.  Each entry
+    records the search depth, score, bound type (EXACT, LOWER_BOUND or
+    UPPER_BOUND) and best move code for a position.
+
+    The table is split into bucket_count buckets of two slots each and never
+    grows, so its memory use is fixed when it is created.  Which slot a new
+    entry goes into depends on the replacement policy:
+
+    TWO_TIER:        the first slot keeps the deepest search seen for the
+                     bucket, the second always takes the newest entry.
+    DEPTH_PREFERRED: only the first slot is used, and an entry is only
+                     replaced by an equal or deeper one.
+    ALWAYS_REPLACE:  only the first slot is used, and the newest entry wins.
+
+    Probe statistics (hits, misses, and collisions: misses where the bucket
+    held some other position) are counted for sizing the table.
+    """
+
+    def __init__(self, bucket_count=1 << 16, policy=TWO_TIER):
+        check_policy(policy)
+        self.bucket_count = bucket_count
+        self.policy = policy
+        size = bucket_count * 2
+        self.keys = [None] * size
+        self.depths = [0] * size
+        self.scores = [0.0] * size
+        self.flags = [EXACT] * size
+        self.moves = [None] * size
+        self.reset_stats()
+
+    def __len__(self):
+        """Returns the number of entries the table can hold."""
+        return len(self.keys)
+
+    def clear(self):
+        """Empties the table and resets its statistics."""
+        size = len(self.keys)
+        self.keys = [None] * size
+        self.moves = [None] * size
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def stats(self):
+        """Returns the probe and store counts as a dict."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores
+        }
+
+    def probe(self, key):
+        """
+        Returns the (depth, score, flag, move) stored for key, or None if the
+        position isn't in the table.
+        """
+        slot = (key % self.bucket_count) * 2
+        keys = self.keys
+        if keys[slot] != key:
+            slot += 1
+            if keys[slot] != key:
+                self.misses += 1
+                if keys[slot - 1] != None:
+                    self.collisions += 1
+                return None
+        self.hits += 1
+        return (self.depths[slot], self.scores[slot], self.flags[slot],
+                self.moves[slot])
+
+    def store(self, key, depth, score, flag, move):
+        """Stores a search result for key according to the policy."""
+        slot = (key % self.bucket_count) * 2
+        keys = self.keys
+        if self.policy == TWO_TIER:
+            if (keys[slot] != None and keys[slot] != key and
+                depth < self.depths[slot]):
+                # Shallower than the depth-preferred entry: take the
+                # always-replace slot instead.
+                slot += 1
+            elif keys[slot] != key and keys[slot] != None:
+                # Demote the old depth-preferred entry to the always-replace
+                # slot rather than losing it.
+                self._copy(slot, slot + 1)
+            elif keys[slot + 1] == key:
+                keys[slot + 1] = None
+        elif self.policy == DEPTH_PREFERRED:
+            if keys[slot] == key:
+                if depth < self.depths[slot] and flag != EXACT:
+                    return
+            elif keys[slot] != None and depth < self.depths[slot]:
+                return
+        self.stores += 1
+        keys[slot] = key
+        self.depths[slot] = depth
+        self.scores[slot] = score
+        self.flags[slot] = flag
+        self.moves[slot] = move
+
+    def _copy(self, src, dst):
+        self.keys[dst] = self.keys[src]
+        self.depths[dst] = self.depths[src]
+        self.scores[dst] = self.scores[src]
+        self.flags[dst] = self.flags[src]
+        self.moves[dst] = self.moves[src]
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    A TranspositionTable stored in a memory mapped file, so that several
+    processes can map the same file and share one table.  Entries are read
+    and written without locks; each entry carries a check word that detects
+    one torn by simultaneous writes (see ENTRY).  Statistics are counted
+    separately by each process.
+
+    Create the file with create(), then map it in other processes with
+    SharedTranspositionTable(path).  The creator should delete() the file
+    when the table is no longer needed.
+    """
+
+    def __init__(self, path, policy=TWO_TIER):
+        check_policy(policy)
+        self.path = path
+        self.policy = policy
+        self.file = open(path, 'r+b')
+        size = os.path.getsize(path)
+        self.bucket_count = size / (ENTRY.size * 2)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.reset_stats()
+
+    @classmethod
+    def create(cls, bucket_count=1 << 16, policy=TWO_TIER):
+        """Creates a new, empty table in a temporary file."""
+        check_policy(policy)
+        fd, path = tempfile.mkstemp(prefix='amazons_tt_')
+        f = os.fdopen(fd, 'wb')
+        f.truncate(bucket_count * 2 * ENTRY.size)
+        f.close()
+        return cls(path, policy)
+
+    def delete(self):
+        """Unmaps the table and removes its file."""
+        self.map.close()
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return self.bucket_count * 2
+
+    def clear(self):
+        """Empties the table (for every process) and resets its statistics."""
+        self.map.seek(0)
+        block = '\0' * (ENTRY.size * 4096)
+        remaining = len(self.map)
+        while remaining > 0:
+            self.map.write(block[:remaining])
+            remaining -= len(block)
+        self.reset_stats()
+
+    def _read(self, slot):
+        """
+        Returns the (key, depth, score, flag, move) in slot, or None if the
+        slot is empty.
+        """
+        check, score_bits, data = ENTRY.unpack_from(self.map,
+                                                    slot * ENTRY.size)
+        if not data & USED:
+            return None
+        move = data & MOVE_MASK
+        return (check ^ score_bits ^ data, (data >> DEPTH_SHIFT) & 0xff,
+                DOUBLE.unpack(UINT64.pack(score_bits))[0],
+                (data >> FLAG_SHIFT) & 0x3, move if move else None)
+
+    def _write(self, slot, key, depth, score, flag, move):
+        score_bits = UINT64.unpack(DOUBLE.pack(score))[0]
+        data = (USED | (flag << FLAG_SHIFT) |
+                ((depth & 0xff) << DEPTH_SHIFT) |
+                (move if move != None else 0))
+        ENTRY.pack_into(self.map, slot * ENTRY.size, key ^ score_bits ^ data,
+                        score_bits, data)
+
+    def _erase(self, slot):
+        ENTRY.pack_into(self.map, slot * ENTRY.size, 0, 0, 0)
+
+    def probe(self, key):
+        slot = (key % self.bucket_count) * 2
+        first = self._read(slot)
+        if first != None and first[0] == key:
+            self.hits += 1
+            return first[1:]
+        second = self._read(slot + 1)
+        if second != None and second[0] == key:
+            self.hits += 1
+            return second[1:]
+        self.misses += 1
+        if first != None:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        slot = (key % self.bucket_count) * 2
+        old = self._read(slot)
+        if self.policy == TWO_TIER:
+            if old != None and old[0] != key and depth < old[1]:
+                # Shallower than the depth-preferred entry: take the
+                # always-replace slot instead.
+                slot += 1
+            elif old != None and old[0] != key:
+                # Demote the old depth-preferred entry.
+                self._write(slot + 1, *old)
+            else:
+                other = self._read(slot + 1)
+                if other != None and other[0] == key:
+                    self._erase(slot + 1)
+        elif self.policy == DEPTH_PREFERRED:
+            if old != None and depth < old[1]:
+                if old[0] != key or flag != EXACT:
+                    return
+        self.stores += 1
+        self._write(slot, key, depth, score, flag, move)
@@ -0,0 +1,261 @@
+import atexit
+import ctypes
+import os
+from multiprocessing import Array, Pool, RawArray, cpu_count, freeze_support
+
+from rays import get_ray_table
+from square import get_square_table
+from zobrist import get_zobrist_table
+from transposition_table import SharedTranspositionTable
+from board import Board
+
+freeze_support() # Some weird compatibility thing having to do with installers.
+
+# Environment variable that overrides the default number of worker processes.
+PROCESSES_ENV_VAR = 'AMAZONS_WORKER_PROCESSES'
+
+# Search cancellation.  Every search gets an id, and a shared flag at
+# cancel_flags[id % CANCEL_SLOTS] that is set to stop it.  The search's best
+# root score so far, from the root mover's point of view, is shared in the
+# same slot of root_bounds.
+CANCEL_SLOTS = 1024
+
+# Buckets (of two entries each) in the transposition table shared by all the
+# workers.
+TRANSPOSITION_TABLE_BUCKETS = 1 << 18
+
+# Each search publishes its position and root moves (as move codes) to the
+# shared buffer position_buffers[id % POSITION_SLOTS] instead of pickling
+# them into every task.  A buffer holds POSITION_BUFFER_WORDS 64-bit words:
+# a header of the search id + 1 (0 while being written), the length of the
+# position (see Board.encode_position) and the number of moves, then the
+# position, then the moves.
+POSITION_SLOTS = 4
+POSITION_BUFFER_WORDS = 1 << 15
+POSITION_HEADER_WORDS = 3
+
+# Board sizes whose static tables workers build as soon as they start.
+PRELOAD_BOARD_SIZES = [(10, 10)]
+
+pool = None
+processes = None
+cancel_flags = None
+root_bounds = None
+position_buffers = None
+attached_position = (None, None) # (search id, Board) decoded by this worker
+transposition_table = None
+transposition_table_owner = None
+next_search_id = 0
+
+def default_process_count():
+    """
+    Returns the number of worker processes to use when none is configured:
+    the value of the AMAZONS_WORKER_PROCESSES environment variable if set,
+    otherwise one per CPU core, leaving one core for the game itself.
+    """
+    if os.environ.get(PROCESSES_ENV_VAR):
+        return max(1, int(os.environ[PROCESSES_ENV_VAR]))
+    try:
+        return max(1, cpu_count() - 1)
+    except NotImplementedError:
+        return 1
+
+def configure(process_count=None, board_sizes=None):
+    """
+    Sets the number of worker processes (None for the default) and any extra
+    (width, height) board sizes whose tables workers should preload.  Takes
+    effect the next time the pool starts, so shut down a running pool first
+    to resize it.
+    """
+    global processes
+    processes = process_count
+    for size in board_sizes or []:
+        if tuple(size) not in PRELOAD_BOARD_SIZES:
+            PRELOAD_BOARD_SIZES.append(tuple(size))
+
+def init_worker(flags, bounds, buffers, table_path, board_sizes):
+    """
+    Pool initializer: keep references to the shared cancellation flags, root
+    bounds and position buffers, map the shared transposition table, and
+    build the static ray, square and Zobrist tables up front.
+    """
+    global cancel_flags, root_bounds, position_buffers, transposition_table
+    cancel_flags = flags
+    root_bounds = bounds
+    position_buffers = buffers
+    transposition_table = SharedTranspositionTable(table_path)
+    for width, height in board_sizes:
+        get_ray_table(width, height)
+        get_square_table(width, height)
+        get_zobrist_table(width, height)
+
+def create_shared_state():
+    """
+    Creates the shared cancellation flags, root bounds and position buffers
+    if needed.
+    """
+    global cancel_flags, root_bounds, position_buffers
+    if cancel_flags == None:
+        cancel_flags = RawArray('b', CANCEL_SLOTS)
+        root_bounds = Array('d', [float("-inf")] * CANCEL_SLOTS)
+        position_buffers = [RawArray(ctypes.c_uint64, POSITION_BUFFER_WORDS)
+                            for i in range(POSITION_SLOTS)]
+
+def get_pool():
+    """Returns the worker Pool, starting its processes on first use."""
+    global pool, processes
+    if pool == None:
+        if processes == None:
+            processes = default_process_count()
+        create_shared_state()
+        table = get_transposition_table()
+        pool = Pool(processes=processes, initializer=init_worker,
+                    initargs=(cancel_flags, root_bounds, position_buffers,
+                              table.path, list(PRELOAD_BOARD_SIZES)))
+    return pool
+
+def get_transposition_table():
+    """
+    Returns the transposition table shared by this process and the workers,
+    creating it on first use.  It lasts until clear_transposition_table()
+    or shutdown(), so later searches start warm.
+    """
+    global transposition_table, transposition_table_owner
+    if transposition_table == None:
+        transposition_table = SharedTranspositionTable.create(
+            TRANSPOSITION_TABLE_BUCKETS)
+        transposition_table_owner = os.getpid()
+    return transposition_table
+
+def clear_transposition_table():
+    """
+    Empties the shared transposition table, if there is one.  Entries stay
+    correct from one game to the next, but a new game has little use for
+    them.
+    """
+    if transposition_table != None:
+        transposition_table.clear()
+
+def process_count():
+    """Returns the number of worker processes the pool has or will have."""
+    if processes == None:
+        return default_process_count()
+    return processes
+
+def shutdown():
+    """
+    Stops the worker processes, if they were started, and removes the
+    shared transposition table.
+    """
+    global pool, transposition_table
+    if pool != None:
+        pool.terminate()
+        pool.join()
+        pool = None
+    if (transposition_table != None and
+        transposition_table_owner == os.getpid()):
+        transposition_table.delete()
+        transposition_table = None
+
+atexit.register(shutdown)
+
+def new_search_id():
+    """
+    Returns a fresh search id with its cancellation flag and root bound
+    cleared.
+    """
+    global next_search_id
+    create_shared_state()
+    sid = next_search_id
+    next_search_id += 1
+    cancel_flags[sid % CANCEL_SLOTS] = 0
+    reset_root_bound(sid)
+    return sid
+
+def cancel_search(sid):
+    """Tells every worker task of search sid to stop as soon as it can."""
+    cancel_flags[sid % CANCEL_SLOTS] = 1
+
+def is_cancelled(sid):
+    """Returns True if search sid has been cancelled."""
+    return cancel_flags != None and cancel_flags[sid % CANCEL_SLOTS] != 0
+
+def reset_root_bound(sid):
+    """
+    Forgets the best root score of search sid.  Scores from different search
+    depths aren't comparable, so this is done before every iteration.
+    """
+    root_bounds[sid % CANCEL_SLOTS] = float("-inf")
+
+def get_root_bound(sid):
+    """
+    Returns the best root score any worker has found so far for search sid,
+    from the root mover's point of view, or -inf if there is none yet.
+    """
+    if root_bounds == None:
+        return float("-inf")
+    return root_bounds[sid % CANCEL_SLOTS]
+
+def raise_root_bound(sid, score):
+    """Makes score the best root score of search sid if it is better."""
+    if root_bounds == None:
+        return
+    with root_bounds.get_lock():
+        if score > root_bounds[sid % CANCEL_SLOTS]:
+            root_bounds[sid % CANCEL_SLOTS] = score
+
+def publish_position(sid, board, moves):
+    """
+    Publishes board and the list of root move codes for search sid to the
+    workers, replacing whatever search sid published before.  Returns False,
+    publishing nothing, if they don't fit in a buffer; the caller should then
+    send them with each task instead.
+    """
+    create_shared_state()
+    words = board.encode_position()
+    if POSITION_HEADER_WORDS + len(words) + len(moves) > POSITION_BUFFER_WORDS:
+        return False
+    buf = position_buffers[sid % POSITION_SLOTS]
+    buf[0] = 0
+    start = POSITION_HEADER_WORDS
+    buf[start:start + len(words)] = words
+    start += len(words)
+    buf[start:start + len(moves)] = moves
+    buf[1] = len(words)
+    buf[2] = len(moves)
+    buf[0] = sid + 1
+    return True
+
+def attach_position(sid, start, count):
+    """
+    Returns (board, moves) for search sid as published by publish_position:
+    the Board, and count of the root move codes from index start on.  The
+    Board is decoded once per search and then reused, so the caller must
+    leave it as it found it, or call release_position() if it can't.
+    Returns (None, None) if the buffer now belongs to another search.
+    """
+    global attached_position
+    buf = position_buffers[sid % POSITION_SLOTS]
+    if buf[0] != sid + 1:
+        return (None, None)
+    position_len = int(buf[1])
+    move_count = int(buf[2])
+    board = attached_position[1]
+    if attached_position[0] != sid:
+        start_words = POSITION_HEADER_WORDS
+        board = Board.decode_position(
+            buf[start_words:start_words + position_len])
+    first = POSITION_HEADER_WORDS + position_len + start
+    last = POSITION_HEADER_WORDS + position_len + min(start + count,
+                                                      move_count)
+    moves = [int(code) for code in buf[first:last]]
+    if buf[0] != sid + 1:
+        # Overwritten while we were reading it.
+        return (None, None)
+    attached_position = (sid, board)
+    return (board, moves)
+
+def release_position():
+    """Forgets the Board decoded by attach_position()."""
+    global attached_position
+    attached_position = (None, None)
@@ -0,0 +1,73 @@
+from random import Random
+
+from memoize import memoized
+from bitboard import iter_bits, WHITE, BLACK, ARROW
+
+class ZobristTable(object):
+    """
+    Random 64-bit keys for Zobrist hashing positions on one board size: one
+    key per square per occupant (white amazon, black amazon, arrow), indexed
+    by bitboard square index, plus a key for black to move and one for a
+    turn half made: an amazon moved but its arrow not yet shot.  A position's
+    hash is the XOR of the keys of everything on the board, so making or
+    undoing a move only takes a few XORs.
+
+    Keys are drawn from a generator seeded by the board size, so every process
+    builds identical tables and hashes can be shared between them.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        size = (width + 1) * height
+        rnd = Random(width * 65536 + height)
+        self.keys = [None, None, None, None]
+        for occupant in (WHITE, BLACK, ARROW):
+            self.keys[occupant] = [rnd.getrandbits(64) for i in range(size)]
+        self.black_to_move = rnd.getrandbits(64)
+        self.arrow_pending = rnd.getrandbits(64)
+
+    def hash(self, bits, to_move):
+        """
+        Returns the hash of the position on BitBoard bits with to_move (WHITE
+        or BLACK) to move.
+        """
+        h = self.black_to_move if to_move == BLACK else 0
+        for occupant, mask in ((WHITE, bits.white), (BLACK, bits.black),
+                               (ARROW, bits.arrows)):
+            keys = self.keys[occupant]
+            for i in iter_bits(mask):
+                h ^= keys[i]
+        return h
+
+    def move_delta(self, side, frm, to, arrow):
+        """
+        Returns the value to XOR into a hash to make (or undo) side's move
+        from square index frm to to shooting at arrow, including the change
+        of side to move.
+        """
+        keys = self.keys[side]
+        return (keys[frm] ^ keys[to] ^ self.keys[ARROW][arrow] ^
+                self.black_to_move)
+
+    def amazon_delta(self, side, frm, to):
+        """
+        Returns the value to XOR into a hash to move (or unmove) only side's
+        amazon from square index frm to to, leaving an arrow to be shot.
+        """
+        keys = self.keys[side]
+        return keys[frm] ^ keys[to] ^ self.arrow_pending
+
+    def arrow_delta(self, arrow):
+        """
+        Returns the value to XOR into a hash to shoot (or unshoot) the pending
+        arrow at square index arrow, including the change of side to move.
+        amazon_delta() and arrow_delta() together make move_delta().
+        """
+        return (self.keys[ARROW][arrow] ^ self.arrow_pending ^
+                self.black_to_move)
+
+@memoized
+def get_zobrist_table(width, height):
+    """Returns the shared ZobristTable for boards of the given size."""
+    return ZobristTable(width, height)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+"""
+Builds an opening book for the standard 10x10 board by searching each
+position for a fixed time and following the best few moves found.
+"""
+
+from argparse import ArgumentParser
+
+from ai_player import AIPlayer
+from board import Board
+import opening_book
+import worker_pool
+
+def analyze(board, seconds):
+    """
+    Searches board for the given number of seconds and returns the (move,
+    value) of the moves whose values the search found exactly, best first.
+    """
+    player = AIPlayer(board.to_move, difficulty=10, opening_book=None)
+    player.start_thinking(board, move_time=seconds)
+    while player.next_move() == None:
+        pass
+    return player.last_move_values
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--plies', type=int, default=2,
+                        help='how many moves deep the book goes')
+    parser.add_argument('--moves-per-position', type=int, default=3,
+                        help='how many of the best moves of each position '
+                        'are stored and followed')
+    parser.add_argument('--seconds', type=float, default=30.0,
+                        help='how long each position is searched for')
+    parser.add_argument('--output', default=opening_book.DEFAULT_BOOK_PATH,
+                        help='book file to write')
+    args = parser.parse_args()
+    board = Board()
+    try:
+        positions = opening_book.build_book(
+            board, lambda board: analyze(board, args.seconds), args.plies,
+            args.moves_per_position)
+    finally:
+        worker_pool.shutdown()
+    opening_book.write_book(args.output, board.width, board.height, positions)
+    print ('Wrote %d positions to %s.' % (len(positions), args.output))
+
+if __name__ == '__main__':
+    main()